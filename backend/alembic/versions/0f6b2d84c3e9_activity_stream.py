@@ -0,0 +1,49 @@
+"""activity_stream: compressed per-activity streams and power metrics
+
+Revision ID: 0f6b2d84c3e9
+Revises: e41a9c6d07b8
+Create Date: 2026-10-17 15:31:09.266104
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = '0f6b2d84c3e9'
+down_revision: Union[str, Sequence[str], None] = 'e41a9c6d07b8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "activity_stream",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("activity_id", sa.Integer(), nullable=False),
+        sa.Column("athlete_id", sa.Integer(), nullable=False),
+        sa.Column("encoding", sa.String(), nullable=False),
+        sa.Column("channels", sa.String(), nullable=True),
+        sa.Column("samples", sa.Integer(), nullable=True),
+        sa.Column("data", sa.LargeBinary(), nullable=False),
+        sa.Column("duration_s", sa.Float(), nullable=True),
+        sa.Column("avg_power_w", sa.Float(), nullable=True),
+        sa.Column("np_w", sa.Float(), nullable=True),
+        sa.Column("intensity_factor", sa.Float(), nullable=True),
+        sa.Column("tss", sa.Float(), nullable=True),
+        sa.Column("avg_hr_bpm", sa.Float(), nullable=True),
+        sa.Column("created_at", sa.DateTime(), server_default=sa.func.now(), nullable=True),
+        sa.ForeignKeyConstraint(["activity_id"], ["activity.id"], ondelete="CASCADE"),
+        sa.ForeignKeyConstraint(["athlete_id"], ["athlete.id"]),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("activity_id"),
+    )
+    op.create_index(op.f("ix_activity_stream_athlete_id"), "activity_stream", ["athlete_id"], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f("ix_activity_stream_athlete_id"), table_name="activity_stream")
+    op.drop_table("activity_stream")
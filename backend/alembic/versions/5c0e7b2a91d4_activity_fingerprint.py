@@ -0,0 +1,41 @@
+"""activity source, start_time and fingerprint dedupe index
+
+Revision ID: 5c0e7b2a91d4
+Revises: 74f0a95fb3c3
+Create Date: 2026-10-17 11:02:41.530118
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = '5c0e7b2a91d4'
+down_revision: Union[str, Sequence[str], None] = '74f0a95fb3c3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column("activity", sa.Column("source", sa.String(), nullable=False, server_default="manual"))
+    op.add_column("activity", sa.Column("start_time", sa.DateTime(), nullable=True))
+    op.add_column("activity", sa.Column("fingerprint", sa.String(), nullable=True))
+
+    # existing rows predate `source` (every one reads 'manual' here) and have no
+    # start time, so nothing reliable identifies them: give each its own key.
+    # Imports match them by day instead (app.activities._adopt_legacy).
+    op.execute("UPDATE activity SET fingerprint = 'legacy:' || CAST(id AS TEXT)")
+    op.create_index(
+        "ux_activity_athlete_fingerprint", "activity", ["athlete_id", "fingerprint"], unique=True
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ux_activity_athlete_fingerprint", table_name="activity")
+    with op.batch_alter_table("activity") as batch_op:
+        batch_op.drop_column("fingerprint")
+        batch_op.drop_column("start_time")
+        batch_op.drop_column("source")
@@ -0,0 +1,38 @@
+"""athlete_snapshot: materialized per-athlete today view
+
+Revision ID: 6a9e3c1d5f72
+Revises: 0f6b2d84c3e9
+Create Date: 2026-10-17 17:02:44.518203
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = '6a9e3c1d5f72'
+down_revision: Union[str, Sequence[str], None] = '0f6b2d84c3e9'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "athlete_snapshot",
+        sa.Column("athlete_id", sa.Integer(), nullable=False),
+        sa.Column("data_version", sa.Integer(), server_default="0", nullable=False),
+        sa.Column("built_version", sa.Integer(), nullable=True),
+        sa.Column("format", sa.Integer(), nullable=True),
+        sa.Column("day", sa.Date(), nullable=True),
+        sa.Column("payload", sa.Text(), nullable=True),
+        sa.Column("built_at", sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(["athlete_id"], ["athlete.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("athlete_id"),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table("athlete_snapshot")
@@ -0,0 +1,42 @@
+"""import_watermark (incremental re-import high-water marks)
+
+Revision ID: 74f0a95fb3c3
+Revises: af1c297032ff
+Create Date: 2026-10-17 10:02:44.381920
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = '74f0a95fb3c3'
+down_revision: Union[str, Sequence[str], None] = 'af1c297032ff'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "import_watermark",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("athlete_id", sa.Integer(), sa.ForeignKey("athlete.id"), nullable=False),
+        sa.Column("source", sa.String(), nullable=False),
+        sa.Column("record_type", sa.String(), nullable=False),
+        sa.Column("last_end", sa.DateTime()),
+        sa.Column("last_day", sa.Date()),
+        sa.Column("covered_from", sa.Date()),
+        sa.Column("updated_at", sa.DateTime(), server_default=sa.func.now()),
+    )
+    op.create_index(
+        "ux_import_watermark_key", "import_watermark",
+        ["athlete_id", "source", "record_type"], unique=True,
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ux_import_watermark_key", table_name="import_watermark")
+    op.drop_table("import_watermark")
@@ -0,0 +1,39 @@
+"""daily_load: persisted per-athlete TSS/ATL/CTL/TSB
+
+Revision ID: 9b4e7d2c1a38
+Revises: c3f8a2e61d94
+Create Date: 2026-10-17 19:06:12.402877
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = '9b4e7d2c1a38'
+down_revision: Union[str, Sequence[str], None] = 'c3f8a2e61d94'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # filled lazily: app.load rebuilds an athlete's rows on first read
+    op.create_table(
+        "daily_load",
+        sa.Column("athlete_id", sa.Integer(), nullable=False),
+        sa.Column("date", sa.Date(), nullable=False),
+        sa.Column("tss", sa.Float(), nullable=False),
+        sa.Column("tss_7d", sa.Float(), nullable=False),
+        sa.Column("atl", sa.Float(), nullable=False),
+        sa.Column("ctl", sa.Float(), nullable=False),
+        sa.Column("tsb", sa.Float(), nullable=False),
+        sa.ForeignKeyConstraint(["athlete_id"], ["athlete.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("athlete_id", "date"),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table("daily_load")
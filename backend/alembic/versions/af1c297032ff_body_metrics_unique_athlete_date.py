@@ -0,0 +1,75 @@
+"""body_metrics unique (athlete_id, date)
+
+Revision ID: af1c297032ff
+Revises: 03406557077d
+Create Date: 2026-10-17 09:12:05.114702
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = 'af1c297032ff'
+down_revision: Union[str, Sequence[str], None] = '03406557077d'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# value column -> the column whose newest non-null row it is taken from
+# (ftp_source travels with ftp_w)
+_FOLD = {
+    "weight_kg": "weight_kg",
+    "bodyfat_pct": "bodyfat_pct",
+    "vo2max_mlkgmin": "vo2max_mlkgmin",
+    "resting_hr_bpm": "resting_hr_bpm",
+    "ftp_w": "ftp_w",
+    "ftp_source": "ftp_w",
+}
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Duplicates come from the old select-then-insert race and often hold
+    # different fields (weight in one, RHR in the other). The newest row per
+    # athlete/day survives, and each of its columns takes the newest non-null
+    # value of the group first, like log_day's "unset keeps the stored value".
+    sets = ",\n            ".join(
+        f"""{col} = COALESCE((
+                SELECT o.{col} FROM body_metrics o
+                WHERE o.athlete_id = body_metrics.athlete_id AND o.date = body_metrics.date
+                  AND o.{key} IS NOT NULL
+                ORDER BY o.id DESC LIMIT 1
+            ), {col})"""
+        for col, key in _FOLD.items()
+    )
+    op.execute(
+        f"""
+        UPDATE body_metrics SET
+            {sets}
+        WHERE id IN (
+            SELECT MAX(id) FROM body_metrics
+            WHERE athlete_id IS NOT NULL AND date IS NOT NULL
+            GROUP BY athlete_id, date HAVING COUNT(*) > 1
+        )
+        """
+    )
+    op.execute(
+        """
+        DELETE FROM body_metrics
+        WHERE athlete_id IS NOT NULL AND date IS NOT NULL AND id NOT IN (
+            SELECT MAX(id) FROM body_metrics
+            WHERE athlete_id IS NOT NULL AND date IS NOT NULL
+            GROUP BY athlete_id, date
+        )
+        """
+    )
+    op.create_index(
+        "ux_body_metrics_athlete_date", "body_metrics", ["athlete_id", "date"], unique=True
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ux_body_metrics_athlete_date", table_name="body_metrics")
@@ -0,0 +1,71 @@
+"""workout_route and ecg_recording side tables
+
+Revision ID: b7d3e1f0a256
+Revises: 5c0e7b2a91d4
+Create Date: 2026-10-17 12:20:17.904311
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = 'b7d3e1f0a256'
+down_revision: Union[str, Sequence[str], None] = '5c0e7b2a91d4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "workout_route",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("athlete_id", sa.Integer(), nullable=False),
+        sa.Column("source_file", sa.String(), nullable=False),
+        sa.Column("date", sa.Date(), nullable=True),
+        sa.Column("start_time", sa.DateTime(), nullable=True),
+        sa.Column("end_time", sa.DateTime(), nullable=True),
+        sa.Column("points", sa.Integer(), nullable=True),
+        sa.Column("distance_m", sa.Float(), nullable=True),
+        sa.Column("elevation_gain_m", sa.Float(), nullable=True),
+        sa.Column("avg_speed_mps", sa.Float(), nullable=True),
+        sa.Column("max_speed_mps", sa.Float(), nullable=True),
+        sa.Column("avg_hr_bpm", sa.Float(), nullable=True),
+        sa.Column("max_hr_bpm", sa.Float(), nullable=True),
+        sa.ForeignKeyConstraint(["athlete_id"], ["athlete.id"]),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(op.f("ix_workout_route_date"), "workout_route", ["date"], unique=False)
+    op.create_index("ux_workout_route_file", "workout_route", ["athlete_id", "source_file"], unique=True)
+
+    op.create_table(
+        "ecg_recording",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("athlete_id", sa.Integer(), nullable=False),
+        sa.Column("source_file", sa.String(), nullable=False),
+        sa.Column("date", sa.Date(), nullable=True),
+        sa.Column("recorded_at", sa.DateTime(), nullable=True),
+        sa.Column("classification", sa.String(), nullable=True),
+        sa.Column("sample_rate_hz", sa.Float(), nullable=True),
+        sa.Column("samples", sa.Integer(), nullable=True),
+        sa.Column("duration_s", sa.Float(), nullable=True),
+        sa.Column("avg_hr_bpm", sa.Float(), nullable=True),
+        sa.Column("min_uv", sa.Float(), nullable=True),
+        sa.Column("max_uv", sa.Float(), nullable=True),
+        sa.ForeignKeyConstraint(["athlete_id"], ["athlete.id"]),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(op.f("ix_ecg_recording_date"), "ecg_recording", ["date"], unique=False)
+    op.create_index("ux_ecg_recording_file", "ecg_recording", ["athlete_id", "source_file"], unique=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ux_ecg_recording_file", table_name="ecg_recording")
+    op.drop_index(op.f("ix_ecg_recording_date"), table_name="ecg_recording")
+    op.drop_table("ecg_recording")
+    op.drop_index("ux_workout_route_file", table_name="workout_route")
+    op.drop_index(op.f("ix_workout_route_date"), table_name="workout_route")
+    op.drop_table("workout_route")
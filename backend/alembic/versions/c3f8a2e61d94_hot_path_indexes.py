@@ -0,0 +1,40 @@
+"""composite athlete/date indexes and active-goal partial index
+
+Revision ID: c3f8a2e61d94
+Revises: 6a9e3c1d5f72
+Create Date: 2026-10-17 17:48:21.630177
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = 'c3f8a2e61d94'
+down_revision: Union[str, Sequence[str], None] = '6a9e3c1d5f72'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # body_metrics is already covered by ux_body_metrics_athlete_date (af1c297032ff)
+    op.create_index(
+        "ix_activity_athlete_date", "activity", ["athlete_id", "date"],
+        unique=False, postgresql_include=["tss"],
+    )
+    op.create_index(
+        "ix_training_block_athlete_start", "training_block", ["athlete_id", "start_date"], unique=False,
+    )
+    op.create_index(
+        "ix_goals_athlete_active_created", "goals", ["athlete_id", "created_at"],
+        unique=False, postgresql_where=sa.text("active"), sqlite_where=sa.text("active = 1"),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_goals_athlete_active_created", table_name="goals")
+    op.drop_index("ix_training_block_athlete_start", table_name="training_block")
+    op.drop_index("ix_activity_athlete_date", table_name="activity")
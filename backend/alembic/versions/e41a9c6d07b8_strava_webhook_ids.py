@@ -0,0 +1,35 @@
+"""athlete.strava_athlete_id and activity.external_id for Strava webhooks
+
+Revision ID: e41a9c6d07b8
+Revises: b7d3e1f0a256
+Create Date: 2026-10-17 14:05:52.417630
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = 'e41a9c6d07b8'
+down_revision: Union[str, Sequence[str], None] = 'b7d3e1f0a256'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column("athlete", sa.Column("strava_athlete_id", sa.BigInteger(), nullable=True))
+    op.create_index(op.f("ix_athlete_strava_athlete_id"), "athlete", ["strava_athlete_id"], unique=False)
+    op.add_column("activity", sa.Column("external_id", sa.String(), nullable=True))
+    op.create_index("ix_activity_source_external_id", "activity", ["source", "external_id"], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_activity_source_external_id", table_name="activity")
+    op.drop_index(op.f("ix_athlete_strava_athlete_id"), table_name="athlete")
+    with op.batch_alter_table("activity") as batch_op:
+        batch_op.drop_column("external_id")
+    with op.batch_alter_table("athlete") as batch_op:
+        batch_op.drop_column("strava_athlete_id")
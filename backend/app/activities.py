@@ -0,0 +1,201 @@
+# backend/app/activities.py
+"""
+Single write path for Activity rows.
+
+Every importer (Apple Health, Strava, POST /activities) builds rows with
+`activity_row` and writes them with `insert_activities`: one set-based
+INSERT … ON CONFLICT DO NOTHING against the (athlete_id, fingerprint)
+unique index, so re-imports never duplicate workouts. New rows also roll
+forward the athlete's daily_load (app.load).
+
+Manual entries carry no fingerprint (NULLs never conflict): two sessions on
+the same day with the same sport and duration are both kept. Rows stored
+before fingerprints existed are "legacy:<id>"; an import that brings the
+same athlete, day, sport and duration claims such a row (see
+`_adopt_legacy`) instead of inserting the workout a second time.
+"""
+from collections import defaultdict
+from datetime import date, datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import bindparam, exists, select, update
+from sqlalchemy.orm import Session
+
+from models import Activity, ActivityStream
+from app import load
+from app.bulk import upsert_rows, upsert_stmt
+
+MANUAL_SOURCE = "manual"
+LEGACY_PREFIX = "legacy:"
+
+
+def activity_fingerprint(
+    source: str,
+    day: date,
+    sport: Optional[str],
+    duration_min: Optional[int],
+    start_time: Optional[datetime] = None,
+    external_id: Optional[str] = None,
+) -> Optional[str]:
+    """
+    "<source>:id:<external_id>" when the source has its own id (Strava), so
+    edits at the source keep the key; otherwise
+    "<source>:<start>:<sport>:<duration_min>", where <start> is the UTC start
+    minute when known and the ISO day otherwise. None for manual entries,
+    which are never deduplicated.
+    """
+    if source == MANUAL_SOURCE:
+        return None
+    if external_id:
+        return f"{source}:id:{external_id}"
+    start = start_time.strftime("%Y-%m-%dT%H:%M") if start_time else day.isoformat()
+    dur = "" if duration_min is None else str(int(duration_min))
+    return f"{source}:{start}:{sport or ''}:{dur}"
+
+
+def activity_row(
+    athlete_id: int,
+    *,
+    day: date,
+    sport: Optional[str],
+    duration_min: Optional[int],
+    tss: Optional[int],
+    source: str = "manual",
+    start_time: Optional[datetime] = None,
+    external_id: Optional[str] = None,
+) -> Dict[str, Any]:
+    return {
+        "athlete_id": athlete_id,
+        "date": day,
+        "sport": sport,
+        "duration_min": duration_min,
+        "tss": tss,
+        "source": source,
+        "start_time": start_time,
+        "external_id": external_id,
+        "fingerprint": activity_fingerprint(source, day, sport, duration_min, start_time, external_id),
+    }
+
+
+def _adopt_legacy(db: Session, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Day-level fallback for rows stored before fingerprints: an imported row
+    whose fingerprint is not stored yet takes over a legacy row with the same
+    athlete, day, sport and duration (source, start time, external id and
+    fingerprint are filled in; TSS is kept). Returns the rows still to insert.
+    """
+    keyed = [r for r in rows if r["fingerprint"]]
+    if not keyed:
+        return rows
+    athletes = {r["athlete_id"] for r in keyed}
+    days = {r["date"] for r in keyed}
+    legacy: Dict[Tuple, List[int]] = defaultdict(list)
+    for r in db.execute(
+        select(Activity.id, Activity.athlete_id, Activity.date, Activity.sport, Activity.duration_min)
+        .where(
+            Activity.athlete_id.in_(athletes), Activity.date.in_(days),
+            Activity.fingerprint.like(LEGACY_PREFIX + "%"),
+        )
+        .order_by(Activity.id)
+    ).all():
+        legacy[(r.athlete_id, r.date, r.sport, r.duration_min)].append(r.id)
+    if not legacy:
+        return rows
+
+    stored = set(db.execute(
+        select(Activity.athlete_id, Activity.fingerprint).where(
+            Activity.athlete_id.in_(athletes),
+            Activity.fingerprint.in_({r["fingerprint"] for r in keyed}),
+        )
+    ).all())
+    claims, rest = [], []
+    for r in rows:
+        ids = legacy.get((r["athlete_id"], r["date"], r["sport"], r["duration_min"]))
+        if r["fingerprint"] and ids and (r["athlete_id"], r["fingerprint"]) not in stored:
+            stored.add((r["athlete_id"], r["fingerprint"]))
+            claims.append({
+                "_id": ids.pop(0), "_source": r["source"], "_start_time": r["start_time"],
+                "_external_id": r["external_id"], "_fingerprint": r["fingerprint"],
+            })
+        else:
+            rest.append(r)
+    if claims:
+        t = Activity.__table__
+        db.execute(
+            update(t).where(t.c.id == bindparam("_id")).values(
+                source=bindparam("_source"), start_time=bindparam("_start_time"),
+                external_id=bindparam("_external_id"), fingerprint=bindparam("_fingerprint"),
+            ),
+            claims,
+        )
+    return rest
+
+
+def insert_activities(db: Session, rows: Iterable[Dict[str, Any]]) -> int:
+    """
+    Insert rows, silently dropping ones already stored, and bring daily_load
+    up to date from the earliest new day. Returns rows inserted. Does not commit.
+    """
+    rows = _adopt_legacy(db, list(rows))
+    inserted = upsert_rows(db, Activity.__table__, rows, conflict_cols=["athlete_id", "fingerprint"])
+    if inserted:
+        load.recompute(db, load.earliest(rows))
+    return inserted
+
+
+def upsert_activities(db: Session, rows: Iterable[Dict[str, Any]]) -> int:
+    """
+    Insert rows or update the stored row with the same fingerprint in place
+    (day, sport, duration, start time, TSS). The row keeps its id and
+    streams, and a TSS computed from power streams is not replaced by the
+    incoming estimate. Brings daily_load up to date from the earliest day
+    touched, old or new. Returns rows written. Does not commit.
+    """
+    rows = _adopt_legacy(db, list(rows))
+    keyed = [r for r in rows if r["fingerprint"]]
+    if not keyed:
+        return insert_activities(db, rows)
+    t = Activity.__table__
+    old = db.execute(
+        select(t.c.athlete_id, t.c.date).where(
+            t.c.athlete_id.in_({r["athlete_id"] for r in keyed}),
+            t.c.fingerprint.in_({r["fingerprint"] for r in keyed}),
+        )
+    ).mappings().all()
+    written = upsert_rows(
+        db, t, rows, conflict_cols=["athlete_id", "fingerprint"],
+        update_cols=["date", "sport", "duration_min", "start_time", "external_id"],
+    )
+    has_power_tss = exists().where(ActivityStream.activity_id == t.c.id, ActivityStream.tss.is_not(None))
+    db.execute(
+        update(t)
+        .where(t.c.athlete_id == bindparam("_athlete_id"), t.c.fingerprint == bindparam("_fingerprint"), ~has_power_tss)
+        .values(tss=bindparam("_tss")),
+        [{"_athlete_id": r["athlete_id"], "_fingerprint": r["fingerprint"], "_tss": r["tss"]} for r in keyed],
+    )
+    if written:
+        load.recompute(db, load.earliest(list(old) + rows))
+    return written
+
+
+def insert_activity(db: Session, row: Dict[str, Any]) -> Tuple[Optional[int], bool]:
+    """One row through the same path: (id of the new or already stored row, inserted?). Does not commit."""
+    rest = _adopt_legacy(db, [row])
+    if rest:
+        new_id = db.execute(
+            upsert_stmt(db, Activity.__table__, [row], conflict_cols=["athlete_id", "fingerprint"])
+            .returning(Activity.id)
+        ).scalar()
+        if new_id is not None:
+            load.recompute(db, load.earliest([row]))
+            return new_id, True
+    return find_activity_id(db, row["athlete_id"], row["fingerprint"]), False
+
+
+def find_activity_id(db: Session, athlete_id: int, fingerprint: str) -> Optional[int]:
+    return db.execute(
+        select(Activity.id).where(
+            Activity.athlete_id == athlete_id,
+            Activity.fingerprint == fingerprint,
+        )
+    ).scalar()
@@ -0,0 +1,199 @@
+# backend/app/apple_health.py
+"""
+Apple Health import engine: streams export.xml through the shared parser
+(utils/apple_health_parser.py, also used by the Streamlit admin page) and
+writes the result with batched upserts.
+
+Memory stays flat regardless of export size: metrics accumulate in columnar
+buffers bounded by `since_days`, and workouts are flushed to the DB in
+batches while parsing.
+
+Re-imports are incremental: a per-athlete, per-record-type high-water mark
+(see ImportWatermark) lets the parser drop whole <Record>/<Workout> elements
+at the byte level, before anything is decoded.
+"""
+import logging
+import math
+import resource
+import sys
+import time
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import IO, Any, Callable, Dict, List, Optional
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from models import Athlete, BodyMetrics, ImportWatermark
+from app.activities import activity_row, insert_activities
+from app.body_metrics import METRIC_FIELDS, day_row, upsert_days
+from app.bulk import BULK_BATCH_SIZE, upsert_rows
+
+# the parser lives with the Streamlit app at the repo root
+ROOT = Path(__file__).resolve().parents[2]
+if str(ROOT) not in sys.path:
+    sys.path.append(str(ROOT))
+
+from utils.apple_health_parser import WORKOUT_KEY, ExportParser, end_utc  # noqa: E402
+
+log = logging.getLogger("uvicorn.error")
+
+# progress(phase, counters) — called every PROGRESS_EVERY records and on phase changes
+ProgressFn = Callable[[str, Dict[str, Any]], None]
+
+
+WATERMARK_SOURCE = "apple_health"
+
+
+def peak_rss_mb() -> float:
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS reports bytes
+    return round(rss / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def _activity_row(athlete_id: int, w: Dict[str, Any]) -> Dict[str, Any]:
+    return activity_row(
+        athlete_id,
+        day=w["date"],
+        sport="bike",
+        duration_min=int(round(w["duration_min"])),
+        tss=int(round(w["duration_min"] * 0.75)),  # rough eTSS
+        source=WATERMARK_SOURCE,
+        start_time=end_utc(w["start"]) if w["start"] else None,
+    )
+
+
+def _upsert_days(db: Session, athlete_id: int, daily: Dict[str, Any]) -> int:
+    cols = {f: daily[f].tolist() for f in METRIC_FIELDS}
+    rows = []
+    for i, d in enumerate(daily["date"].tolist()):
+        vals = {f: (None if math.isnan(cols[f][i]) else cols[f][i]) for f in METRIC_FIELDS}
+        if any(v is not None for v in vals.values()):
+            rows.append(day_row(athlete_id, d, vals))
+    upsert_days(db, rows)
+    return len(rows)
+
+
+def _load_watermarks(db: Session, athlete_id: int) -> Dict[str, ImportWatermark]:
+    rows = db.execute(
+        select(ImportWatermark).where(
+            ImportWatermark.athlete_id == athlete_id,
+            ImportWatermark.source == WATERMARK_SOURCE,
+        )
+    ).scalars().all()
+    return {r.record_type: r for r in rows}
+
+
+def _save_watermarks(
+    db: Session,
+    athlete_id: int,
+    old: Dict[str, ImportWatermark],
+    seen: Dict[str, datetime],
+    covered_from: date,
+) -> None:
+    now = datetime.utcnow()
+    rows = []
+    for key in set(old) | set(seen):
+        prev = old.get(key)
+        last_end = max(filter(None, [prev.last_end if prev else None, seen.get(key)]))
+        rows.append({
+            "athlete_id": athlete_id, "source": WATERMARK_SOURCE, "record_type": key,
+            "last_end": last_end, "last_day": last_end.date(),
+            "covered_from": covered_from, "updated_at": now,
+        })
+    upsert_rows(
+        db, ImportWatermark.__table__, rows,
+        conflict_cols=["athlete_id", "source", "record_type"],
+        update_cols=["last_end", "last_day", "covered_from", "updated_at"],
+    )
+
+
+def _refresh_athlete_snapshot(db: Session, athlete_id: int) -> None:
+    a = db.get(Athlete, athlete_id)
+    if not a:
+        return
+    latest = db.execute(
+        select(BodyMetrics)
+        .where(BodyMetrics.athlete_id == athlete_id)
+        .order_by(BodyMetrics.date.desc())
+    ).scalars().first()
+    if latest:
+        if latest.ftp_w: a.ftp_w = latest.ftp_w
+        if latest.resting_hr_bpm: a.rhr = latest.resting_hr_bpm
+        if latest.vo2max_mlkgmin: a.vo2max = latest.vo2max_mlkgmin
+        if latest.weight_kg: a.weight_kg = latest.weight_kg
+
+
+def import_export_xml(
+    db: Session,
+    athlete_id: int,
+    fh: IO[bytes],
+    *,
+    since_days: int = 180,
+    batch_size: int = BULK_BATCH_SIZE,
+    progress: Optional[ProgressFn] = None,
+) -> Dict[str, Any]:
+    """
+    Stream an export.xml file object into BodyMetrics/Activity and commit.
+
+    Elements older than the athlete's stored high-water mark are skipped
+    unless `since_days` reaches further back than any previous import did,
+    in which case the whole window is re-walked once.
+    """
+    started = time.perf_counter()
+    cutoff = date.today() - timedelta(days=since_days)
+
+    marks = _load_watermarks(db, athlete_id)
+    covered_from = min((m.covered_from for m in marks.values() if m.covered_from), default=None)
+    use_marks = bool(marks) and covered_from is not None and covered_from <= cutoff
+    if not use_marks:
+        covered_from = cutoff
+
+    written = {"workouts": 0}
+
+    def flush(batch: List[Dict[str, Any]]) -> None:
+        written["workouts"] += insert_activities(db, [_activity_row(athlete_id, w) for w in batch])
+
+    def report(phase: str) -> None:
+        if progress:
+            progress(phase, {
+                "records_parsed": parser.records_parsed,
+                "records_skipped": sum(parser.skipped.values()),
+                "workouts_imported": written["workouts"],
+            })
+
+    parser = ExportParser(
+        cutoff=cutoff,
+        day_marks={k: m.last_day for k, m in marks.items() if use_marks and m.last_day},
+        workout_mark=marks[WORKOUT_KEY].last_end if use_marks and WORKOUT_KEY in marks else None,
+        on_workouts=flush,
+        workout_batch=batch_size,
+        on_tick=lambda: report("parsing"),
+    )
+    report("parsing")
+    parser.parse(fh)
+
+    report("writing")
+    days = _upsert_days(db, athlete_id, parser.daily())
+    _save_watermarks(db, athlete_id, marks, parser.last_end, covered_from)
+    db.commit()
+
+    _refresh_athlete_snapshot(db, athlete_id)
+    db.commit()
+
+    elapsed = time.perf_counter() - started
+    out = {
+        "metrics_days_imported": days,
+        "workouts_imported": written["workouts"],
+        **parser.stats(),
+        "incremental": use_marks,
+        "elapsed_s": round(elapsed, 2),
+        "records_per_sec": int(parser.records_scanned / elapsed) if elapsed > 0 else None,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+    log.info(
+        f"Apple import done: days={days}, workouts={written['workouts']}, "
+        f"skipped={out['records_skipped']} ({out['bytes_skipped']} bytes), "
+        f"{out['records_per_sec']} rec/s, peak_rss={out['peak_rss_mb']}MB"
+    )
+    return out
@@ -0,0 +1,276 @@
+# backend/app/apple_health_media.py
+"""
+Optional Apple Health import stage for the per-file members of the export:
+workout-routes/*.gpx and electrocardiograms/*.csv.
+
+Exports carry thousands of these small files, so each member is decompressed
+and summarised in its own pool task (one ZipFile handle per worker process)
+and the parent only batches the summary rows into workout_route /
+ecg_recording. Members already imported for the athlete are skipped.
+"""
+import logging
+import math
+import multiprocessing
+import os
+import re
+import sys
+import xml.etree.ElementTree as ET
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from models import EcgRecording, WorkoutRoute
+from app.bulk import upsert_rows
+
+ROOT = Path(__file__).resolve().parents[2]
+if str(ROOT) not in sys.path:
+    sys.path.append(str(ROOT))
+
+from utils.apple_health_parser import end_utc  # noqa: E402
+
+log = logging.getLogger("uvicorn.error")
+
+MEDIA_WORKERS = int(os.getenv("MEDIA_WORKERS", "0")) or (os.cpu_count() or 2)
+
+ROUTE_DIR = "workout-routes/"
+ECG_DIR = "electrocardiograms/"
+
+_EARTH_RADIUS_M = 6371008.8
+_FILE_DAY = re.compile(r"(\d{4}-\d{2}-\d{2})")
+
+# per-worker-process ZipFile handles, keyed by path
+_zips: Dict[str, zipfile.ZipFile] = {}
+
+
+def _open_member(zip_path: str, name: str) -> bytes:
+    zf = _zips.get(zip_path)
+    if zf is None:
+        zf = _zips[zip_path] = zipfile.ZipFile(zip_path)
+    return zf.read(name)
+
+
+# -------- GPX routes --------
+def _to_float(v: Optional[str]) -> float:
+    try:
+        return float(v)
+    except (TypeError, ValueError):
+        return math.nan
+
+
+def _haversine_m(lat: np.ndarray, lon: np.ndarray) -> np.ndarray:
+    la, lo = np.radians(lat), np.radians(lon)
+    a = np.sin(np.diff(la) / 2) ** 2 + np.cos(la[:-1]) * np.cos(la[1:]) * np.sin(np.diff(lo) / 2) ** 2
+    return 2 * _EARTH_RADIUS_M * np.arcsin(np.sqrt(a))
+
+
+def _nan_stat(fn, v: np.ndarray) -> Optional[float]:
+    v = v[~np.isnan(v)]
+    return round(float(fn(v)), 2) if len(v) else None
+
+
+def summarize_gpx(data: bytes) -> Optional[Dict[str, Any]]:
+    # route files are small: one C-level tree build beats iterparse events
+    root = ET.fromstring(data)
+    ns = root.tag[:root.tag.index("}") + 1] if root.tag.startswith("{") else ""
+    lat: List[float] = []
+    lon: List[float] = []
+    ele: List[float] = []
+    ts: List[str] = []
+    speed: List[float] = []
+    hr: List[float] = []
+
+    for pt in root.iter(f"{ns}trkpt"):
+        try:
+            la, lo = float(pt.get("lat")), float(pt.get("lon"))
+        except (TypeError, ValueError):
+            continue
+        vals: Dict[str, Any] = {}
+        for child in pt.iter():
+            tag = child.tag.rpartition("}")[2]
+            if tag in ("ele", "speed", "hr", "time") and child.text:
+                vals[tag] = child.text.strip()
+        lat.append(la)
+        lon.append(lo)
+        ele.append(_to_float(vals.get("ele")))
+        ts.append(vals.get("time", "")[:19])  # whole seconds, drop "Z"/offset
+        speed.append(_to_float(vals.get("speed")))
+        hr.append(_to_float(vals.get("hr")))
+
+    if len(lat) < 2:
+        return None
+
+    t = np.array([s or "NaT" for s in ts], dtype="datetime64[s]")
+    step = _haversine_m(np.array(lat), np.array(lon))
+    ele_a = np.array(ele)
+    climb = np.diff(ele_a)
+    spd = np.array(speed)
+    if np.isnan(spd).all():
+        # no <speed> extension: derive it from point spacing
+        dt = np.diff(t).astype("float64")
+        with np.errstate(divide="ignore", invalid="ignore"):
+            spd = np.where(dt > 0, step / dt, np.nan)
+
+    valid_t = t[~np.isnat(t)]
+    start = valid_t.min().astype(datetime) if len(valid_t) else None
+    end = valid_t.max().astype(datetime) if len(valid_t) else None
+    return {
+        "date": start.date() if start else None,
+        "start_time": start,
+        "end_time": end,
+        "points": len(lat),
+        "distance_m": round(float(step.sum()), 1),
+        "elevation_gain_m": round(float(climb[climb > 0].sum()), 1) if not np.isnan(ele_a).all() else None,
+        "avg_speed_mps": _nan_stat(np.mean, spd),
+        "max_speed_mps": _nan_stat(np.max, spd),
+        "avg_hr_bpm": _nan_stat(np.mean, np.array(hr)),
+        "max_hr_bpm": _nan_stat(np.max, np.array(hr)),
+    }
+
+
+# -------- ECG CSV --------
+def _estimate_hr(x: np.ndarray, fs: float) -> Optional[float]:
+    if len(x) < fs * 2:
+        return None
+    thr = x.mean() + 0.6 * (x.max() - x.mean())
+    mid = x[1:-1]
+    peaks = np.flatnonzero((mid > thr) & (mid >= x[:-2]) & (mid > x[2:])) + 1
+    if len(peaks) < 2:
+        return None
+    # 250 ms refractory period: drop peaks too close to the previous one
+    peaks = peaks[np.r_[True, np.diff(peaks) >= 0.25 * fs]]
+    if len(peaks) < 2:
+        return None
+    return round(float(60.0 * (len(peaks) - 1) * fs / (peaks[-1] - peaks[0])), 1)
+
+
+def summarize_ecg(data: bytes) -> Optional[Dict[str, Any]]:
+    header: Dict[str, str] = {}
+    values: List[str] = []
+    for line in data.decode("utf-8", errors="replace").splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        key, sep, rest = line.partition(",")
+        if sep and not values and not key.lstrip("-").replace(".", "", 1).isdigit():
+            header[key.strip().lower()] = rest.strip().strip('"')
+        else:
+            values.append(line.split(",")[0])
+
+    try:
+        x = np.array(values, dtype=np.float64)
+    except ValueError:
+        return None
+    if not len(x):
+        return None
+
+    fs_match = re.match(r"[\d.]+", header.get("sample rate", ""))
+    fs = float(fs_match.group(0)) if fs_match else None
+    recorded = end_utc(header["recorded date"]) if header.get("recorded date") else None
+    return {
+        "date": recorded.date() if recorded else None,
+        "recorded_at": recorded,
+        "classification": header.get("classification") or None,
+        "sample_rate_hz": fs,
+        "samples": len(x),
+        "duration_s": round(len(x) / fs, 2) if fs else None,
+        "avg_hr_bpm": _estimate_hr(x, fs) if fs else None,
+        "min_uv": round(float(x.min()), 2),
+        "max_uv": round(float(x.max()), 2),
+    }
+
+
+# -------- Pool task --------
+def _summarize_member(job: Tuple[str, str]) -> Tuple[str, Optional[Dict[str, Any]], Optional[str]]:
+    zip_path, name = job
+    try:
+        data = _open_member(zip_path, name)
+        fn = summarize_gpx if ROUTE_DIR in name else summarize_ecg
+        return name, fn(data), None
+    except Exception as e:  # one bad file must not sink the stage
+        return name, None, str(e)
+
+
+def _member_day(name: str) -> Optional[date]:
+    m = _FILE_DAY.search(name.rsplit("/", 1)[-1])
+    try:
+        return date.fromisoformat(m.group(1)) if m else None
+    except ValueError:
+        return None
+
+
+def list_media_members(zf: zipfile.ZipFile, cutoff: Optional[date] = None) -> List[str]:
+    out = []
+    for name in zf.namelist():
+        if not ((ROUTE_DIR in name and name.endswith(".gpx")) or (ECG_DIR in name and name.endswith(".csv"))):
+            continue
+        day = _member_day(name)
+        if cutoff and day and day < cutoff:
+            continue
+        out.append(name)
+    return out
+
+
+def _imported_files(db: Session, athlete_id: int) -> set:
+    done = set()
+    for model in (WorkoutRoute, EcgRecording):
+        done.update(db.execute(select(model.source_file).where(model.athlete_id == athlete_id)).scalars())
+    return done
+
+
+def import_media(
+    db: Session,
+    athlete_id: int,
+    zip_path: str,
+    *,
+    since_days: int = 180,
+    workers: int = MEDIA_WORKERS,
+    progress: Optional[Callable[[Dict[str, Any], bool], None]] = None,
+) -> Dict[str, Any]:
+    """Summarise route/ECG members in parallel and upsert them. Commits."""
+    cutoff = date.today() - timedelta(days=since_days)
+    with zipfile.ZipFile(zip_path) as zf:
+        members = list_media_members(zf, cutoff)
+    done = _imported_files(db, athlete_id)
+    todo = [n for n in members if n not in done]
+
+    routes: List[Dict[str, Any]] = []
+    ecgs: List[Dict[str, Any]] = []
+    failed = 0
+    if todo:
+        workers = max(1, min(workers, len(todo)))
+        chunk = max(1, len(todo) // (workers * 8))
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+            results = pool.map(_summarize_member, [(zip_path, n) for n in todo], chunksize=chunk)
+            for i, (name, summary, err) in enumerate(results, 1):
+                if err is not None or summary is None:
+                    failed += 1
+                    if err:
+                        log.warning(f"apple media: {name}: {err}")
+                else:
+                    row = {"athlete_id": athlete_id, "source_file": name, **summary}
+                    (routes if ROUTE_DIR in name else ecgs).append(row)
+                if progress:
+                    progress({"media_done": i, "media_total": len(todo)}, i == len(todo))
+
+    for model, rows in ((WorkoutRoute, routes), (EcgRecording, ecgs)):
+        if rows:
+            upsert_rows(
+                db, model.__table__, rows,
+                conflict_cols=["athlete_id", "source_file"],
+                update_cols=[c for c in rows[0] if c not in ("athlete_id", "source_file")],
+            )
+    db.commit()
+    return {
+        "media_members": len(members),
+        "media_already_imported": len(members) - len(todo),
+        "routes_imported": len(routes),
+        "ecgs_imported": len(ecgs),
+        "media_failed": failed,
+        "media_workers": workers if todo else 0,
+    }
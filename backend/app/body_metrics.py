@@ -0,0 +1,55 @@
+# backend/app/body_metrics.py
+"""
+Single write path for BodyMetrics rows.
+
+Quick logs (both /metrics/log routes) and the Apple Health import write
+through `upsert_days`: one INSERT … ON CONFLICT (athlete_id, date) DO UPDATE
+against ux_body_metrics_athlete_date, instead of select-then-insert, so
+concurrent writers for the same day merge into one row. A NULL field in the
+incoming row keeps the stored value.
+"""
+from datetime import date
+from typing import Any, Dict, Iterable, Optional, Sequence
+
+from sqlalchemy.orm import Session
+
+from models import BodyMetrics
+from app.bulk import upsert_rows, upsert_stmt
+
+# the BodyMetrics value columns (the Apple Health parser also emits hrv_ms, which has no column yet)
+METRIC_FIELDS = ["weight_kg", "bodyfat_pct", "vo2max_mlkgmin", "resting_hr_bpm", "ftp_w"]
+
+CONFLICT_COLS = ["athlete_id", "date"]
+
+
+def day_row(athlete_id: int, day: date, values: Dict[str, Any]) -> Dict[str, Any]:
+    """A full-width row: fields missing from `values` are NULL and leave stored values alone."""
+    return {"athlete_id": athlete_id, "date": day, **{f: values.get(f) for f in METRIC_FIELDS}}
+
+
+def upsert_days(db: Session, rows: Iterable[Dict[str, Any]]) -> int:
+    """Upsert `day_row` rows in batches. Does not commit."""
+    return upsert_rows(
+        db, BodyMetrics.__table__, rows,
+        conflict_cols=CONFLICT_COLS, update_cols=METRIC_FIELDS,
+    )
+
+
+def log_day(
+    db: Session,
+    athlete_id: int,
+    day: date,
+    values: Dict[str, Any],
+    fields: Optional[Sequence[str]] = None,
+) -> Dict[str, Any]:
+    """
+    Upsert one day and return the merged values of `fields` (default all)
+    from the same statement via RETURNING. Does not commit.
+    """
+    table = BodyMetrics.__table__
+    fields = list(fields or METRIC_FIELDS)
+    stmt = upsert_stmt(
+        db, table, [day_row(athlete_id, day, values)],
+        conflict_cols=CONFLICT_COLS, update_cols=METRIC_FIELDS,
+    ).returning(*(table.c[f] for f in fields))
+    return dict(db.execute(stmt).mappings().one())
@@ -0,0 +1,76 @@
+# backend/app/bulk.py
+"""Dialect-aware multi-row INSERT … ON CONFLICT helpers (Postgres + SQLite)."""
+import os
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+from sqlalchemy import Table, func
+from sqlalchemy.orm import Session
+
+# Rows per INSERT statement. SQLite caps bound parameters at 32766, so keep
+# rows * columns well under that.
+BULK_BATCH_SIZE = int(os.getenv("BULK_BATCH_SIZE", "500"))
+
+
+def _insert_for(db: Session):
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        raise RuntimeError(f"bulk upsert not supported on dialect '{dialect}'")
+    return insert
+
+
+def _batches(rows: Iterable[Dict[str, Any]], size: int):
+    batch: List[Dict[str, Any]] = []
+    for r in rows:
+        batch.append(r)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def upsert_stmt(
+    db: Session,
+    table: Table,
+    rows: List[Dict[str, Any]],
+    *,
+    conflict_cols: Optional[Sequence[str]] = None,
+    update_cols: Sequence[str] = (),
+):
+    """The INSERT … ON CONFLICT statement `upsert_rows` runs for one batch (add `.returning()` as needed)."""
+    stmt = _insert_for(db)(table).values(rows)
+    if update_cols:
+        return stmt.on_conflict_do_update(
+            index_elements=list(conflict_cols or ()),
+            set_={c: func.coalesce(stmt.excluded[c], table.c[c]) for c in update_cols},
+        )
+    return stmt.on_conflict_do_nothing(index_elements=list(conflict_cols) if conflict_cols else None)
+
+
+def upsert_rows(
+    db: Session,
+    table: Table,
+    rows: Iterable[Dict[str, Any]],
+    *,
+    conflict_cols: Optional[Sequence[str]] = None,
+    update_cols: Sequence[str] = (),
+    batch_size: int = BULK_BATCH_SIZE,
+) -> int:
+    """
+    Push rows through `INSERT … VALUES (…), (…) ON CONFLICT` in batches.
+
+    With `update_cols`, conflicting rows are updated with
+    COALESCE(excluded.col, col), so a NULL in the incoming row never wipes an
+    existing value. Without it, conflicting rows are ignored. Every row must
+    carry the same keys. Returns the driver-reported affected row count.
+    Does not commit.
+    """
+    affected = 0
+    for batch in _batches(rows, batch_size):
+        res = db.execute(upsert_stmt(db, table, batch, conflict_cols=conflict_cols, update_cols=update_cols))
+        affected += max(res.rowcount or 0, 0)
+    return affected
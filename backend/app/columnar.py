@@ -0,0 +1,134 @@
+# backend/app/columnar.py
+"""
+Column-oriented encodings for long time-series responses.
+
+Routes hand over `{name: [values...]}` plus a little metadata; the client
+picks the wire format with `Accept`:
+
+- application/json (default): the route's own JSON document
+- application/vnd.apache.arrow.stream: one Arrow IPC stream
+- application/vnd.apache.parquet (or application/x-parquet): a Parquet file
+
+Arrow and Parquet need pyarrow; without it those media types answer 406.
+JSON and Arrow bodies are compressed per `Accept-Encoding` (brotli when the
+`brotli` package is installed, else gzip). Parquet is already compressed
+column by column and is sent as is.
+"""
+import gzip
+import io
+import json
+import os
+from typing import Any, Dict, List, Optional, Tuple
+
+from fastapi import HTTPException, Response
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc
+    import pyarrow.parquet
+except ImportError:  # Arrow/Parquet output disabled
+    pa = None
+
+try:
+    import brotli
+except ImportError:  # gzip only
+    brotli = None
+
+JSON = "application/json"
+ARROW_STREAM = "application/vnd.apache.arrow.stream"
+PARQUET = "application/vnd.apache.parquet"
+_MEDIA_TYPES = {
+    JSON: JSON, "application/*": JSON, "*/*": JSON,
+    ARROW_STREAM: ARROW_STREAM,
+    PARQUET: PARQUET, "application/x-parquet": PARQUET,
+}
+
+# bodies below this are sent uncompressed; the header overhead is not worth it
+COMPRESS_MIN_BYTES = int(os.getenv("COMPRESS_MIN_BYTES", "1024"))
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", "6"))
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", "5"))
+
+
+def _ranked(header: Optional[str]) -> List[str]:
+    """Tokens of an Accept / Accept-Encoding header, highest q first; q=0 entries dropped."""
+    ranked = []
+    for i, part in enumerate((header or "").split(",")):
+        token, *params = [p.strip() for p in part.split(";")]
+        q = 1.0
+        for p in params:
+            if p.startswith("q="):
+                try:
+                    q = float(p[2:])
+                except ValueError:
+                    q = 0.0
+        if token and q > 0:
+            ranked.append((-q, i, token.lower()))
+    return [t for _, _, t in sorted(ranked)]
+
+
+def negotiate(accept: Optional[str]) -> str:
+    """The media type to answer with; unknown or missing Accept falls back to JSON."""
+    for token in _ranked(accept):
+        if token in _MEDIA_TYPES:
+            media_type = _MEDIA_TYPES[token]
+            if media_type != JSON and pa is None:
+                raise HTTPException(status_code=406, detail="pyarrow_not_installed")
+            return media_type
+    return JSON
+
+
+def to_arrow(columns: Dict[str, List[Any]], metadata: Dict[str, Any]):
+    # "date" becomes date32, everything else float64 (NULLs preserved)
+    arrays = {
+        name: pa.array(values, type=pa.date32() if name == "date" else pa.float64())
+        for name, values in columns.items()
+    }
+    table = pa.table(arrays)
+    return table.replace_schema_metadata({k: json.dumps(v, default=str) for k, v in metadata.items()})
+
+
+def _arrow_bytes(table, media_type: str) -> bytes:
+    buf = io.BytesIO()
+    if media_type == PARQUET:
+        pa.parquet.write_table(table, buf, compression="zstd")
+    else:
+        with pa.ipc.new_stream(buf, table.schema) as writer:
+            writer.write_table(table)
+    return buf.getvalue()
+
+
+def compress(body: bytes, accept_encoding: Optional[str]) -> Tuple[bytes, Optional[str]]:
+    """(body, Content-Encoding) for the best encoding the client accepts."""
+    if len(body) < COMPRESS_MIN_BYTES:
+        return body, None
+    for token in _ranked(accept_encoding):
+        if token == "br" and brotli is not None:
+            return brotli.compress(body, quality=BROTLI_QUALITY), "br"
+        if token in ("gzip", "*"):
+            return gzip.compress(body, compresslevel=GZIP_LEVEL), "gzip"
+    return body, None
+
+
+def respond(
+    media_type: str,
+    accept_encoding: Optional[str],
+    document: Any,
+    columns: Optional[Dict[str, List[Any]]] = None,
+    metadata: Optional[Dict[str, Any]] = None,
+) -> Response:
+    """
+    Encode a response in the negotiated `media_type`: `document` as JSON, or
+    `columns` (+ `metadata`, JSON-encoded, in the schema) as Arrow/Parquet.
+    """
+    if media_type == JSON:
+        body = json.dumps(document, separators=(",", ":"), default=str).encode()
+    else:
+        body = _arrow_bytes(to_arrow(columns or {}, metadata or {}), media_type)
+
+    encoding = None
+    if media_type != PARQUET:
+        body, encoding = compress(body, accept_encoding)
+    headers = {"Vary": "Accept, Accept-Encoding"}
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    return Response(content=body, media_type=media_type, headers=headers)
@@ -0,0 +1,192 @@
+# backend/app/jobs.py
+"""
+Local background job queue for long-running imports.
+
+Uploads are spooled to JOBS_DIR and handed to a process pool, so parsing
+never holds the API process's GIL, a request worker or a DB session. Job
+state lives in a small JSON file next to the spooled upload; any uvicorn
+worker on the same host can answer `/jobs/{id}` from it.
+"""
+import json
+import logging
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+import uuid
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from typing import IO, Any, Dict, Optional
+
+log = logging.getLogger("uvicorn.error")
+
+JOBS_DIR = os.getenv("JOBS_DIR", os.path.join(tempfile.gettempdir(), "endurance_jobs"))
+IMPORT_WORKERS = int(os.getenv("IMPORT_WORKERS", "2"))
+
+# state writes from the worker are throttled to this interval (seconds)
+_PROGRESS_MIN_INTERVAL = 1.0
+
+_pool: Optional[ProcessPoolExecutor] = None
+
+
+# -------- Job state (JSON file per job) --------
+def _state_path(job_id: str) -> str:
+    return os.path.join(JOBS_DIR, f"{job_id}.json")
+
+
+def _write_state(job_id: str, state: Dict[str, Any]) -> None:
+    tmp = _state_path(job_id) + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(state, f, default=str)
+    os.replace(tmp, _state_path(job_id))  # atomic: readers never see a half-written file
+
+
+def read_job(job_id: str) -> Optional[Dict[str, Any]]:
+    # job ids are uuid hex; refuse anything that could escape JOBS_DIR
+    if not job_id.isalnum():
+        return None
+    try:
+        with open(_state_path(job_id)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def update_job(job_id: str, **fields: Any) -> Dict[str, Any]:
+    state = read_job(job_id) or {"id": job_id}
+    state.update(fields)
+    state["updated_at"] = time.time()
+    _write_state(job_id, state)
+    return state
+
+
+def create_job(kind: str, **meta: Any) -> str:
+    os.makedirs(JOBS_DIR, exist_ok=True)
+    job_id = uuid.uuid4().hex
+    now = time.time()
+    _write_state(job_id, {
+        "id": job_id, "kind": kind, "phase": "queued",
+        "created_at": now, "updated_at": now, **meta,
+    })
+    return job_id
+
+
+def spool_upload(job_id: str, src: IO[bytes], suffix: str = ".zip") -> str:
+    path = os.path.join(JOBS_DIR, f"{job_id}{suffix}")
+    src.seek(0)
+    with open(path, "wb") as dst:
+        shutil.copyfileobj(src, dst, length=1024 * 1024)
+    return path
+
+
+# -------- Pool --------
+def _init_worker() -> None:
+    # each worker owns its connections; never reuse the parent's pool
+    from db import engine
+    engine.dispose(close=False)
+
+
+def get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(
+            max_workers=IMPORT_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+        )
+    return _pool
+
+
+def shutdown() -> None:
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+def submit(fn, job_id: str, *args: Any) -> None:
+    fut = get_pool().submit(fn, job_id, *args)
+
+    def _done(f):
+        exc = f.exception()
+        if exc is not None:
+            # the worker died before it could record its own failure
+            log.error(f"job {job_id} crashed: {exc}")
+            update_job(job_id, phase="failed", error=str(exc))
+
+    fut.add_done_callback(_done)
+
+
+# -------- Workers (run in the pool) --------
+def run_apple_health_import(
+    job_id: str, zip_path: str, athlete_id: int, since_days: int, include_media: bool = False,
+) -> None:
+    from db import SessionLocal
+    from app import apple_health, apple_health_media, snapshots
+
+    started = time.time()
+    update_job(job_id, phase="opening", started_at=started)
+    try:
+        with zipfile.ZipFile(zip_path) as zf:
+            info = next((i for i in zf.infolist() if i.filename.endswith("export.xml")), None)
+            if info is None:
+                update_job(job_id, phase="failed", error="export_xml_not_found")
+                return
+            total = info.file_size
+
+            with zf.open(info, "r") as fh, SessionLocal() as db:
+                last = [0.0]
+
+                def progress(phase: str, counters: Dict[str, Any]) -> None:
+                    now = time.time()
+                    if phase == "parsing" and now - last[0] < _PROGRESS_MIN_INTERVAL:
+                        return
+                    last[0] = now
+                    done = fh.tell()
+                    elapsed = now - started
+                    eta = elapsed * (total - done) / done if done and phase == "parsing" else None
+                    update_job(
+                        job_id, phase=phase, bytes_read=done, bytes_total=total,
+                        eta_s=(round(eta, 1) if eta is not None else None), **counters,
+                    )
+
+                result = apple_health.import_export_xml(
+                    db, athlete_id, fh, since_days=since_days, progress=progress,
+                )
+                snapshots.mark_stale(db, [athlete_id])
+                db.commit()
+                snapshots.refresh(db, [athlete_id])
+
+            if include_media:
+                update_job(job_id, phase="media")
+                with SessionLocal() as db:
+                    media_last = [0.0]
+
+                    def media_progress(counters: Dict[str, Any], final: bool) -> None:
+                        now = time.time()
+                        if final or now - media_last[0] >= _PROGRESS_MIN_INTERVAL:
+                            media_last[0] = now
+                            update_job(job_id, **counters)
+
+                    result["media"] = apple_health_media.import_media(
+                        db, athlete_id, zip_path, since_days=since_days, progress=media_progress,
+                    )
+        update_job(
+            job_id, phase="done", finished_at=time.time(), eta_s=0,
+            records_parsed=result["records_parsed"],
+            records_skipped=result["records_skipped"],
+            days_upserted=result["metrics_days_imported"],
+            workouts_imported=result["workouts_imported"],
+            result=result,
+        )
+    except zipfile.BadZipFile:
+        update_job(job_id, phase="failed", error="invalid_zip")
+    except Exception as e:
+        log.exception(f"job {job_id} failed")
+        update_job(job_id, phase="failed", error=str(e))
+    finally:
+        try:
+            os.remove(zip_path)
+        except OSError:
+            pass
@@ -0,0 +1,162 @@
+# backend/app/load.py
+"""
+Persisted training load per athlete (daily_load).
+
+One row per athlete and day, from the first activity through TAIL_DAYS days
+after the last one: the day's TSS, the 7-day sum and ATL/CTL/TSB from
+utils.load_model. Past the last row every day is a rest day (7-day sum 0),
+so readers derive later days in closed form and nothing has to be written
+just because the calendar moved on.
+
+Maintenance is incremental: every Activity write path calls `recompute` with
+the earliest day it touched, and only the suffix from that day is rewritten,
+seeded with the stored state of the day before. An athlete without rows
+(e.g. right after the migration) is built in full on first read.
+"""
+import sys
+from datetime import date, timedelta
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+from sqlalchemy import delete, func, select
+from sqlalchemy.orm import Session
+
+from models import Activity, DailyLoad
+from app.bulk import upsert_rows
+
+ROOT = Path(__file__).resolve().parents[2]
+if str(ROOT) not in sys.path:
+    sys.path.append(str(ROOT))
+
+from utils.load_model import decay, ewma_load  # noqa: E402
+
+# rows run this many days past the last activity, so tss_7d is exact wherever a row exists
+TAIL_DAYS = 6
+VALUE_COLS = ["tss", "tss_7d", "atl", "ctl", "tsb"]
+ZERO = {c: 0.0 for c in VALUE_COLS}
+
+
+def earliest(rows: Iterable[Dict[str, Any]]) -> Dict[int, date]:
+    """{athlete_id: earliest date} of Activity rows, the argument `recompute` takes."""
+    starts: Dict[int, date] = {}
+    for r in rows:
+        a, d = r["athlete_id"], r["date"]
+        if a is not None and d is not None and (a not in starts or d < starts[a]):
+            starts[a] = d
+    return starts
+
+
+def _last_row(db: Session, athlete_id: int, day: date) -> Optional[DailyLoad]:
+    return db.execute(
+        select(DailyLoad)
+        .where(DailyLoad.athlete_id == athlete_id, DailyLoad.date <= day)
+        .order_by(DailyLoad.date.desc())
+        .limit(1)
+    ).scalars().first()
+
+
+def _carry(row: DailyLoad, day: date) -> Dict[str, float]:
+    """State on `day` given the last stored row on or before it; the days in between are rest days."""
+    n = (day - row.date).days
+    if n == 0:
+        return {c: getattr(row, c) for c in VALUE_COLS}
+    atl, ctl = decay(row.atl, row.ctl, n)
+    atl_prev, ctl_prev = decay(row.atl, row.ctl, n - 1)
+    return {"tss": 0.0, "tss_7d": 0.0, "atl": atl, "ctl": ctl, "tsb": ctl_prev - atl_prev}
+
+
+def _recompute(db: Session, athlete_id: int, start: Optional[date]) -> None:
+    base = None
+    if start is not None:
+        prev = _last_row(db, athlete_id, start - timedelta(days=1))
+        if prev is not None:
+            base = _carry(prev, start - timedelta(days=1))
+    if base is None:
+        # no stored state before `start`: the series (re)starts at the first activity
+        start = db.execute(select(func.min(Activity.date)).where(Activity.athlete_id == athlete_id)).scalar()
+        base = ZERO
+        if start is None:
+            db.execute(delete(DailyLoad).where(DailyLoad.athlete_id == athlete_id))
+            return
+
+    window = start - timedelta(days=6)
+    sums = db.execute(
+        select(Activity.date, func.coalesce(func.sum(Activity.tss), 0))
+        .where(Activity.athlete_id == athlete_id, Activity.date >= window)
+        .group_by(Activity.date)
+    ).all()
+    db.execute(delete(DailyLoad).where(DailyLoad.athlete_id == athlete_id, DailyLoad.date >= start))
+    if not sums:
+        return
+    end = max(d for d, _ in sums) + timedelta(days=TAIL_DAYS)
+    n = (end - start).days + 1
+    if n <= 0:
+        return
+
+    # daily[0:6] are the six days before `start`, needed for the first 7-day sums
+    daily = np.zeros(n + 6)
+    for d, tss in sums:
+        daily[(d - window).days] += float(tss)
+    csum = np.concatenate([[0.0], np.cumsum(daily)])
+    tss_7d = csum[7:] - csum[:-7]
+    atl, ctl, tsb = ewma_load(daily[6:, None], base["atl"], base["ctl"])
+
+    rows = [
+        {
+            "athlete_id": athlete_id, "date": start + timedelta(days=i),
+            "tss": float(daily[i + 6]), "tss_7d": float(tss_7d[i]),
+            "atl": float(atl[i, 0]), "ctl": float(ctl[i, 0]), "tsb": float(tsb[i, 0]),
+        }
+        for i in range(n)
+    ]
+    # upsert rather than insert: a concurrent recompute may have written the same days
+    upsert_rows(db, DailyLoad.__table__, rows, conflict_cols=["athlete_id", "date"], update_cols=VALUE_COLS)
+
+
+def recompute(db: Session, starts: Dict[int, date]) -> None:
+    """
+    Rewrite each athlete's rows from the given day on, after Activity rows on
+    or after it were inserted, changed or deleted. The change must be flushed.
+    Does not commit.
+    """
+    for athlete_id, start in sorted(starts.items()):
+        _recompute(db, athlete_id, start)
+
+
+def _ensure_built(db: Session, athlete_id: int, day: date) -> Optional[DailyLoad]:
+    row = _last_row(db, athlete_id, day)
+    if row is None and db.execute(
+        select(Activity.id).where(Activity.athlete_id == athlete_id, Activity.date <= day).limit(1)
+    ).first() is not None:
+        _recompute(db, athlete_id, None)
+        row = _last_row(db, athlete_id, day)
+    return row
+
+
+def state_on(db: Session, athlete_id: int, day: date) -> Dict[str, float]:
+    """tss, tss_7d, atl, ctl, tsb on `day`. May build the athlete's rows; the caller commits."""
+    row = _ensure_built(db, athlete_id, day)
+    return dict(ZERO) if row is None else _carry(row, day)
+
+
+def series(db: Session, athlete_id: int, start: date, end: date) -> List[Dict[str, Any]]:
+    """
+    Daily rows between start and end, rest days past the last stored row
+    included; days before the first activity are omitted. May build the
+    athlete's rows; the caller commits.
+    """
+    last = _ensure_built(db, athlete_id, end)
+    if last is None:
+        return []
+    rows = db.execute(
+        select(DailyLoad)
+        .where(DailyLoad.athlete_id == athlete_id, DailyLoad.date >= start, DailyLoad.date <= end)
+        .order_by(DailyLoad.date.asc())
+    ).scalars().all()
+    out = [{"date": r.date, **{c: getattr(r, c) for c in VALUE_COLS}} for r in rows]
+    d = max(start, last.date + timedelta(days=1))
+    while d <= end:
+        out.append({"date": d, **_carry(last, d)})
+        d += timedelta(days=1)
+    return out
@@ -0,0 +1,281 @@
+# backend/app/planning.py
+"""
+Session builders and the weekly microcycle generator behind /training/plan.
+
+A week plan depends only on FTP, the block parameters, the week start, which
+side of the fatigue gate the athlete is on and the indoor flag, so
+`generate_week_plan` memoizes on exactly that key (LRU with a TTL, per
+process). Entries are dropped early when an athlete's FTP or training block
+changes (`invalidate_week_plans`, plus ORM events on TrainingBlock);
+`week_plan_cache_stats()` reports hits and misses.
+"""
+import copy
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, timedelta
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from models import Athlete, TrainingBlock
+from app import load
+
+POWER_ZONE_TARGET_IF = {
+    "recovery": 0.55,
+    "endurance": 0.65,
+    "tempo": 0.80,
+    "sweetspot": 0.88,
+    "threshold": 0.95,
+    "vo2": 1.05,
+}
+
+def _to_float(v):
+    try:
+        return float(v)
+    except Exception:
+        return None
+
+def estimate_tss(duration_min: int, intensity_factor: float) -> int:
+    hours = duration_min / 60.0
+    return int(round(hours * (intensity_factor ** 2) * 100.0))
+
+def is_recovery_week(start_date, block_len_weeks: int, recovery_weeks: int, ref_date):
+    if not start_date or not block_len_weeks:
+        return False
+    cycle = block_len_weeks + (recovery_weeks or 0)
+    if cycle <= 0:
+        return False
+    week_index = (ref_date - start_date).days // 7
+    return (week_index % cycle) >= block_len_weeks
+
+def session_endurance(day: date, duration_min: int, ftp_w: float):
+    IF = POWER_ZONE_TARGET_IF["endurance"]
+    return {
+        "date": day.isoformat(),
+        "sport": "bike",
+        "title": "Endurance Z2",
+        "details": "Steady Z2; cadence 85–95rpm; 3×5min high-cadence 100–110rpm",
+        "duration_min": duration_min,
+        "intensity_factor": IF,
+        "target_power_w": [0.56 * ftp_w, 0.75 * ftp_w] if ftp_w else None,
+        "indoor_ok": True,
+        "tss": estimate_tss(duration_min, IF),
+    }
+
+def session_sweetspot(day: date, ftp_w: float, main_intervals=(2, 15)):
+    IF = POWER_ZONE_TARGET_IF["sweetspot"]
+    reps, mins = main_intervals
+    duration_min = 20 + reps * mins + (reps - 1) * 5
+    return {
+        "date": day.isoformat(),
+        "sport": "bike",
+        "title": f"Sweet Spot {reps}×{mins}min @ 88–92% FTP",
+        "details": "WU 10–15min; SS work; 5min rec; CD 10min",
+        "duration_min": duration_min,
+        "intensity_factor": IF,
+        "target_power_w": [0.88 * ftp_w, 0.92 * ftp_w] if ftp_w else None,
+        "indoor_ok": True,
+        "tss": estimate_tss(duration_min, IF),
+    }
+
+def session_threshold(day: date, ftp_w: float, main_intervals=(3, 10)):
+    IF = POWER_ZONE_TARGET_IF["threshold"]
+    reps, mins = main_intervals
+    duration_min = 20 + reps * mins + (reps - 1) * 5
+    return {
+        "date": day.isoformat(),
+        "sport": "bike",
+        "title": f"Threshold {reps}×{mins}min @ 95–100% FTP",
+        "details": "WU 15–20min; 3–4×8–10min @ 95–100%; 5min rec; CD 10–15min",
+        "duration_min": duration_min,
+        "intensity_factor": IF,
+        "target_power_w": [0.95 * ftp_w, 1.00 * ftp_w] if ftp_w else None,
+        "indoor_ok": True,
+        "tss": estimate_tss(duration_min, IF),
+    }
+
+def session_long_endurance(day: date, hours: float, ftp_w: float):
+    duration_min = int(hours * 60)
+    IF = 0.68
+    return {
+        "date": day.isoformat(),
+        "sport": "bike",
+        "title": f"Long Endurance {hours:.1f}h",
+        "details": "Mostly Z2; add 2×20min low-Z3 climbs if feeling good",
+        "duration_min": duration_min,
+        "intensity_factor": IF,
+        "target_power_w": [0.60 * ftp_w, 0.75 * ftp_w] if ftp_w else None,
+        "indoor_ok": False,
+        "tss": estimate_tss(duration_min, IF),
+    }
+
+def session_indoor_endurance(day: date, ftp_w: float):
+    duration_min = 120
+    IF = 0.72
+    return {
+        "date": day.isoformat(),
+        "sport": "bike",
+        "title": "Indoor Endurance Builder 2.0h",
+        "details": "WU 15min Z2 → 3×12min @ 88–92% FTP (5min easy) → Z2 steady; CD 10min",
+        "duration_min": duration_min,
+        "intensity_factor": IF,
+        "target_power_w": [0.60 * ftp_w, 0.92 * ftp_w] if ftp_w else None,
+        "indoor_ok": True,
+        "tss": estimate_tss(duration_min, IF),
+    }
+
+def session_mobility(day: date, minutes=45):
+    return {
+        "date": day.isoformat(),
+        "sport": "strength",
+        "title": "Strength & Mobility",
+        "details": "Core 15min + mobility 20min + glute activation 10min",
+        "duration_min": minutes,
+        "intensity_factor": 0.0,
+        "target_power_w": None,
+        "indoor_ok": True,
+        "tss": 0,
+    }
+
+def session_rest(day: date, minutes=30):
+    return {
+        "date": day.isoformat(),
+        "sport": "rest",
+        "title": "Rest / Easy Walk",
+        "details": "Optional 20–30min easy walk or spin <Z1",
+        "duration_min": minutes,
+        "intensity_factor": 0.0,
+        "target_power_w": None,
+        "indoor_ok": True,
+        "tss": 0,
+    }
+
+def recent_7d_tss(db: Session, athlete_id: int, ref_day: date) -> int:
+    # one daily_load row (or none: rest days since); may build the athlete's rows, see app.load
+    return int(round(load.state_on(db, athlete_id, ref_day)["tss_7d"]))
+
+def _build_week_plan(
+    ftp: float,
+    block: Tuple[Optional[date], int, int],
+    start_date: date,
+    fatigued: bool,
+    indoor: bool,
+) -> List[Dict[str, Any]]:
+    recovery = is_recovery_week(*block, start_date)
+    plan: List[Dict[str, Any]] = []
+    for i in range(7):
+        day = start_date + timedelta(days=i)
+        wd = day.weekday()  # Mon=0 ... Sun=6
+        if recovery:
+            if wd in (0, 4):       plan.append(session_rest(day))
+            elif wd in (1, 3):     plan.append(session_mobility(day, 35))
+            elif wd in (2, 5):     plan.append(session_endurance(day, 50, ftp))
+            else:                  plan.append(session_endurance(day, 60, ftp))
+        else:
+            if wd == 0:
+                plan.append(session_rest(day))
+            elif wd == 1:
+                plan.append(session_endurance(day, 75, ftp))
+            elif wd == 2:
+                plan.append(session_sweetspot(day, ftp, (2, 15)))
+            elif wd == 3:
+                plan.append(session_endurance(day, 60, ftp))
+            elif wd == 4:
+                plan.append(session_mobility(day))
+            elif wd == 5:
+                plan.append(
+                    session_indoor_endurance(day, ftp) if indoor else session_long_endurance(day, 3.0, ftp)
+                )
+            else:
+                if fatigued:
+                    s = session_endurance(day, 90, ftp)
+                    s["title"] = "Endurance Z2 (fatigue gate)"
+                    s["adjusted_for_fatigue"] = True
+                    plan.append(s)
+                else:
+                    plan.append(session_threshold(day, ftp, (3, 10)))
+    return plan
+
+
+# -------- Memoized week plans --------
+FATIGUE_GATE_TSS = 500  # 7-day TSS from which Sunday's threshold becomes Z2
+WEEK_PLAN_CACHE_SIZE = int(os.getenv("WEEK_PLAN_CACHE_SIZE", "2048"))
+WEEK_PLAN_CACHE_TTL_S = float(os.getenv("WEEK_PLAN_CACHE_TTL_S", "21600"))
+
+_plan_lock = threading.Lock()
+_plans: "OrderedDict[tuple, Tuple[float, List[Dict[str, Any]]]]" = OrderedDict()  # key -> (expires, plan)
+_plan_keys: Dict[int, Set[tuple]] = {}  # athlete_id -> keys they were served, for invalidation
+_plan_stats = {"hits": 0, "misses": 0, "expired": 0, "evictions": 0, "invalidations": 0}
+
+
+def generate_week_plan(
+    athlete: Athlete,
+    blk: Optional[TrainingBlock],
+    start_date: date,
+    *,
+    fatigue_7d: int = 0,
+    indoor: bool = False,
+):
+    block = (
+        blk.start_date if blk else None,
+        blk.block_length_weeks if blk else 3,
+        blk.recovery_weeks if blk else 1,
+    )
+    key = (float(athlete.ftp_w or 0), block, start_date, fatigue_7d >= FATIGUE_GATE_TSS, bool(indoor))
+    now = time.monotonic()
+    with _plan_lock:
+        hit = _plans.get(key)
+        if hit is not None and hit[0] > now:
+            _plans.move_to_end(key)
+            _plan_stats["hits"] += 1
+            plan = hit[1]
+        else:
+            _plan_stats["expired" if hit is not None else "misses"] += 1
+            plan = None
+    if plan is None:
+        plan = _build_week_plan(*key)  # outside the lock; a racing miss just builds the same plan twice
+        with _plan_lock:
+            _plans[key] = (now + WEEK_PLAN_CACHE_TTL_S, plan)
+            while len(_plans) > WEEK_PLAN_CACHE_SIZE:
+                _plans.popitem(last=False)
+                _plan_stats["evictions"] += 1
+    if athlete.id is not None:
+        with _plan_lock:
+            keys = {k for k in _plan_keys.get(athlete.id, ()) if k in _plans}  # drop evicted keys
+            keys.add(key)
+            _plan_keys[athlete.id] = keys
+    # a deep copy per call, so callers can annotate sessions (and their target lists) without touching the cache
+    return copy.deepcopy(plan)
+
+
+def invalidate_week_plans(athlete_id: int) -> None:
+    """Drop the cached week plans served to this athlete (FTP or block changed)."""
+    with _plan_lock:
+        for key in _plan_keys.pop(athlete_id, ()):
+            if _plans.pop(key, None) is not None:
+                _plan_stats["invalidations"] += 1
+
+
+def week_plan_cache_stats() -> Dict[str, Any]:
+    with _plan_lock:
+        stats = dict(_plan_stats)
+        size = len(_plans)
+    lookups = stats["hits"] + stats["misses"] + stats["expired"]
+    return {
+        **stats,
+        "size": size,
+        "max_size": WEEK_PLAN_CACHE_SIZE,
+        "ttl_s": WEEK_PLAN_CACHE_TTL_S,
+        "hit_rate": round(stats["hits"] / lookups, 4) if lookups else None,
+    }
+
+
+@event.listens_for(TrainingBlock, "after_insert")
+@event.listens_for(TrainingBlock, "after_update")
+@event.listens_for(TrainingBlock, "after_delete")
+def _training_block_changed(mapper, connection, target) -> None:
+    if target.athlete_id is not None:
+        invalidate_week_plans(target.athlete_id)
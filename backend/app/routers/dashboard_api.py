@@ -1,21 +1,37 @@
+import asyncio
+import os
+import time
 from fastapi import APIRouter, Query, HTTPException, Header
-from typing import Optional, Tuple, Any, Dict
+from typing import Optional, Tuple, Any, Callable, Dict
 from datetime import date
 import httpx
-from app.config import API_BASE_URL, API_KEY, DEFAULT_LAT, DEFAULT_LON
+from db import SessionLocal
+from app import services, snapshots
+from app.config import API_KEY, DEFAULT_LAT, DEFAULT_LON
 
 router = APIRouter(prefix="/dashboard", tags=["dashboard"])
 
-async def fetch_json(client: httpx.AsyncClient, url: str, params: Dict[str, Any], headers: Dict[str, str], label: str) -> Tuple[Optional[dict], Optional[str]]:
+# per-section budgets: a slow section is reported in "errors" instead of holding up the rest
+DASHBOARD_DB_TIMEOUT_S = float(os.getenv("DASHBOARD_DB_TIMEOUT_S", "2.0"))
+DASHBOARD_WEATHER_TIMEOUT_S = float(os.getenv("DASHBOARD_WEATHER_TIMEOUT_S", "3.0"))
+
+def _with_session(fn: Callable[..., Dict[str, Any]], *args) -> Dict[str, Any]:
+    # one session per section: they run on separate threads and Sessions are not thread-safe
+    with SessionLocal() as db:
+        return fn(db, *args)
+
+async def run_section(label: str, coro, timeout_s: float, timings: Dict[str, float]) -> Tuple[Optional[dict], Optional[str]]:
+    t0 = time.perf_counter()
     try:
-        r = await client.get(url, params=params, headers=headers)
-        r.raise_for_status()
-        try:
-            return r.json() or {}, None
-        except ValueError:
-            return None, f"{label}_invalid_json"
-    except httpx.HTTPError as e:
-        return None, f"{label}_http_error:{e}"
+        return await asyncio.wait_for(coro, timeout_s), None
+    except asyncio.TimeoutError:
+        return None, f"{label}_timeout"
+    except HTTPException as e:
+        return None, f"{label}_error:{e.detail}"
+    except Exception as e:
+        return None, f"{label}_error:{e}"
+    finally:
+        timings[label] = round((time.perf_counter() - t0) * 1000, 1)
 
 @router.get("/today")
 async def dashboard_today(
@@ -29,55 +45,46 @@ async def dashboard_today(
     if API_KEY and x_api_key and x_api_key != API_KEY:
         raise HTTPException(status_code=401, detail="Invalid API key")
 
-    headers = {"x-api-key": API_KEY} if API_KEY else {}
+    # weather (safe fallbacks)
+    use_lat = lat if (lat is not None) else (DEFAULT_LAT if DEFAULT_LAT is not None else 48.21)
+    use_lon = lon if (lon is not None) else (DEFAULT_LON if DEFAULT_LON is not None else 16.37)
 
-    async with httpx.AsyncClient(timeout=10.0) as client:
-        # metrics
-        metrics, err_metrics = await fetch_json(
-            client, f"{API_BASE_URL}/metrics/latest",
-            {"athlete_id": athlete_id}, headers, "metrics"
-        )
-        met = (metrics.get("metrics") if isinstance(metrics, dict) else {}) if metrics else {}
-        # training plan
-        plan, err_plan = await fetch_json(
-            client, f"{API_BASE_URL}/training/plan",
-            {"athlete_id": athlete_id, "indoor": str(indoor).lower()}, headers, "plan"
+    # metrics, plan and nutrition come from the athlete's materialized snapshot (one
+    # primary-key read on a worker thread); weather runs on the event loop alongside
+    timings: Dict[str, float] = {}
+    async with httpx.AsyncClient(timeout=DASHBOARD_WEATHER_TIMEOUT_S) as client:
+        (snap, err_snap), (weather, err_weather) = await asyncio.gather(
+            run_section("snapshot", asyncio.to_thread(_with_session, snapshots.get_today, athlete_id),
+                        DASHBOARD_DB_TIMEOUT_S, timings),
+            run_section("weather", services.weather_today(use_lat, use_lon, client),
+                        DASHBOARD_WEATHER_TIMEOUT_S, timings),
         )
-        today_str = str(date.today())
-        session = None
-        if isinstance(plan, dict):
-            for s in (plan.get("microcycle") or []):
-                if s.get("date") == today_str:
-                    session = s
-                    break
-            if session is None and (plan.get("microcycle") or []):
-                session = plan["microcycle"][0]
 
-        # nutrition
-        nutrition, err_nut = await fetch_json(
-            client, f"{API_BASE_URL}/nutrition/today",
-            {"athlete_id": athlete_id}, headers, "nutrition"
-        )
+    snap = snap or {}
+    metrics = snap.get("metrics")
+    plan = snap.get("plan_indoor" if indoor else "plan")
+    nutrition = snap.get("nutrition")
+    met = (metrics.get("metrics") or {}) if metrics else {}
 
-        # weather (safe fallbacks)
-        fallback_lat = DEFAULT_LAT if DEFAULT_LAT is not None else 48.21
-        fallback_lon = DEFAULT_LON if DEFAULT_LON is not None else 16.37
-        use_lat = lat if (lat is not None) else (met.get("home_lat") or fallback_lat)
-        use_lon = lon if (lon is not None) else (met.get("home_lon") or fallback_lon)
-        weather, err_weather = await fetch_json(
-            client, f"{API_BASE_URL}/weather/today",
-            {"lat": use_lat, "lon": use_lon}, headers, "weather"
-        )
+    today_str = str(date.today())
+    session = None
+    if isinstance(plan, dict):
+        for s in (plan.get("microcycle") or []):
+            if s.get("date") == today_str:
+                session = s
+                break
+        if session is None and (plan.get("microcycle") or []):
+            session = plan["microcycle"][0]
 
     notices = []
     ftp = met.get("ftp_w") or met.get("ftp_watts")
     if ftp in (None, 0, "null"):
         notices.append("FTP missing: schedule test or enable auto-derivation.")
 
-    errors = [e for e in [err_metrics, err_plan, err_nut, err_weather] if e]
+    errors = [e for e in [err_snap, err_weather] if e]
 
     return {
-        "date": str(date.today()),
+        "date": today_str,
         "readiness": {
             "hr_rest": met.get("resting_hr_bpm") or met.get("hr_rest"),
             "hrv_ms": met.get("hrv_ms"),
@@ -90,9 +97,10 @@ async def dashboard_today(
         "weather": weather if weather else {"error": "weather_unavailable"},
         "notices": notices,
         "errors": errors or None,
+        "timings_ms": timings,
         "source": {
-            "metrics": f"{API_BASE_URL}/metrics/latest",
-            "plan": f"{API_BASE_URL}/training/plan",
-            "nutrition": f"{API_BASE_URL}/nutrition/today",
+            "metrics": "/metrics/latest",
+            "plan": "/training/plan",
+            "nutrition": "/nutrition/today",
         },
     }
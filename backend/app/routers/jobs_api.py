@@ -0,0 +1,19 @@
+import os
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Header
+
+from app import jobs
+
+router = APIRouter(prefix="/jobs", tags=["jobs"])
+
+def require_api_key(x_api_key: Optional[str] = Header(None)):
+    if x_api_key != os.getenv("API_KEY"):
+        raise HTTPException(status_code=401, detail="unauthorized")
+
+@router.get("/{job_id}", dependencies=[Depends(require_api_key)])
+def job_status(job_id: str):
+    state = jobs.read_job(job_id)
+    if state is None:
+        raise HTTPException(status_code=404, detail="job_not_found")
+    return state
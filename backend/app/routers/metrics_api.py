@@ -1,11 +1,12 @@
-from fastapi import APIRouter, Query, Depends, HTTPException
-from typing import Optional, List, Dict, Tuple, Any
+from fastapi import APIRouter, Query, Depends, HTTPException, Header
+from typing import Optional, List
 from datetime import date, timedelta
 from sqlalchemy.orm import Session
 from sqlalchemy import select
 
 from db import SessionLocal
 from models import BodyMetrics, Athlete
+from app import body_metrics, columnar, services, snapshots
 
 router = APIRouter(prefix="/metrics", tags=["metrics"])
 
@@ -16,53 +17,9 @@ def get_db():
     finally:
         db.close()
 
-def last_non_null(db: Session, athlete_id: int, col_name: str):
-    col = getattr(BodyMetrics, col_name)
-    row = db.execute(
-        select(BodyMetrics.date, col)
-        .where(BodyMetrics.athlete_id == athlete_id, col.is_not(None))
-        .order_by(BodyMetrics.date.desc())
-        .limit(1)
-    ).first()
-    return (row[0], row[1]) if row else (None, None)
-
 @router.get("/latest", include_in_schema=True)
 def metrics_latest(athlete_id: int = Query(..., ge=1), db: Session = Depends(get_db)):
-    latest: Optional[BodyMetrics] = db.execute(
-        select(BodyMetrics)
-        .where(BodyMetrics.athlete_id == athlete_id)
-        .order_by(BodyMetrics.date.desc())
-        .limit(1)
-    ).scalars().first()
-
-    a: Optional[Athlete] = db.get(Athlete, athlete_id)
-    if latest is None and a is None:
-        raise HTTPException(status_code=404, detail="athlete_not_found")
-
-    # Prefer latest row values; else most-recent non-null in history; else Athlete snapshot
-    _, w_val   = last_non_null(db, athlete_id, "weight_kg")
-    _, bf_val  = last_non_null(db, athlete_id, "bodyfat_pct")
-    _, vo2_val = last_non_null(db, athlete_id, "vo2max_mlkgmin")
-    _, rhr_val = last_non_null(db, athlete_id, "resting_hr_bpm")
-    _, ftp_val = last_non_null(db, athlete_id, "ftp_w")
-
-    weight = (latest.weight_kg        if latest and latest.weight_kg        is not None else w_val)   or (a.weight_kg if a else None)
-    bodyfat= (latest.bodyfat_pct      if latest and latest.bodyfat_pct      is not None else bf_val)
-    vo2    = (latest.vo2max_mlkgmin   if latest and latest.vo2max_mlkgmin   is not None else vo2_val) or ((a.vo2max if a else None))
-    rhr    = (latest.resting_hr_bpm   if latest and latest.resting_hr_bpm   is not None else rhr_val) or ((a.rhr    if a else None))
-    ftp    = (latest.ftp_w            if latest and latest.ftp_w            is not None else ftp_val) or ((a.ftp_w  if a else None))
-
-    return {
-        "athlete_id": athlete_id,
-        "date": (latest.date.isoformat() if latest else None),
-        "metrics": {
-            "weight_kg": weight,
-            "bodyfat_pct": bodyfat,
-            "vo2max_mlkgmin": vo2,
-            "resting_hr_bpm": rhr,
-            "ftp_w": ftp,
-        },
-    }
+    return services.latest_metrics(db, athlete_id)
 
 @router.get("/history", include_in_schema=True)
 def metrics_history(
@@ -71,39 +28,47 @@ def metrics_history(
     fields: Optional[str] = Query(None, description="Comma-separated list of fields"),
     from_date: Optional[date] = Query(None),
     to_date: Optional[date] = Query(None),
+    layout: str = Query("rows", pattern="^(rows|columns)$", description="JSON shape: per-day items or one array per field"),
+    accept: Optional[str] = Header(None),
+    accept_encoding: Optional[str] = Header(None),
     db: Session = Depends(get_db),
 ):
+    """
+    Metric history between from/to. JSON by default; `Accept:
+    application/vnd.apache.arrow.stream` or `application/vnd.apache.parquet`
+    returns the same columns as Arrow IPC / Parquet.
+    """
     if BodyMetrics is None:
         raise HTTPException(status_code=501, detail="BodyMetrics model not available.")
+    media_type = columnar.negotiate(accept)
 
     start = from_date or (date.today() - timedelta(days=days - 1))
     end = to_date or date.today()
 
+    allowed = ["weight_kg","bodyfat_pct","vo2max_mlkgmin","resting_hr_bpm","ftp_w"]
+    want: List[str] = [f.strip() for f in fields.split(",")] if fields else allowed
+    want = [f for f in want if f in allowed]
+
+    # only the requested columns, as plain tuples (no ORM objects)
     rows = db.execute(
-        select(BodyMetrics)
+        select(BodyMetrics.date, *(getattr(BodyMetrics, f) for f in want))
         .where(BodyMetrics.athlete_id == athlete_id)
         .where(BodyMetrics.date >= start)
         .where(BodyMetrics.date <= end)
         .order_by(BodyMetrics.date.asc())
-    ).scalars().all()
-
-    allowed = ["weight_kg","bodyfat_pct","vo2max_mlkgmin","resting_hr_bpm","ftp_w"]
-    want: List[str] = [f.strip() for f in fields.split(",")] if fields else allowed
-    want = [f for f in want if f in allowed]
-
-    def pick(bm: BodyMetrics) -> Dict[str, Any]:
-        item: Dict[str, Any] = {"date": bm.date.isoformat()}
-        for f in want:
-            item[f] = getattr(bm, f)
-        return item
-
-    return {
-        "athlete_id": athlete_id,
-        "from": start.isoformat(),
-        "to": end.isoformat(),
-        "fields": want,
-        "items": [pick(r) for r in rows],
-    }
+    ).all()
+
+    meta = {"athlete_id": athlete_id, "from": start.isoformat(), "to": end.isoformat(), "fields": want}
+    if media_type != columnar.JSON or layout == "columns":
+        names = ["date"] + want
+        cols = {n: list(v) for n, v in zip(names, zip(*rows))} if rows else {n: [] for n in names}
+        if media_type != columnar.JSON:
+            return columnar.respond(media_type, accept_encoding, None, columns=cols, metadata=meta)
+        cols["date"] = [d.isoformat() for d in cols["date"]]
+        return columnar.respond(media_type, accept_encoding, {**meta, "columns": cols})
+
+    items = [{"date": r[0].isoformat(), **dict(zip(want, r[1:]))} for r in rows]
+    return columnar.respond(media_type, accept_encoding, {**meta, "items": items})
 # ------------- Quick log (upsert daily metrics) -------------
 from typing import Optional
 from datetime import date
@@ -141,15 +106,7 @@ def metrics_log(
         raise HTTPException(status_code=400, detail="no_values_provided")
 
     # upsert BodyMetrics
-    row = db.execute(
-        select(BodyMetrics).where(BodyMetrics.athlete_id == athlete_id, BodyMetrics.date == d)
-    ).scalars().first()
-    if row:
-        for k, v in vals.items():
-            setattr(row, k, v)
-    else:
-        row = BodyMetrics(athlete_id=athlete_id, date=d, **vals)
-        db.add(row)
+    merged = body_metrics.log_day(db, athlete_id, d, vals, fields)
 
     # refresh Athlete snapshot with provided fields
     a = db.get(Athlete, athlete_id)
@@ -159,12 +116,13 @@ def metrics_log(
         if "vo2max_mlkgmin" in vals and vals["vo2max_mlkgmin"] is not None: a.vo2max = vals["vo2max_mlkgmin"]
         if "weight_kg" in vals and vals["weight_kg"] is not None: a.weight_kg = vals["weight_kg"]
 
+    snapshots.mark_stale(db, [athlete_id])
     db.commit()
-    db.refresh(row)
+    snapshots.refresh(db, [athlete_id])
 
     return {
         "ok": True,
         "athlete_id": athlete_id,
         "date": d.isoformat(),
-        "metrics": {k: getattr(row, k) for k in fields},
+        "metrics": merged,
     }
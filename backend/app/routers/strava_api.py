@@ -1,14 +1,24 @@
-import os, time
-from datetime import date
+import asyncio
+import os
+import sys
+from pathlib import Path
 from typing import Optional, Dict, Any
 
-import requests
-from fastapi import APIRouter, Query, Depends, HTTPException, Header
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Body, Query, Depends, HTTPException, Header
 from sqlalchemy import select
+from sqlalchemy.orm import Session
 
 from db import SessionLocal
-from models import Activity
+from models import Activity, ActivityStream
+from app import strava_import as strava_import_engine
+from app import snapshots, streams, strava_webhook
+
+# token cache lives with the Streamlit utils at the repo root
+ROOT = Path(__file__).resolve().parents[3]
+if str(ROOT) not in sys.path:
+    sys.path.append(str(ROOT))
+
+from utils import strava_tokens  # noqa: E402
 
 router = APIRouter(prefix="/strava", tags=["strava"])
 
@@ -26,37 +36,11 @@ def require_api_key(x_api_key: Optional[str] = Header(None)):
     return True
 
 def _strava_refresh_token() -> str:
-    """Return a short-lived access token, raising HTTPException with details on failure."""
-    direct = os.getenv("STRAVA_ACCESS_TOKEN")
-    if direct:
-        return direct
-    cid  = os.getenv("STRAVA_CLIENT_ID")
-    csec = os.getenv("STRAVA_CLIENT_SECRET")
-    rtok = os.getenv("STRAVA_REFRESH_TOKEN")
-    if not all([cid, csec, rtok]):
-        raise HTTPException(status_code=500, detail="strava_credentials_missing")
+    """Return a cached access token, raising HTTPException with details on failure."""
     try:
-        resp = requests.post(
-            "https://www.strava.com/oauth/token",
-            data={"client_id": cid, "client_secret": csec, "grant_type": "refresh_token", "refresh_token": rtok},
-            timeout=20,
-        )
-        txt = resp.text[:300]
-        if resp.status_code >= 400:
-            raise HTTPException(status_code=502, detail=f"strava_token_error {resp.status_code}: {txt}")
-        return resp.json()["access_token"]
-    except requests.RequestException as e:
-        raise HTTPException(status_code=502, detail=f"strava_token_exception: {e}")
-
-def _sport_map(t: str) -> str:
-    return {
-        "Ride":"bike","VirtualRide":"bike","EBikeRide":"bike","GravelRide":"bike",
-        "Run":"run","Swim":"swim","Walk":"walk","Hike":"hike",
-    }.get((t or "").strip(), "other")
-
-def _estimate_tss(sport: str, duration_min: int) -> int:
-    mult = 0.75 if sport == "bike" else 0.90 if sport == "run" else 0.60
-    return int(round(duration_min * mult))
+        return strava_tokens.get_access_token()
+    except strava_tokens.StravaTokenError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
 
 @router.get("/ping", dependencies=[Depends(require_api_key)])
 def strava_ping() -> Dict[str, Any]:
@@ -68,73 +52,117 @@ def strava_ping() -> Dict[str, Any]:
 def strava_import(
     athlete_id: int = Query(..., ge=1),
     after_days: int = Query(30, ge=1, le=3650),
+    with_streams: bool = Query(False),
+    db: Session = Depends(get_db),
+):
+    token = _strava_refresh_token()
+    try:
+        return asyncio.run(strava_import_engine.import_activities(
+            db, athlete_id, token, after_days=after_days, with_streams=with_streams,
+        ))
+    except strava_import_engine.StravaError as e:
+        if e.upstream_status == 401:
+            strava_tokens.invalidate()  # revoked/rotated elsewhere; next call refreshes
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+
+# -------- Streams --------
+@router.post("/streams/backfill", dependencies=[Depends(require_api_key)])
+def strava_streams_backfill(
+    athlete_id: int = Query(..., ge=1),
+    limit: int = Query(50, ge=1, le=500),
     db: Session = Depends(get_db),
 ):
+    """Fetch streams for the athlete's most recent Strava rides that have none stored yet."""
+    ids = db.execute(
+        select(Activity.external_id)
+        .outerjoin(ActivityStream, ActivityStream.activity_id == Activity.id)
+        .where(
+            Activity.athlete_id == athlete_id, Activity.source == "strava", Activity.sport == "bike",
+            Activity.external_id.is_not(None), ActivityStream.id.is_(None),
+        )
+        .order_by(Activity.date.desc()).limit(limit)
+    ).scalars().all()
     token = _strava_refresh_token()
-    after = int(time.time()) - after_days * 86400
-    headers = {"Authorization": f"Bearer {token}"}
-    page, per_page = 1, 100
-    imported = 0
-    skipped = 0
-
-    while True:
-        try:
-            r = requests.get(
-                "https://www.strava.com/api/v3/athlete/activities",
-                params={"after": after, "page": page, "per_page": per_page},
-                headers=headers,
-                timeout=30,
-            )
-            txt = r.text[:300]
-            if r.status_code == 429:
-                raise HTTPException(status_code=429, detail="strava_rate_limited")
-            if r.status_code >= 400:
-                raise HTTPException(status_code=502, detail=f"strava_list_error {r.status_code}: {txt}")
-            items = r.json() or []
-        except requests.RequestException as e:
-            raise HTTPException(status_code=502, detail=f"strava_list_exception: {e}")
-
-        if not items:
-            break
-
-        for a in items:
-            sport = _sport_map(a.get("type"))
-            start = a.get("start_date_local") or a.get("start_date")
-            if not start:
-                skipped += 1; continue
-            try:
-                d = date.fromisoformat(start.split("T")[0])
-            except Exception:
-                skipped += 1; continue
-
-            duration_min = int(round((a.get("moving_time") or 0) / 60))
-            if duration_min <= 0:
-                skipped += 1; continue
-
-            tss = _estimate_tss(sport, duration_min)
-
-            # de-dupe: same athlete + date + sport + duration
-            existing = db.execute(
-                select(Activity).where(
-                    Activity.athlete_id == athlete_id,
-                    Activity.date == d,
-                    Activity.sport == sport,
-                    Activity.duration_min == duration_min,
-                )
-            ).scalars().first()
-            if existing:
-                skipped += 1; continue
-
-            db.add(Activity(
-                athlete_id=athlete_id,
-                date=d,
-                sport=sport,
-                duration_min=duration_min,
-                tss=tss,
-            ))
-            imported += 1
-
-        db.commit()
-        page += 1
-
-    return {"ok": True, "imported": imported, "skipped": skipped, "after_days": after_days}
+
+    async def run():
+        limiter = strava_import_engine.RateLimiter()
+        async with strava_import_engine.new_client(token) as client:
+            return await strava_import_engine.ingest_streams(db, client, limiter, athlete_id, list(ids))
+
+    try:
+        stored = asyncio.run(run())
+    except strava_import_engine.StravaThrottled as e:
+        snapshots.refresh(db, [athlete_id])
+        return {"ok": True, "complete": False, "retry_in_s": round(e.wait_s)}
+    except strava_import_engine.StravaError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+    if stored:
+        snapshots.refresh(db, [athlete_id])
+    return {"ok": True, "complete": True, "candidates": len(ids), "stored": stored}
+
+@router.get("/activities/{activity_id}/streams", dependencies=[Depends(require_api_key)])
+def strava_activity_streams(
+    activity_id: int,
+    channels: Optional[str] = Query(None, description="comma-separated, e.g. watts,heartrate; omit for metrics only"),
+    db: Session = Depends(get_db),
+):
+    row = db.execute(select(ActivityStream).where(ActivityStream.activity_id == activity_id)).scalars().first()
+    if not row:
+        raise HTTPException(status_code=404, detail="streams_not_found")
+    out = {
+        "activity_id": activity_id, "samples": row.samples, "channels": row.channels.split(","),
+        "bytes": len(row.data), "duration_s": row.duration_s, "avg_power_w": row.avg_power_w,
+        "np_w": row.np_w, "intensity_factor": row.intensity_factor, "tss": row.tss,
+        "avg_hr_bpm": row.avg_hr_bpm,
+    }
+    if channels:
+        decoded = streams.decode_streams(row.data)
+        out["streams"] = {k: decoded[k].tolist() for k in channels.split(",") if k in decoded}
+    return out
+
+# -------- Webhook (push subscription) --------
+STRAVA_WEBHOOK_VERIFY_TOKEN = os.getenv("STRAVA_WEBHOOK_VERIFY_TOKEN", "")
+STRAVA_WEBHOOK_SUBSCRIPTION_ID = os.getenv("STRAVA_WEBHOOK_SUBSCRIPTION_ID", "")
+
+@router.get("/webhook", include_in_schema=False)
+def strava_webhook_validate(
+    mode: str = Query(..., alias="hub.mode"),
+    challenge: str = Query(..., alias="hub.challenge"),
+    verify_token: str = Query(..., alias="hub.verify_token"),
+):
+    """Subscription handshake: echo the challenge if the verify token matches."""
+    if mode != "subscribe" or not STRAVA_WEBHOOK_VERIFY_TOKEN or verify_token != STRAVA_WEBHOOK_VERIFY_TOKEN:
+        raise HTTPException(status_code=403, detail="invalid_verify_token")
+    return {"hub.challenge": challenge}
+
+@router.post("/webhook", include_in_schema=False)
+def strava_webhook_event(event: Dict[str, Any] = Body(...)):
+    """
+    Event receiver. Must answer within 2s, so it only enqueues. Events are
+    only accepted once STRAVA_WEBHOOK_SUBSCRIPTION_ID is set (it is known
+    after the handshake above); the queue confirms every event against the
+    Strava API before writing anything.
+    """
+    if not STRAVA_WEBHOOK_SUBSCRIPTION_ID:
+        raise HTTPException(status_code=403, detail="webhook_subscription_not_configured")
+    if str(event.get("subscription_id")) != STRAVA_WEBHOOK_SUBSCRIPTION_ID:
+        raise HTTPException(status_code=403, detail="unknown_subscription")
+    obj, aspect = event.get("object_type"), event.get("aspect_type")
+    try:
+        owner_id, object_id = int(event["owner_id"]), int(event["object_id"])
+    except (KeyError, TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="invalid_event")
+
+    if obj == "activity" and aspect in ("create", "update", "delete"):
+        strava_webhook.queue.put(owner_id, object_id, aspect)
+    elif obj == "athlete" and (event.get("updates") or {}).get("authorized") == "false":
+        strava_tokens.invalidate()
+    return {"ok": True}
+
+@router.get("/webhook/stats", dependencies=[Depends(require_api_key)])
+def strava_webhook_stats() -> Dict[str, Any]:
+    return {"pending": strava_webhook.queue.pending(), **strava_webhook.queue.stats}
+
+@router.on_event("shutdown")
+def _stop_webhook_queue():
+    strava_webhook.queue.stop()
@@ -0,0 +1,205 @@
+# backend/app/services.py
+"""
+Service layer behind the read endpoints.
+
+Plain functions taking a Session (weather: an httpx client) and returning the
+response dicts, so /dashboard/today can compose them in-process instead of
+calling its own API over HTTP. The routes stay thin wrappers around these.
+"""
+from datetime import date
+from typing import Any, Dict, Optional
+
+import httpx
+from fastapi import HTTPException
+from sqlalchemy import case, func, literal, select, true
+from sqlalchemy.orm import Session
+
+from models import Athlete, BodyMetrics, Goal, TrainingBlock
+from app.planning import generate_week_plan, is_recovery_week, recent_7d_tss
+
+WEATHER_URL = "https://api.open-meteo.com/v1/forecast"
+
+
+# -------- Metrics --------
+LATEST_FIELDS = ["weight_kg", "bodyfat_pct", "vo2max_mlkgmin", "resting_hr_bpm", "ftp_w"]
+
+
+def latest_values(db: Session, athlete_id: int):
+    """
+    One round-trip for everything "latest": per field the most recent non-null
+    value and its date, the newest row's date, the FTP source, and the Athlete
+    profile. Window functions (Postgres, SQLite >= 3.25): each field is ordered
+    non-null first, newest first, and the first row of the frame is taken.
+    Returns None only when there is neither a metrics row nor an athlete.
+    """
+    bm = BodyMetrics
+
+    def last_non_null(value, field):
+        order = (case((field.is_(None), 1), else_=0), bm.date.desc())
+        return func.first_value(value, type_=value.type).over(order_by=order)
+
+    cols = [func.first_value(bm.date, type_=bm.date.type).over(order_by=bm.date.desc()).label("latest_date")]
+    for f in LATEST_FIELDS:
+        col = getattr(bm, f)
+        cols.append(last_non_null(col, col).label(f))
+        cols.append(last_non_null(case((col.is_not(None), bm.date), else_=None), col).label(f"{f}_date"))
+    cols.append(last_non_null(bm.ftp_source, bm.ftp_w).label("ftp_source"))
+    last = select(*cols).where(bm.athlete_id == athlete_id).limit(1).subquery()
+    anchor = select(literal(1).label("one")).subquery()
+    row = db.execute(
+        select(
+            last,
+            Athlete.id.label("athlete_found"), Athlete.weight_kg.label("a_weight_kg"),
+            Athlete.vo2max.label("a_vo2max"), Athlete.rhr.label("a_rhr"), Athlete.ftp_w.label("a_ftp_w"),
+            Athlete.sex.label("a_sex"), Athlete.age.label("a_age"), Athlete.height_cm.label("a_height_cm"),
+        )
+        .select_from(anchor)
+        .outerjoin(last, true())
+        .outerjoin(Athlete, Athlete.id == athlete_id)
+    ).first()
+    if row is None or (row.latest_date is None and row.athlete_found is None):
+        return None
+    return row
+
+
+def _iso(d) -> Optional[str]:
+    return d.isoformat() if d is not None else None
+
+
+def latest_metrics(db: Session, athlete_id: int) -> Dict[str, Any]:
+    r = latest_values(db, athlete_id)
+    if r is None:
+        raise HTTPException(status_code=404, detail="athlete_not_found")
+
+    # most-recent non-null in history; else Athlete snapshot
+    metrics = {
+        "weight_kg": r.weight_kg or r.a_weight_kg,
+        "bodyfat_pct": r.bodyfat_pct,
+        "vo2max_mlkgmin": r.vo2max_mlkgmin or r.a_vo2max,
+        "resting_hr_bpm": r.resting_hr_bpm or r.a_rhr,
+        "ftp_w": r.ftp_w or r.a_ftp_w,
+    }
+    dates = {f: (_iso(getattr(r, f"{f}_date")) if getattr(r, f) else None) for f in LATEST_FIELDS}
+    if r.ftp_w:
+        ftp_prov = {"source": r.ftp_source or "body_metrics", "updated_at": dates["ftp_w"]}
+    elif r.a_ftp_w:
+        ftp_prov = {"source": "athlete", "updated_at": None}
+    else:
+        ftp_prov = {}
+    return {
+        "athlete_id": athlete_id,
+        "date": _iso(r.latest_date),
+        "as_of": _iso(r.latest_date),
+        "metrics": metrics,
+        "dates": dates,
+        "provenance": {"ftp_w": ftp_prov},
+    }
+
+
+# -------- Training plan --------
+def training_plan(db: Session, athlete_id: int, indoor: bool = False) -> Dict[str, Any]:
+    a = db.get(Athlete, athlete_id)
+    if not a:
+        raise HTTPException(status_code=404, detail="athlete_not_found")
+
+    blk = (
+        db.execute(
+            select(TrainingBlock)
+            .where(TrainingBlock.athlete_id == athlete_id)
+            .order_by(TrainingBlock.start_date.desc())
+        ).scalars().first()
+    )
+
+    start = date.today()
+    fatigue7 = recent_7d_tss(db, athlete_id, start)
+    microcycle = generate_week_plan(a, blk, start, fatigue_7d=fatigue7, indoor=indoor)
+
+    latest_goal = (
+        db.execute(
+            select(Goal)
+            .where(Goal.athlete_id == athlete_id, Goal.active == True)  # noqa: E712
+            .order_by(Goal.created_at.desc())
+        ).scalars().first()
+    )
+
+    return {
+        "athlete_id": athlete_id,
+        "block": {
+            "start_date": (blk.start_date.isoformat() if blk else None),
+            "weeks": (blk.block_length_weeks if blk else 3),
+            "recovery_weeks": (blk.recovery_weeks if blk else 1),
+            "is_recovery_week": is_recovery_week(
+                blk.start_date if blk else None,
+                (blk.block_length_weeks if blk else 3),
+                (blk.recovery_weeks if blk else 1),
+                start,
+            ),
+        },
+        "context": {"fatigue_7d_tss": fatigue7, "indoor": indoor},
+        "goal": None if not latest_goal else {
+            "target_weight_kg": latest_goal.target_weight_kg,
+            "target_bodyfat_pct": latest_goal.target_bodyfat_pct,
+            "target_ftp_w": latest_goal.target_ftp_w,
+            "timeframe_weeks": latest_goal.timeframe_weeks,
+            "goal_prompt": latest_goal.goal_prompt,
+        },
+        "microcycle": microcycle,
+        "generated_at": start.isoformat(),
+    }
+
+
+# -------- Nutrition --------
+def nutrition_today(db: Session, athlete_id: int) -> Dict[str, Any]:
+    a = db.get(Athlete, athlete_id)
+    if not a:
+        raise HTTPException(status_code=404, detail="athlete_not_found")
+    weight = float(a.weight_kg) if a.weight_kg is not None else 75.0
+    kcal_target = round(30 * weight)
+    return {
+        "athlete_id": athlete_id,
+        "date": date.today().isoformat(),
+        "targets": {
+            "kcal": kcal_target,
+            "protein_g": int(round(1.6 * weight)),
+            "carbs_g": max(0, int(round((kcal_target - ((int(round(1.6 * weight)) * 4) + (int(round(0.8 * weight)) * 9))) / 4))),
+            "fat_g": int(round(0.8 * weight)),
+        },
+        "meals": [],
+    }
+
+
+# -------- Weather --------
+async def weather_today(lat: float, lon: float, client: Optional[httpx.AsyncClient] = None) -> Dict[str, Any]:
+    params = {
+        "latitude": lat,
+        "longitude": lon,
+        "current": "temperature_2m,wind_speed_10m",
+        "daily": "temperature_2m_max,temperature_2m_min,precipitation_probability_max,wind_speed_10m_max",
+        "timezone": "auto",
+    }
+    try:
+        if client is None:
+            async with httpx.AsyncClient(timeout=8.0) as c:
+                r = await c.get(WEATHER_URL, params=params)
+        else:
+            r = await client.get(WEATHER_URL, params=params)
+        r.raise_for_status()
+        js = r.json()
+    except Exception as e:
+        raise HTTPException(status_code=502, detail=f"weather_fetch_failed: {e}")
+
+    curr = (js.get("current") or {})
+    daily = (js.get("daily") or {})
+    return {
+        "provider": "open-meteo",
+        "current": {
+            "temp_c": curr.get("temperature_2m"),
+            "wind_kph": curr.get("wind_speed_10m"),
+        },
+        "today": {
+            "tmax_c": (daily.get("temperature_2m_max") or [None])[0],
+            "tmin_c": (daily.get("temperature_2m_min") or [None])[0],
+            "precip_prob": (daily.get("precipitation_probability_max") or [None])[0],
+            "wind_max_kph": (daily.get("wind_speed_10m_max") or [None])[0],
+        },
+    }
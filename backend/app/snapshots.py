@@ -0,0 +1,114 @@
+# backend/app/snapshots.py
+"""
+Materialized per-athlete "today" snapshot.
+
+One athlete_snapshot row holds what the frontends ask for on every load:
+latest metrics, this week's plan (outdoor and indoor variant) and today's
+nutrition targets, including the 7-day TSS the plan is gated on. Reads are a
+primary-key lookup.
+
+Versioning: every writer bumps `data_version` in its own transaction
+(`mark_stale`) and then rebuilds (`refresh`). The row remembers which
+`data_version` it was built from, the day and the payload format, so a
+snapshot that missed a rebuild, crossed midnight or predates a format change
+is recomputed lazily on the next read.
+"""
+import json
+import logging
+from datetime import date, datetime
+from typing import Any, Dict, Iterable
+
+from fastapi import HTTPException
+from sqlalchemy import select, update
+from sqlalchemy.orm import Session
+
+from models import Athlete, AthleteSnapshot
+from app import services
+from app.bulk import upsert_rows
+
+log = logging.getLogger("uvicorn.error")
+
+# bump when the payload shape changes; stored snapshots are rebuilt on read
+SNAPSHOT_FORMAT = 2
+
+
+def build(db: Session, athlete_id: int) -> Dict[str, Any]:
+    plan = services.training_plan(db, athlete_id)  # 404s for unknown athletes
+    return {
+        "athlete_id": athlete_id,
+        "day": date.today().isoformat(),
+        "metrics": services.latest_metrics(db, athlete_id),
+        "plan": plan,
+        "plan_indoor": services.training_plan(db, athlete_id, indoor=True),
+        "nutrition": services.nutrition_today(db, athlete_id),
+    }
+
+
+def mark_stale(db: Session, athlete_ids: Iterable[int]) -> None:
+    """Bump the data version of the given athletes. Call inside the writing transaction; does not commit."""
+    ids = sorted({int(a) for a in athlete_ids})
+    if not ids:
+        return
+    known = db.execute(select(Athlete.id).where(Athlete.id.in_(ids))).scalars().all()
+    upsert_rows(db, AthleteSnapshot.__table__, [{"athlete_id": a} for a in known], conflict_cols=["athlete_id"])
+    db.execute(
+        update(AthleteSnapshot)
+        .where(AthleteSnapshot.athlete_id.in_(ids))
+        .values(data_version=AthleteSnapshot.data_version + 1)
+    )
+
+
+def rebuild(db: Session, athlete_id: int) -> Dict[str, Any]:
+    """Recompute and store the snapshot. Commits."""
+    version = db.execute(
+        select(AthleteSnapshot.data_version).where(AthleteSnapshot.athlete_id == athlete_id)
+    ).scalar() or 0
+    payload = build(db, athlete_id)
+    # a write that lands while we build bumps data_version past `version`, so the next read rebuilds again
+    upsert_rows(
+        db, AthleteSnapshot.__table__,
+        [{
+            "athlete_id": athlete_id, "data_version": version, "built_version": version,
+            "format": SNAPSHOT_FORMAT, "day": date.today(),
+            "payload": json.dumps(payload, default=str), "built_at": datetime.utcnow(),
+        }],
+        conflict_cols=["athlete_id"],
+        update_cols=["built_version", "format", "day", "payload", "built_at"],
+    )
+    db.commit()
+    return payload
+
+
+def get_today(db: Session, athlete_id: int) -> Dict[str, Any]:
+    """The athlete's snapshot, rebuilt first if it is stale. May commit."""
+    row = db.execute(
+        select(
+            AthleteSnapshot.data_version, AthleteSnapshot.built_version,
+            AthleteSnapshot.format, AthleteSnapshot.day, AthleteSnapshot.payload,
+        ).where(AthleteSnapshot.athlete_id == athlete_id)
+    ).first()
+    if (
+        row is not None
+        and row.payload
+        and row.built_version == row.data_version
+        and row.format == SNAPSHOT_FORMAT
+        and row.day == date.today()
+    ):
+        return json.loads(row.payload)
+    return rebuild(db, athlete_id)
+
+
+def refresh(db: Session, athlete_ids: Iterable[int]) -> None:
+    """
+    Materialize after a committed write. Never raises: unknown athletes are
+    skipped, and a failed rebuild is logged and left stale for get_today to
+    retry, since the caller's write already succeeded.
+    """
+    for athlete_id in sorted({int(a) for a in athlete_ids}):
+        try:
+            get_today(db, athlete_id)
+        except HTTPException:
+            db.rollback()
+        except Exception:
+            log.exception(f"snapshot rebuild failed for athlete {athlete_id}; left stale")
+            db.rollback()
@@ -0,0 +1,430 @@
+# backend/app/strava_import.py
+"""
+Strava activity import engine.
+
+Pages of /athlete/activities are fetched over one pooled httpx.AsyncClient
+and written in page order with one set-based insert per page (see
+app.activities). Page 1 goes alone; only when it comes back full are the
+following pages fetched STRAVA_PAGE_WINDOW at a time, so a short daily
+window costs one request, not a whole wave.
+
+Strava's 15-minute and daily quotas are tracked from the X-RateLimit-*
+headers. When a quota runs out the fetchers sleep until it resets; if that
+would take longer than STRAVA_MAX_WAIT_S, the import stops and leaves a
+checkpoint (ImportWatermark, source "strava") that the next call resumes
+from instead of walking the whole window again. A run that completes
+clears the checkpoint, so the next one re-walks its full window (late
+uploads included) and relies on the fingerprint index for the overlap.
+"""
+import asyncio
+import logging
+import os
+import random
+import sys
+import time
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import httpx
+from sqlalchemy import delete, select
+from sqlalchemy.orm import Session
+
+from models import Activity, ActivityStream, Athlete, ImportWatermark
+from app import snapshots, streams
+from app.activities import activity_row, insert_activities
+from app.bulk import upsert_rows
+
+ROOT = Path(__file__).resolve().parents[2]
+if str(ROOT) not in sys.path:
+    sys.path.append(str(ROOT))
+
+from utils import strava_tokens  # noqa: E402
+
+log = logging.getLogger("uvicorn.error")
+
+STRAVA_API = "https://www.strava.com/api/v3"
+STRAVA_PAGE_WINDOW = int(os.getenv("STRAVA_PAGE_WINDOW", "4"))
+STRAVA_PER_PAGE = int(os.getenv("STRAVA_PER_PAGE", "200"))      # Strava's max
+STRAVA_MAX_WAIT_S = float(os.getenv("STRAVA_MAX_WAIT_S", "900"))
+STRAVA_RATE_MARGIN = int(os.getenv("STRAVA_RATE_MARGIN", "5"))  # requests kept in reserve
+STRAVA_MAX_RETRIES = 5
+
+WATERMARK_SOURCE = "strava"
+WATERMARK_KEY = "activities"
+
+
+class StravaError(Exception):
+    def __init__(self, status_code: int, detail: str, upstream_status: Optional[int] = None):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+        self.upstream_status = upstream_status
+
+
+class StravaThrottled(Exception):
+    """Quota exhausted for longer than the caller is willing to wait."""
+
+    def __init__(self, wait_s: float):
+        super().__init__(f"strava_rate_limited ({wait_s:.0f}s)")
+        self.wait_s = wait_s
+
+
+# -------- Mapping --------
+def sport_map(t: str) -> str:
+    return {
+        "Ride":"bike","VirtualRide":"bike","EBikeRide":"bike","GravelRide":"bike",
+        "Run":"run","Swim":"swim","Walk":"walk","Hike":"hike",
+    }.get((t or "").strip(), "other")
+
+
+def estimate_tss(sport: str, duration_min: int) -> int:
+    mult = 0.75 if sport == "bike" else 0.90 if sport == "run" else 0.60
+    return int(round(duration_min * mult))
+
+
+def start_utc(s: Optional[str]) -> Optional[datetime]:
+    # Strava "start_date" is UTC: "2025-10-04T06:15:28Z"
+    try:
+        return datetime.strptime(s, "%Y-%m-%dT%H:%M:%SZ") if s else None
+    except ValueError:
+        return None
+
+
+def activity_rows(athlete_id: int, items: List[Dict[str, Any]]) -> tuple:
+    """Strava summary activities -> (Activity rows, skipped count)."""
+    rows, skipped = [], 0
+    for a in items:
+        sport = sport_map(a.get("type"))
+        start = a.get("start_date_local") or a.get("start_date")
+        if not start:
+            skipped += 1; continue
+        try:
+            d = date.fromisoformat(start.split("T")[0])
+        except Exception:
+            skipped += 1; continue
+
+        duration_min = int(round((a.get("moving_time") or 0) / 60))
+        if duration_min <= 0:
+            skipped += 1; continue
+
+        rows.append(activity_row(
+            athlete_id,
+            day=d,
+            sport=sport,
+            duration_min=duration_min,
+            tss=estimate_tss(sport, duration_min),
+            source="strava",
+            start_time=start_utc(a.get("start_date")),
+            external_id=str(a["id"]) if a.get("id") else None,
+        ))
+    return rows, skipped
+
+
+# -------- Rate limits --------
+def _seconds_to_next_quarter(now: float) -> float:
+    return 900 - (now % 900) + 1
+
+
+def _seconds_to_utc_midnight(now: float) -> float:
+    return 86400 - (now % 86400) + 1
+
+
+class RateLimiter:
+    """
+    Mirrors Strava's "X-RateLimit-Limit: 200,2000" / "X-RateLimit-Usage: 12,345"
+    headers (15-minute window, UTC day). Windows reset on the quarter hour and
+    at UTC midnight.
+    """
+
+    def __init__(self, margin: int = STRAVA_RATE_MARGIN):
+        self.margin = margin
+        self.limit_15m: Optional[int] = None
+        self.limit_day: Optional[int] = None
+        self.usage_15m = 0
+        self.usage_day = 0
+        self._blocked_until = 0.0
+        self.in_flight = 0
+
+    @staticmethod
+    def _pair(v: Optional[str]):
+        try:
+            a, b = v.split(",")[:2]
+            return int(a), int(b)
+        except (AttributeError, ValueError):
+            return None
+
+    def update(self, headers: httpx.Headers) -> None:
+        limit = self._pair(headers.get("X-RateLimit-Limit"))
+        usage = self._pair(headers.get("X-RateLimit-Usage"))
+        if limit:
+            self.limit_15m, self.limit_day = limit
+        if usage:
+            self.usage_15m, self.usage_day = usage
+
+    def throttled(self) -> None:
+        """A 429 arrived: block until the next 15-minute window at least."""
+        self._blocked_until = max(self._blocked_until, time.time() + _seconds_to_next_quarter(time.time()))
+
+    def wait_s(self) -> float:
+        now = time.time()
+        wait = max(0.0, self._blocked_until - now)
+        projected = self.in_flight
+        if self.limit_day and self.usage_day + projected >= self.limit_day - self.margin:
+            wait = max(wait, _seconds_to_utc_midnight(now))
+        elif self.limit_15m and self.usage_15m + projected >= self.limit_15m - self.margin:
+            wait = max(wait, _seconds_to_next_quarter(now))
+        return wait
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "usage_15m": self.usage_15m, "limit_15m": self.limit_15m,
+            "usage_day": self.usage_day, "limit_day": self.limit_day,
+        }
+
+
+async def get_json(
+    client: httpx.AsyncClient,
+    path: str,
+    params: Dict[str, Any],
+    limiter: RateLimiter,
+    max_wait_s: float,
+) -> Any:
+    for attempt in range(STRAVA_MAX_RETRIES):
+        wait = limiter.wait_s()
+        if wait > max_wait_s:
+            raise StravaThrottled(wait)
+        if wait:
+            log.info(f"strava quota reached, sleeping {wait:.0f}s")
+            await asyncio.sleep(wait)
+
+        limiter.in_flight += 1
+        try:
+            r = await client.get(path, params=params)
+        except httpx.TransportError as e:
+            if attempt == STRAVA_MAX_RETRIES - 1:
+                raise StravaError(502, f"strava_list_exception: {e}")
+            await asyncio.sleep(2 ** attempt + random.random())
+            continue
+        finally:
+            limiter.in_flight -= 1
+
+        limiter.update(r.headers)
+        if r.status_code == 429:
+            limiter.throttled()
+            continue
+        if r.status_code >= 500:
+            await asyncio.sleep(2 ** attempt + random.random())
+            continue
+        if r.status_code >= 400:
+            raise StravaError(502, f"strava_list_error {r.status_code}: {r.text[:300]}", r.status_code)
+        return r.json()
+    raise StravaError(502, "strava_list_retries_exhausted")
+
+
+def new_client(token: str, window: int = STRAVA_PAGE_WINDOW) -> httpx.AsyncClient:
+    return httpx.AsyncClient(
+        base_url=STRAVA_API,
+        headers={"Authorization": f"Bearer {token}"},
+        timeout=30,
+        limits=httpx.Limits(max_connections=window, max_keepalive_connections=window),
+    )
+
+
+# -------- Streams --------
+async def fetch_streams(
+    client: httpx.AsyncClient, external_id: str, limiter: RateLimiter, max_wait_s: float,
+) -> Dict[str, List[Any]]:
+    data = await get_json(
+        client, f"/activities/{external_id}/streams",
+        {"keys": ",".join(streams.STREAM_KEYS), "key_by_type": "true"}, limiter, max_wait_s,
+    )
+    return {k: v.get("data") or [] for k, v in (data or {}).items() if k in streams.STREAM_KEYS}
+
+
+async def ingest_streams(
+    db: Session,
+    client: httpx.AsyncClient,
+    limiter: RateLimiter,
+    athlete_id: int,
+    external_ids: List[str],
+    max_wait_s: float = STRAVA_MAX_WAIT_S,
+    window: int = STRAVA_PAGE_WINDOW,
+) -> int:
+    """Fetch and store streams for the given Strava ids that have none yet. Commits."""
+    if not external_ids:
+        return 0
+    todo = db.execute(
+        select(Activity).outerjoin(ActivityStream, ActivityStream.activity_id == Activity.id).where(
+            Activity.athlete_id == athlete_id,
+            Activity.source == "strava",
+            Activity.external_id.in_(external_ids),
+            ActivityStream.id.is_(None),
+        )
+    ).scalars().all()
+    if not todo:
+        return 0
+    ftp = db.execute(select(Athlete.ftp_w).where(Athlete.id == athlete_id)).scalar()
+    sem = asyncio.Semaphore(window)
+
+    async def one(a: Activity):
+        async with sem:
+            return await fetch_streams(client, a.external_id, limiter, max_wait_s)
+
+    results = await asyncio.gather(*(one(a) for a in todo), return_exceptions=True)
+    stored = 0
+    throttled: Optional[StravaThrottled] = None
+    for a, res in zip(todo, results):
+        if isinstance(res, StravaThrottled):
+            throttled = res
+        elif isinstance(res, BaseException):
+            log.warning(f"strava streams {a.external_id}: {res}")
+        elif streams.store_streams(db, a, res, ftp):
+            stored += 1
+    if stored:
+        snapshots.mark_stale(db, [athlete_id])  # power-based TSS replaced the estimate
+    db.commit()
+    if throttled:
+        raise throttled
+    return stored
+
+
+# -------- Checkpoint --------
+def _load_checkpoint(db: Session, athlete_id: int) -> Optional[ImportWatermark]:
+    return db.execute(
+        select(ImportWatermark).where(
+            ImportWatermark.athlete_id == athlete_id,
+            ImportWatermark.source == WATERMARK_SOURCE,
+            ImportWatermark.record_type == WATERMARK_KEY,
+        )
+    ).scalars().first()
+
+
+def _save_checkpoint(db: Session, athlete_id: int, last_start: datetime, covered_from: date) -> None:
+    upsert_rows(
+        db, ImportWatermark.__table__,
+        [{
+            "athlete_id": athlete_id, "source": WATERMARK_SOURCE, "record_type": WATERMARK_KEY,
+            "last_end": last_start, "last_day": last_start.date(),
+            "covered_from": covered_from, "updated_at": datetime.utcnow(),
+        }],
+        conflict_cols=["athlete_id", "source", "record_type"],
+        update_cols=["last_end", "last_day", "covered_from", "updated_at"],
+    )
+
+
+def _clear_checkpoint(db: Session, athlete_id: int) -> None:
+    db.execute(
+        delete(ImportWatermark).where(
+            ImportWatermark.athlete_id == athlete_id,
+            ImportWatermark.source == WATERMARK_SOURCE,
+            ImportWatermark.record_type == WATERMARK_KEY,
+        )
+    )
+
+
+# -------- Import --------
+async def import_activities(
+    db: Session,
+    athlete_id: int,
+    token: Optional[str] = None,
+    *,
+    after_days: int = 30,
+    window: int = STRAVA_PAGE_WINDOW,
+    per_page: int = STRAVA_PER_PAGE,
+    max_wait_s: float = STRAVA_MAX_WAIT_S,
+    client: Optional[httpx.AsyncClient] = None,
+    with_streams: bool = False,
+) -> Dict[str, Any]:
+    """
+    Import the athlete's Strava activities from the last `after_days` days.
+
+    Resumes from the checkpoint of a previous run that stopped on the rate
+    limit, when that run covered the window; a complete run clears it.
+    Without `token`, the shared token cache is used. Commits after every
+    page, so an interrupted run loses nothing. With
+    `with_streams`, rides also get their power/HR streams (one extra request
+    per ride).
+    """
+    started = time.perf_counter()
+    covered_from = date.today() - timedelta(days=after_days)
+    after = int(time.time()) - after_days * 86400
+
+    mark = _load_checkpoint(db, athlete_id)
+    resumed = bool(mark and mark.last_end and mark.covered_from and mark.covered_from <= covered_from)
+    if resumed:
+        # Strava's `after` is exclusive; step back a second, the fingerprint index eats the overlap
+        after = max(after, int((mark.last_end - datetime(1970, 1, 1)).total_seconds()) - 1)
+        covered_from = mark.covered_from
+    last_start: Optional[datetime] = mark.last_end if resumed else None
+
+    limiter = RateLimiter()
+    own_client = client is None
+    client = client or new_client(token or strava_tokens.get_access_token(), window)
+    imported = skipped = pages = streams_stored = 0
+    complete = False
+    try:
+        page, width = 1, 1  # page 1 alone; widen only once a full page says there is more
+        while not complete:
+            wave = list(range(page, page + width))
+            results = await asyncio.gather(
+                *(get_json(client, "/athlete/activities",
+                            {"after": after, "page": p, "per_page": per_page}, limiter, max_wait_s)
+                  for p in wave),
+                return_exceptions=True,
+            )
+            # write in page order; stop at the first page that failed
+            for res in results:
+                if isinstance(res, BaseException):
+                    raise res
+                items = res or []
+                pages += 1
+                rows, bad = activity_rows(athlete_id, items)
+                inserted = insert_activities(db, rows)
+                if inserted:
+                    snapshots.mark_stale(db, [athlete_id])
+                imported += inserted
+                skipped += bad + len(rows) - inserted
+                starts = [s for s in (start_utc(a.get("start_date")) for a in items) if s]
+                if starts:
+                    last_start = max(starts + ([last_start] if last_start else []))
+                if last_start:
+                    _save_checkpoint(db, athlete_id, last_start, covered_from)
+                db.commit()
+                if with_streams:
+                    rides = [str(a["id"]) for a in items if a.get("id") and sport_map(a.get("type")) == "bike"]
+                    streams_stored += await ingest_streams(db, client, limiter, athlete_id, rides, max_wait_s)
+                if len(items) < per_page:
+                    complete = True
+                    break
+            page += width
+            width = max(1, window)
+    except StravaThrottled as e:
+        db.rollback()
+        log.warning(f"strava import paused for athlete {athlete_id}: {e}")
+        if imported or streams_stored:
+            snapshots.refresh(db, [athlete_id])
+        return {
+            "ok": True, "complete": False, "imported": imported, "skipped": skipped,
+            "after_days": after_days, "pages": pages, "resumed": resumed, "streams_stored": streams_stored,
+            "resume_after": last_start.isoformat() if last_start else None,
+            "retry_in_s": round(e.wait_s), "rate_limit": limiter.snapshot(),
+        }
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        if own_client:
+            await client.aclose()
+
+    _clear_checkpoint(db, athlete_id)
+    db.commit()
+    if imported or streams_stored:
+        snapshots.refresh(db, [athlete_id])
+    elapsed = time.perf_counter() - started
+    log.info(f"strava import athlete={athlete_id}: imported={imported}, skipped={skipped}, pages={pages}, {elapsed:.1f}s")
+    return {
+        "ok": True, "complete": True, "imported": imported, "skipped": skipped,
+        "after_days": after_days, "pages": pages, "resumed": resumed, "streams_stored": streams_stored,
+        "elapsed_s": round(elapsed, 2), "rate_limit": limiter.snapshot(),
+    }
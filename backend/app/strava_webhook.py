@@ -0,0 +1,219 @@
+# backend/app/strava_webhook.py
+"""
+Strava push-subscription event processing.
+
+The webhook endpoint only validates and enqueues; Strava expects an answer
+within two seconds. A background thread drains the queue every
+STRAVA_WEBHOOK_FLUSH_S seconds: events for the same activity are coalesced,
+every remaining activity is fetched concurrently from /activities/{id}, and
+the batch is written in one transaction. Whatever the event says, the fetch
+decides: an activity Strava returns is upserted in place (keeping its id,
+streams and power-based TSS), one Strava answers 404 for is deleted, and
+one whose fetch failed is left untouched.
+
+The queue is per process and in memory. Events lost in a crash are picked up
+by the next /strava/import, which re-walks its window.
+"""
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import delete, select
+
+from db import SessionLocal
+from models import Activity, ActivityStream, Athlete
+from app.activities import upsert_activities
+from app import load, snapshots, strava_import
+
+ROOT = Path(__file__).resolve().parents[2]
+if str(ROOT) not in sys.path:
+    sys.path.append(str(ROOT))
+
+from utils import strava_tokens  # noqa: E402
+
+log = logging.getLogger("uvicorn.error")
+
+STRAVA_WEBHOOK_FLUSH_S = float(os.getenv("STRAVA_WEBHOOK_FLUSH_S", "2"))
+STRAVA_WEBHOOK_BATCH_MAX = int(os.getenv("STRAVA_WEBHOOK_BATCH_MAX", "50"))
+STRAVA_WEBHOOK_MAX_WAIT_S = float(os.getenv("STRAVA_WEBHOOK_MAX_WAIT_S", "30"))
+# single-athlete deployments: events whose owner_id is not linked to an athlete go here
+STRAVA_DEFAULT_ATHLETE_ID = os.getenv("STRAVA_DEFAULT_ATHLETE_ID")
+# also pull power/HR streams for new rides (one extra API request per ride)
+STRAVA_WEBHOOK_STREAMS = os.getenv("STRAVA_WEBHOOK_STREAMS", "0") == "1"
+
+EventKey = Tuple[int, int]  # (owner_id, activity id)
+
+
+def _merge(prev: Optional[str], new: str) -> str:
+    if new == "delete" or prev == "delete" and new != "create":
+        return "delete"
+    if prev == "create":
+        return "create"  # still a fresh fetch + insert
+    return new
+
+
+class EventQueue:
+    def __init__(self, flush_s: float = STRAVA_WEBHOOK_FLUSH_S, batch_max: int = STRAVA_WEBHOOK_BATCH_MAX):
+        self.flush_s = flush_s
+        self.batch_max = batch_max
+        self._pending: Dict[EventKey, str] = {}
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._stop = False
+        self._resume_at = 0.0
+        self.stats = {"received": 0, "coalesced": 0, "batches": 0, "written": 0, "deleted": 0, "failed": 0}
+
+    def put(self, owner_id: int, activity_id: int, aspect: str) -> None:
+        with self._cond:
+            key = (owner_id, activity_id)
+            prev = self._pending.get(key)
+            if prev is not None:
+                self.stats["coalesced"] += 1
+            self._pending[key] = _merge(prev, aspect)
+            self.stats["received"] += 1
+            if len(self._pending) >= self.batch_max:
+                self._cond.notify()
+            if self._thread is None or not self._thread.is_alive():
+                self._stop = False
+                self._thread = threading.Thread(target=self._run, name="strava-webhook", daemon=True)
+                self._thread.start()
+
+    def stop(self) -> None:
+        with self._cond:
+            self._stop = True
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join(timeout=10)
+
+    def pending(self) -> int:
+        return len(self._pending)
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                self._cond.wait(timeout=max(self.flush_s, self._resume_at - time.time()))
+                if time.time() < self._resume_at and not self._stop:
+                    continue
+                batch, self._pending = self._pending, {}
+                stop = self._stop
+            if batch:
+                self._process(batch)
+            if stop:
+                return
+
+    def _process(self, batch: Dict[EventKey, str]) -> None:
+        self.stats["batches"] += 1
+        try:
+            retry, wait_s = asyncio.run(process_events(batch, self.stats))
+        except Exception:
+            log.exception("strava webhook batch failed")
+            self.stats["failed"] += len(batch)
+            return
+        if retry:
+            # quota exhausted: put the events back and hold off until it resets
+            with self._cond:
+                for key, aspect in retry.items():
+                    self._pending[key] = _merge(aspect, self._pending[key]) if key in self._pending else aspect
+                self._resume_at = time.time() + wait_s
+
+
+def _athlete_ids(db, owner_ids: List[int]) -> Dict[int, int]:
+    rows = db.execute(
+        select(Athlete.strava_athlete_id, Athlete.id).where(Athlete.strava_athlete_id.in_(owner_ids))
+    ).all()
+    out = {owner: aid for owner, aid in rows}
+    if STRAVA_DEFAULT_ATHLETE_ID:
+        for owner in owner_ids:
+            out.setdefault(owner, int(STRAVA_DEFAULT_ATHLETE_ID))
+    return out
+
+
+async def _fetch(client, key: EventKey, limiter, sem) -> Any:
+    async with sem:
+        return await strava_import.get_json(
+            client, f"/activities/{key[1]}", {}, limiter, STRAVA_WEBHOOK_MAX_WAIT_S,
+        )
+
+
+async def process_events(batch: Dict[EventKey, str], stats: Dict[str, int]) -> Tuple[Dict[EventKey, str], float]:
+    """Apply one coalesced batch. Returns (events to retry later, seconds to wait)."""
+    fetched: Dict[EventKey, Dict[str, Any]] = {}
+    gone: List[EventKey] = []  # Strava answered 404: deleted (or made private) since the event
+    retry: Dict[EventKey, str] = {}
+    wait_s = 0.0
+    keys = list(batch)
+    if keys:
+        limiter = strava_import.RateLimiter()
+        sem = asyncio.Semaphore(strava_import.STRAVA_PAGE_WINDOW)
+        async with strava_import.new_client(strava_tokens.get_access_token()) as client:
+            results = await asyncio.gather(
+                *(_fetch(client, k, limiter, sem) for k in keys), return_exceptions=True,
+            )
+        for key, res in zip(keys, results):
+            if isinstance(res, strava_import.StravaThrottled):
+                retry[key] = batch[key]
+                wait_s = max(wait_s, res.wait_s)
+            elif isinstance(res, strava_import.StravaError) and res.upstream_status == 404:
+                gone.append(key)
+            elif isinstance(res, strava_import.StravaError):
+                if res.upstream_status == 401:
+                    strava_tokens.invalidate()
+                log.warning(f"strava webhook fetch {key[1]}: {res.detail}")
+                stats["failed"] += 1
+            elif isinstance(res, BaseException):
+                log.warning(f"strava webhook fetch {key[1]}: {res}")
+                stats["failed"] += 1
+            elif isinstance(res, dict):
+                if batch[key] == "delete":
+                    log.info(f"strava webhook: delete event for {key[1]}, which Strava still returns; kept")
+                fetched[key] = res
+
+    with SessionLocal() as db:
+        athletes = _athlete_ids(db, sorted({owner for owner, _ in list(fetched) + gone}))
+        touched = {athletes[k[0]] for k in list(fetched) + gone if k[0] in athletes}
+        remove = [str(k[1]) for k in gone if k[0] in athletes]
+        if remove:
+            stale = select(Activity.id).where(Activity.source == "strava", Activity.external_id.in_(remove))
+            db.execute(delete(ActivityStream).where(ActivityStream.activity_id.in_(stale)))
+            deleted = db.execute(
+                delete(Activity)
+                .where(Activity.source == "strava", Activity.external_id.in_(remove))
+                .returning(Activity.athlete_id, Activity.date)
+            ).mappings().all()
+            stats["deleted"] += len(deleted)
+            load.recompute(db, load.earliest(deleted))
+        rows = []
+        for key, item in fetched.items():
+            if key[0] not in athletes:
+                log.info(f"strava webhook: no athlete linked to owner {key[0]}")
+                continue
+            rows.extend(strava_import.activity_rows(athletes[key[0]], [item])[0])
+        stats["written"] += upsert_activities(db, rows)
+        snapshots.mark_stale(db, touched)
+        db.commit()
+
+        if STRAVA_WEBHOOK_STREAMS:
+            rides: Dict[int, List[str]] = {}
+            for row in rows:
+                if row["sport"] == "bike" and row["external_id"]:
+                    rides.setdefault(row["athlete_id"], []).append(row["external_id"])
+            if rides:
+                limiter = strava_import.RateLimiter()
+                async with strava_import.new_client(strava_tokens.get_access_token()) as client:
+                    for athlete_id, ids in rides.items():
+                        try:
+                            await strava_import.ingest_streams(
+                                db, client, limiter, athlete_id, ids, STRAVA_WEBHOOK_MAX_WAIT_S,
+                            )
+                        except strava_import.StravaThrottled:
+                            break  # left for /strava/streams/backfill
+        snapshots.refresh(db, touched)
+    return retry, wait_s
+
+
+queue = EventQueue()
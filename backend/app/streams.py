@@ -0,0 +1,134 @@
+# backend/app/streams.py
+"""
+Compact storage of per-second activity streams and power metrics.
+
+Each activity's streams (time, watts, heartrate, cadence) are stored as one
+compressed .npz blob in activity_stream, never a row per sample. Every
+channel is kept in the smallest unsigned dtype that holds it and `time` is
+delta-encoded, so a 5-hour ride packs into a few tens of KB.
+
+NP/IF/TSS are computed with NumPy on a 1 Hz grid: cumulative-sum rolling
+30 s mean, fourth-power mean, fourth root.
+"""
+import io
+from datetime import datetime
+from typing import Any, Dict, Mapping, Optional, Sequence
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from models import Activity, ActivityStream
+from app import load
+from app.bulk import upsert_rows
+
+STREAM_KEYS = ("time", "watts", "heartrate", "cadence")
+ENCODING = "npz-v1"
+NP_WINDOW_S = 30
+
+
+def _compact(values: Sequence[Any]) -> np.ndarray:
+    a = np.nan_to_num(np.asarray(values, dtype=np.float64), nan=0.0)  # Strava sends nulls on dropouts
+    a = np.clip(np.rint(a), 0, None)
+    return a.astype(np.min_scalar_type(int(a.max()) if len(a) else 0))
+
+
+def encode_streams(streams: Mapping[str, Sequence[Any]]) -> bytes:
+    arrays = {}
+    for key in STREAM_KEYS:
+        values = streams.get(key)
+        if values is None or not len(values):
+            continue
+        if key == "time":
+            t = np.asarray(values, dtype=np.int64)
+            arrays["time_start"] = np.array([t[0]], dtype=np.int64)
+            arrays["time"] = _compact(np.diff(t, prepend=t[0]))
+        else:
+            arrays[key] = _compact(values)
+    buf = io.BytesIO()
+    np.savez_compressed(buf, **arrays)
+    return buf.getvalue()
+
+
+def decode_streams(blob: bytes) -> Dict[str, np.ndarray]:
+    with np.load(io.BytesIO(blob)) as z:
+        out = {k: z[k] for k in z.files if k != "time_start"}
+        if "time" in out:
+            out["time"] = np.cumsum(out["time"], dtype=np.int64) + int(z["time_start"][0])
+    return out
+
+
+def _grid_1hz(time_s: np.ndarray, values: np.ndarray) -> np.ndarray:
+    # recording gaps (auto-pause) count as zero power, like head units do
+    t = np.asarray(time_s, dtype=np.int64)
+    t = t - t[0]
+    grid = np.zeros(int(t[-1]) + 1, dtype=np.float64)
+    grid[t] = values
+    return grid
+
+
+def normalized_power(time_s: np.ndarray, watts: np.ndarray) -> Optional[float]:
+    p = _grid_1hz(time_s, watts)
+    if len(p) < NP_WINDOW_S:
+        return None
+    c = np.cumsum(np.r_[0.0, p])
+    rolling = (c[NP_WINDOW_S:] - c[:-NP_WINDOW_S]) / NP_WINDOW_S
+    return float(np.mean(rolling ** 4) ** 0.25)
+
+
+def power_metrics(time_s: np.ndarray, watts: np.ndarray, ftp_w: Optional[float]) -> Dict[str, Optional[float]]:
+    duration = float(time_s[-1] - time_s[0]) if len(time_s) else 0.0
+    np_w = normalized_power(time_s, watts) if len(watts) else None
+    out = {
+        "duration_s": duration,
+        "avg_power_w": round(float(np.mean(_grid_1hz(time_s, watts))), 1) if len(watts) else None,
+        "np_w": round(np_w, 1) if np_w else None,
+        "intensity_factor": None,
+        "tss": None,
+    }
+    if np_w and ftp_w:
+        intensity = np_w / ftp_w
+        out["intensity_factor"] = round(intensity, 3)
+        out["tss"] = round(duration * np_w * intensity / (ftp_w * 3600) * 100, 1)
+    return out
+
+
+def store_streams(
+    db: Session,
+    activity: Activity,
+    streams: Mapping[str, Sequence[Any]],
+    ftp_w: Optional[float],
+) -> Optional[Dict[str, Any]]:
+    """
+    Encode and upsert one activity's streams; replaces the activity's
+    duration-based TSS estimate when power and FTP are available. Does not commit.
+    """
+    if not streams.get("time"):
+        return None
+    t = np.asarray(streams["time"], dtype=np.int64)
+    row: Dict[str, Any] = {
+        "activity_id": activity.id,
+        "athlete_id": activity.athlete_id,
+        "encoding": ENCODING,
+        "channels": ",".join(k for k in STREAM_KEYS if streams.get(k)),
+        "samples": len(t),
+        "data": encode_streams(streams),
+        "avg_hr_bpm": None,
+        "created_at": datetime.utcnow(),
+    }
+    if streams.get("heartrate"):
+        hr = np.asarray(streams["heartrate"], dtype=np.float64)  # nulls (dropouts) become NaN
+        if not np.isnan(hr).all():
+            row["avg_hr_bpm"] = round(float(np.nanmean(hr)), 1)
+    watts = streams.get("watts")
+    row.update(power_metrics(t, _compact(watts).astype(np.float64) if watts else np.array([]), ftp_w))
+
+    upsert_rows(
+        db, ActivityStream.__table__, [row],
+        conflict_cols=["activity_id"],
+        update_cols=[c for c in row if c != "activity_id"],
+    )
+    if row["tss"] is not None:
+        activity.tss = int(round(row["tss"]))
+        db.flush()
+        load.recompute(db, {activity.athlete_id: activity.date})
+    return row
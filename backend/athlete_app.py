@@ -1,6 +1,7 @@
 import streamlit as st
 import requests
 import datetime as dt
+import time
 
 st.set_page_config(page_title="Athlete App (MVP)", layout="wide")
 st.title("Athlete App (MVP)")
@@ -153,12 +154,37 @@ st.divider()
 st.subheader("Apple Health ZIP import (optional)")
 upload = st.file_uploader("Upload export.zip from Apple Health (compressed)", type=["zip"])
 since_days = st.slider("Import last N days", min_value=30, max_value=365, value=180, step=30)
+include_media = st.checkbox("Also import workout routes (GPX) and ECGs", value=False)
 if upload and st.button("Import"):
     try:
         files = {"file": ("export.zip", upload.getvalue(), "application/zip")}
-        data = {"athlete_id": str(int(athlete_id)), "since_days": str(int(since_days))}
+        data = {
+            "athlete_id": str(int(athlete_id)),
+            "since_days": str(int(since_days)),
+            "include_media": "true" if include_media else "false",
+        }
         res = post("/apple_health/import", files=files, data=data)
-        st.success(f"Imported: {res.get('metrics_days_imported')} days, {res.get('workouts_imported')} workouts")
+        job_id = res.get("job_id")
+        status = st.empty()
+        job = {}
+        while job_id:
+            job = get(f"/jobs/{job_id}")
+            if job.get("phase") in ("done", "failed"):
+                break
+            eta = f" • ETA {job['eta_s']:.0f}s" if job.get("eta_s") else ""
+            if job.get("phase") == "media":
+                status.info(f"media: {job.get('media_done') or 0}/{job.get('media_total') or '?'} files")
+            else:
+                status.info(f"{job.get('phase')}: {job.get('records_parsed') or 0:,} records{eta}")
+            time.sleep(2)
+        status.empty()
+        if job.get("phase") == "failed":
+            st.error(f"Import failed: {job.get('error')}")
+        else:
+            st.success(f"Imported: {job.get('days_upserted')} days, {job.get('workouts_imported')} workouts")
+            media = (job.get("result") or {}).get("media")
+            if media:
+                st.caption(f"Routes: {media['routes_imported']} • ECGs: {media['ecgs_imported']}")
     except Exception as e:
         st.error(f"Import failed: {e}")
 
@@ -1,9 +1,9 @@
 # backend/main.py
+import asyncio
 import os
 import logging
 import zipfile
-import xml.etree.ElementTree as ET
-from datetime import date, timedelta
+from datetime import date, datetime, timedelta, timezone
 from typing import Any, Dict, List, Optional
 
 import sqlalchemy
@@ -13,7 +13,7 @@ from fastapi import (
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import RedirectResponse
 from pydantic import BaseModel
-from sqlalchemy import text, select, func
+from sqlalchemy import text, select
 from sqlalchemy.orm import Session
 
 # -------- API key guard (Step 1) --------
@@ -37,9 +37,10 @@ except Exception:
 
 # -------- Our modules --------
 import models as m
-from models import Athlete, TrainingBlock
+from models import Athlete
 from db import engine, SessionLocal
 from app.config import CORS_ALLOW_ORIGINS
+from app import activities, body_metrics, jobs, load, planning, services, snapshots
 
 log = logging.getLogger("uvicorn.error")
 
@@ -71,6 +72,9 @@ if ENABLE_METRICS:
     from app.routers import metrics_api
     app.include_router(metrics_api.router)
 
+from app.routers import jobs_api
+app.include_router(jobs_api.router)
+
 # -------- CORS --------
 app.add_middleware(
     CORSMiddleware,
@@ -99,6 +103,10 @@ def _bootstrap():
                 print("[BOOTSTRAP] Seeded Athlete(id=1)")
         print("[BOOTSTRAP] Done.")
 
+@app.on_event("shutdown")
+def _shutdown_jobs():
+    jobs.shutdown()
+
 # -------- Debug env (optionally gated) --------
 @app.get("/debug/env", dependencies=[Depends(require_api_key)])
 def debug_env():
@@ -165,201 +173,23 @@ def update_athlete(athlete_id: int, payload: dict = Body(...), db: Session = Dep
     for k in ["ftp_w", "vo2max", "rhr", "weight_kg", "height_cm", "age"]:
         if k in payload and payload[k] is not None:
             setattr(a, k, payload[k])
+    snapshots.mark_stale(db, [athlete_id])
     db.commit()
+    if payload.get("ftp_w") is not None:
+        planning.invalidate_week_plans(athlete_id)
     db.refresh(a)
+    snapshots.refresh(db, [athlete_id])
     return {"ok": True, "athlete_id": a.id, "ftp_w": a.ftp_w, "vo2max": a.vo2max}
 
 # ================= Helpers: planning / sessions =================
-POWER_ZONE_TARGET_IF = {
-    "recovery": 0.55,
-    "endurance": 0.65,
-    "tempo": 0.80,
-    "sweetspot": 0.88,
-    "threshold": 0.95,
-    "vo2": 1.05,
-}
-
-def _to_float(v):
-    try:
-        return float(v)
-    except Exception:
-        return None
-
-def estimate_tss(duration_min: int, intensity_factor: float) -> int:
-    hours = duration_min / 60.0
-    return int(round(hours * (intensity_factor ** 2) * 100.0))
-
-def is_recovery_week(start_date, block_len_weeks: int, recovery_weeks: int, ref_date):
-    if not start_date or not block_len_weeks:
-        return False
-    cycle = block_len_weeks + (recovery_weeks or 0)
-    if cycle <= 0:
-        return False
-    week_index = (ref_date - start_date).days // 7
-    return (week_index % cycle) >= block_len_weeks
-
-def session_endurance(day: date, duration_min: int, ftp_w: float):
-    IF = POWER_ZONE_TARGET_IF["endurance"]
-    return {
-        "date": day.isoformat(),
-        "sport": "bike",
-        "title": "Endurance Z2",
-        "details": "Steady Z2; cadence 85–95rpm; 3×5min high-cadence 100–110rpm",
-        "duration_min": duration_min,
-        "intensity_factor": IF,
-        "target_power_w": [0.56 * ftp_w, 0.75 * ftp_w] if ftp_w else None,
-        "indoor_ok": True,
-        "tss": estimate_tss(duration_min, IF),
-    }
-
-def session_sweetspot(day: date, ftp_w: float, main_intervals=(2, 15)):
-    IF = POWER_ZONE_TARGET_IF["sweetspot"]
-    reps, mins = main_intervals
-    duration_min = 20 + reps * mins + (reps - 1) * 5
-    return {
-        "date": day.isoformat(),
-        "sport": "bike",
-        "title": f"Sweet Spot {reps}×{mins}min @ 88–92% FTP",
-        "details": "WU 10–15min; SS work; 5min rec; CD 10min",
-        "duration_min": duration_min,
-        "intensity_factor": IF,
-        "target_power_w": [0.88 * ftp_w, 0.92 * ftp_w] if ftp_w else None,
-        "indoor_ok": True,
-        "tss": estimate_tss(duration_min, IF),
-    }
-
-def session_threshold(day: date, ftp_w: float, main_intervals=(3, 10)):
-    IF = POWER_ZONE_TARGET_IF["threshold"]
-    reps, mins = main_intervals
-    duration_min = 20 + reps * mins + (reps - 1) * 5
-    return {
-        "date": day.isoformat(),
-        "sport": "bike",
-        "title": f"Threshold {reps}×{mins}min @ 95–100% FTP",
-        "details": "WU 15–20min; 3–4×8–10min @ 95–100%; 5min rec; CD 10–15min",
-        "duration_min": duration_min,
-        "intensity_factor": IF,
-        "target_power_w": [0.95 * ftp_w, 1.00 * ftp_w] if ftp_w else None,
-        "indoor_ok": True,
-        "tss": estimate_tss(duration_min, IF),
-    }
-
-def session_long_endurance(day: date, hours: float, ftp_w: float):
-    duration_min = int(hours * 60)
-    IF = 0.68
-    return {
-        "date": day.isoformat(),
-        "sport": "bike",
-        "title": f"Long Endurance {hours:.1f}h",
-        "details": "Mostly Z2; add 2×20min low-Z3 climbs if feeling good",
-        "duration_min": duration_min,
-        "intensity_factor": IF,
-        "target_power_w": [0.60 * ftp_w, 0.75 * ftp_w] if ftp_w else None,
-        "indoor_ok": False,
-        "tss": estimate_tss(duration_min, IF),
-    }
-
-def session_indoor_endurance(day: date, ftp_w: float):
-    duration_min = 120
-    IF = 0.72
-    return {
-        "date": day.isoformat(),
-        "sport": "bike",
-        "title": "Indoor Endurance Builder 2.0h",
-        "details": "WU 15min Z2 → 3×12min @ 88–92% FTP (5min easy) → Z2 steady; CD 10min",
-        "duration_min": duration_min,
-        "intensity_factor": IF,
-        "target_power_w": [0.60 * ftp_w, 0.92 * ftp_w] if ftp_w else None,
-        "indoor_ok": True,
-        "tss": estimate_tss(duration_min, IF),
-    }
-
-def session_mobility(day: date, minutes=45):
-    return {
-        "date": day.isoformat(),
-        "sport": "strength",
-        "title": "Strength & Mobility",
-        "details": "Core 15min + mobility 20min + glute activation 10min",
-        "duration_min": minutes,
-        "intensity_factor": 0.0,
-        "target_power_w": None,
-        "indoor_ok": True,
-        "tss": 0,
-    }
-
-def session_rest(day: date, minutes=30):
-    return {
-        "date": day.isoformat(),
-        "sport": "rest",
-        "title": "Rest / Easy Walk",
-        "details": "Optional 20–30min easy walk or spin <Z1",
-        "duration_min": minutes,
-        "intensity_factor": 0.0,
-        "target_power_w": None,
-        "indoor_ok": True,
-        "tss": 0,
-    }
+from app.planning import estimate_tss  # noqa: E402
 
-def recent_7d_tss(db: Session, athlete_id: int, ref_day: date) -> int:
-    if Activity is None:
-        return 0
-    start = ref_day - timedelta(days=6)
-    total = db.execute(
-        select(func.coalesce(func.sum(Activity.tss), 0))
-        .where(Activity.athlete_id == athlete_id)
-        .where(Activity.date >= start)
-        .where(Activity.date <= ref_day)
-    ).scalar()
-    return int(total or 0)
-
-def generate_week_plan(
-    athlete: Athlete,
-    blk: Optional[TrainingBlock],
-    start_date: date,
-    *,
-    fatigue_7d: int = 0,
-    indoor: bool = False,
-):
-    ftp = float(athlete.ftp_w or 0)
-    recovery = is_recovery_week(
-        blk.start_date if blk else None,
-        blk.block_length_weeks if blk else 3,
-        blk.recovery_weeks if blk else 1,
-        start_date,
-    )
-    plan: List[Dict[str, Any]] = []
-    for i in range(7):
-        day = start_date + timedelta(days=i)
-        wd = day.weekday()  # Mon=0 ... Sun=6
-        if recovery:
-            if wd in (0, 4):       plan.append(session_rest(day))
-            elif wd in (1, 3):     plan.append(session_mobility(day, 35))
-            elif wd in (2, 5):     plan.append(session_endurance(day, 50, ftp))
-            else:                  plan.append(session_endurance(day, 60, ftp))
-        else:
-            if wd == 0:
-                plan.append(session_rest(day))
-            elif wd == 1:
-                plan.append(session_endurance(day, 75, ftp))
-            elif wd == 2:
-                plan.append(session_sweetspot(day, ftp, (2, 15)))
-            elif wd == 3:
-                plan.append(session_endurance(day, 60, ftp))
-            elif wd == 4:
-                plan.append(session_mobility(day))
-            elif wd == 5:
-                plan.append(
-                    session_indoor_endurance(day, ftp) if indoor else session_long_endurance(day, 3.0, ftp)
-                )
-            else:
-                if fatigue_7d >= 500:
-                    s = session_endurance(day, 90, ftp)
-                    s["title"] = "Endurance Z2 (fatigue gate)"
-                    s["adjusted_for_fatigue"] = True
-                    plan.append(s)
-                else:
-                    plan.append(session_threshold(day, ftp, (3, 10)))
-    return plan
+import sys  # noqa: E402
+from pathlib import Path  # noqa: E402
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.append(str(ROOT))
+from utils.rule_config import load_rules  # noqa: E402
 
 # ---------------- Plan Preview (free-text goal) ----------------
 class PlanRequest(BaseModel):
@@ -381,50 +211,18 @@ def _infer_plan_type(text_in: str) -> str:
     return "cycling_ftp"  # default
 
 def _latest_metrics(db, athlete_id: int) -> Dict:
-    if BodyMetrics is None:
-        a = db.get(Athlete, athlete_id)
-        return {
-            "weight_kg": a.weight_kg if a else None,
-            "bodyfat_pct": None, "vo2max_mlkgmin": None, "resting_hr_bpm": None,
-            "ftp_w": a.ftp_w if a else None, "sex": a.sex if a else "male",
-            "age": a.age if a else 35, "height_cm": a.height_cm if a else 176.0
-        }
-
-    def pick(field):
-        col = getattr(BodyMetrics, field)
-        row = db.execute(
-            select(BodyMetrics.date, col)
-            .where(BodyMetrics.athlete_id == athlete_id, col.is_not(None))
-            .order_by(BodyMetrics.date.desc())
-            .limit(1)
-        ).first()
-        return (row[0], row[1]) if row else (None, None)
-
-    _, weight = pick("weight_kg")
-    _, bodyfat = pick("bodyfat_pct")
-    _, vo2 = pick("vo2max_mlkgmin")
-    _, rhr = pick("resting_hr_bpm")
-    _, ftp = pick("ftp_w")
-
-    prof = db.execute(
-        select(text("sex"), text("age"), text("height_cm"), text("weight_kg"))
-        .select_from(text("athlete"))
-        .where(text("id = :aid")), {"aid": athlete_id}
-    ).first()
-    sex = prof[0] if prof else "male"
-    age = int(prof[1]) if prof and prof[1] is not None else 35
-    height_cm = float(prof[2]) if prof and prof[2] is not None else 176.0
-    fallback_weight = float(prof[3]) if prof and prof[3] is not None else None
-
+    # one query: latest non-null of each field plus the athlete profile
+    r = services.latest_values(db, athlete_id)
+    v = r._mapping if r is not None else {}
     return {
-        "weight_kg": weight or fallback_weight,
-        "bodyfat_pct": bodyfat,
-        "vo2max_mlkgmin": vo2,
-        "resting_hr_bpm": rhr,
-        "ftp_w": ftp,
-        "sex": sex,
-        "age": age,
-        "height_cm": height_cm,
+        "weight_kg": v.get("weight_kg") or v.get("a_weight_kg"),
+        "bodyfat_pct": v.get("bodyfat_pct"),
+        "vo2max_mlkgmin": v.get("vo2max_mlkgmin"),
+        "resting_hr_bpm": v.get("resting_hr_bpm"),
+        "ftp_w": v.get("ftp_w"),
+        "sex": v.get("a_sex") or "male",
+        "age": int(v["a_age"]) if v.get("a_age") is not None else 35,
+        "height_cm": float(v["a_height_cm"]) if v.get("a_height_cm") is not None else 176.0,
     }
 
 def _nutrition_targets(sex:str, age:int, height_cm:float, weight_kg:float,
@@ -464,12 +262,8 @@ def _supplements_for(plan_type:str) -> List[Dict]:
     return common
 
 def _adaptation_rules(plan_type:str) -> List[Dict]:
-    return [
-        {"trigger":"7-day actual TSS > planned TSS by ≥20%","action":"Drop Thu intensity this week; keep Z2 only."},
-        {"trigger":"Resting HR +8 bpm for 3 days OR poor sleep","action":"Replace Tue threshold with 45' Z2; resume next week."},
-        {"trigger":"Weight loss >1%/wk for 2 wks","action":"+200 kcal on rest & training days; hold until <0.7%/wk."},
-        {"trigger":"FTP test shows +3% or more","action":"Raise zone watt targets accordingly from next microcycle."},
-    ]
+    # trigger/action text of the shared rule file, re-read when it changes
+    return load_rules().describe(plan_type)
 
 def _cycling_week_template(week_idx: int, ftp: Optional[float]) -> Dict:
     is_recovery = (week_idx % 4 == 0)
@@ -561,55 +355,28 @@ def get_training_plan(
     indoor: bool = Query(False),
     db: Session = Depends(get_db),
 ) -> Dict[str, Any]:
-    a = db.get(Athlete, athlete_id)
-    if not a:
-        raise HTTPException(status_code=404, detail="athlete_not_found")
-
-    blk = (
-        db.execute(
-            select(TrainingBlock)
-            .where(TrainingBlock.athlete_id == athlete_id)
-            .order_by(TrainingBlock.start_date.desc())
-        ).scalars().first()
-    )
-
-    start = date.today()
-    fatigue7 = recent_7d_tss(db, athlete_id, start)
-    microcycle = generate_week_plan(a, blk, start, fatigue_7d=fatigue7, indoor=indoor)
+    # served from the materialized snapshot, rebuilt only when stale
+    snap = snapshots.get_today(db, athlete_id)
+    return snap["plan_indoor" if indoor else "plan"]
 
-    latest_goal = None
-    if Goal is not None:
-        latest_goal = (
-            db.execute(
-                select(Goal)
-                .where(Goal.athlete_id == athlete_id, Goal.active == True)  # noqa: E712
-                .order_by(Goal.created_at.desc())
-            ).scalars().first()
-        )
+@app.get("/training/plan/cache")
+def get_training_plan_cache() -> Dict[str, Any]:
+    # hit rate of the memoized week-plan generator (per process)
+    return planning.week_plan_cache_stats()
 
+@app.get("/training/load")
+def get_training_load(
+    athlete_id: int,
+    days: int = Query(90, ge=1, le=3650),
+    db: Session = Depends(get_db),
+) -> Dict[str, Any]:
+    # daily TSS/ATL/CTL/TSB from the persisted daily_load rows (app.load)
+    end = date.today()
+    items = load.series(db, athlete_id, end - timedelta(days=days - 1), end)
+    db.commit()  # first read after the migration builds the athlete's rows
     return {
         "athlete_id": athlete_id,
-        "block": {
-            "start_date": (blk.start_date.isoformat() if blk else None),
-            "weeks": (blk.block_length_weeks if blk else 3),
-            "recovery_weeks": (blk.recovery_weeks if blk else 1),
-            "is_recovery_week": is_recovery_week(
-                blk.start_date if blk else None,
-                (blk.block_length_weeks if blk else 3),
-                (blk.recovery_weeks if blk else 1),
-                start,
-            ),
-        },
-        "context": {"fatigue_7d_tss": fatigue7, "indoor": indoor},
-        "goal": None if not latest_goal else {
-            "target_weight_kg": latest_goal.target_weight_kg,
-            "target_bodyfat_pct": latest_goal.target_bodyfat_pct,
-            "target_ftp_w": latest_goal.target_ftp_w,
-            "timeframe_weeks": latest_goal.timeframe_weeks,
-            "goal_prompt": latest_goal.goal_prompt,
-        },
-        "microcycle": microcycle,
-        "generated_at": start.isoformat(),
+        "items": [{**r, "date": r["date"].isoformat()} for r in items],
     }
 
 # ---------------- Activities ----------------
@@ -625,37 +392,36 @@ def add_activity(payload: dict = Body(...), db: Session = Depends(get_db)):
         d = date.fromisoformat(payload["date"])
     except Exception:
         raise HTTPException(status_code=400, detail="invalid_date_format (expected YYYY-MM-DD)")
-    a = Activity(
-        athlete_id=int(payload["athlete_id"]),
-        date=d,
+    start_time = None
+    if payload.get("start_time"):
+        try:
+            start_time = datetime.fromisoformat(payload["start_time"])
+        except (TypeError, ValueError):
+            raise HTTPException(status_code=400, detail="invalid_start_time (expected ISO 8601)")
+        if start_time.tzinfo is not None:
+            start_time = start_time.astimezone(timezone.utc).replace(tzinfo=None)
+    row = activities.activity_row(
+        int(payload["athlete_id"]),
+        day=d,
         sport=payload.get("sport", "bike"),
         duration_min=payload.get("duration_min"),
         tss=payload.get("tss"),
+        source=payload.get("source") or "manual",
+        start_time=start_time,
     )
-    db.add(a)
+    # manual entries are always inserted; an imported duplicate resolves to the row already stored
+    activity_id, inserted = activities.insert_activity(db, row)
+    if inserted:
+        snapshots.mark_stale(db, [row["athlete_id"]])
     db.commit()
-    db.refresh(a)
-    return {"ok": True, "id": a.id}
+    if inserted:
+        snapshots.refresh(db, [row["athlete_id"]])
+    return {"ok": True, "id": activity_id, "duplicate": not inserted}
 
 # ---------------- Nutrition (simple targets) ----------------
 @app.get("/nutrition/today")
 def get_nutrition_today(athlete_id: int, db: Session = Depends(get_db)) -> Dict[str, Any]:
-    a = db.get(Athlete, athlete_id)
-    if not a:
-        raise HTTPException(status_code=404, detail="athlete_not_found")
-    weight = float(a.weight_kg) if a.weight_kg is not None else 75.0
-    kcal_target = round(30 * weight)
-    return {
-        "athlete_id": athlete_id,
-        "date": date.today().isoformat(),
-        "targets": {
-            "kcal": kcal_target,
-            "protein_g": int(round(1.6 * weight)),
-            "carbs_g": max(0, int(round((kcal_target - ((int(round(1.6 * weight)) * 4) + (int(round(0.8 * weight)) * 9))) / 4))),
-            "fat_g": int(round(0.8 * weight)),
-        },
-        "meals": [],
-    }
+    return snapshots.get_today(db, athlete_id)["nutrition"]
 
 # ---------------- Goals (basic) ----------------
 @app.post("/goals", dependencies=[Depends(require_api_key)])
@@ -678,8 +444,10 @@ def upsert_goals(payload: dict = Body(...), db: Session = Depends(get_db)):
         active=True,
     )
     db.add(g)
+    snapshots.mark_stale(db, [athlete_id])
     db.commit()
     db.refresh(g)
+    snapshots.refresh(db, [athlete_id])
     return {"ok": True, "goal_id": g.id}
 
 @app.get("/goals")
@@ -708,142 +476,37 @@ def get_goals(athlete_id: int, db: Session = Depends(get_db)):
         },
     }
 
-# ---------------- Apple Health ZIP import ----------------
+# ---------------- Apple Health ZIP import (background job) ----------------
 @app.post("/apple_health/import", dependencies=[Depends(require_api_key)])
-async def apple_health_import(
+def apple_health_import(
     athlete_id: int = Form(...),
     file: UploadFile = File(...),
     since_days: int = Form(180),
-    db: Session = Depends(get_db),
+    include_media: bool = Form(False),
 ):
     if BodyMetrics is None:
         raise HTTPException(status_code=501, detail="BodyMetrics model not available.")
 
-    # open zip
+    job_id = jobs.create_job(
+        "apple_health_import", athlete_id=athlete_id, since_days=since_days, include_media=include_media,
+    )
+    path = jobs.spool_upload(job_id, file.file)
+
+    # cheap checks (central directory only) so bad uploads still fail fast
     try:
-        file.file.seek(0)
-        zf = zipfile.ZipFile(file.file)
+        with zipfile.ZipFile(path) as zf:
+            has_xml = any(n.endswith("export.xml") for n in zf.namelist())
     except zipfile.BadZipFile:
-        raise HTTPException(status_code=400, detail="invalid_zip")
-
-    cutoff = (date.today() - timedelta(days=since_days))
-
-    # locate export.xml
-    xml_name = next((n for n in zf.namelist() if n.endswith("export.xml")), None)
-    if not xml_name:
-        raise HTTPException(status_code=400, detail="export_xml_not_found")
-
-    def _parse_apple_date_to_day(s: str) -> date:
-        # "2025-10-04 07:15:28 +0100"
-        return date.fromisoformat(s.split(" ")[0])
-
-    day_metrics: Dict[date, Dict[str, float]] = {}
-    workouts: List[Dict] = []
-    rec_count = 0
-    work_count = 0
-
-    # parse with iterparse
-    with zf.open(xml_name, "r") as fh:
-        for event, elem in ET.iterparse(fh):
-            tag = elem.tag.split("}")[-1]
-
-            if tag == "Record":
-                rtype = elem.attrib.get("type")
-                unit = (elem.attrib.get("unit") or "").lower()
-                val = _to_float(elem.attrib.get("value"))
-                end_dt = elem.attrib.get("endDate") or elem.attrib.get("creationDate") or elem.attrib.get("startDate")
-                if val is None or not end_dt:
-                    elem.clear(); continue
-                d = _parse_apple_date_to_day(end_dt)
-                if d < cutoff:
-                    elem.clear(); continue
-
-                bucket = day_metrics.setdefault(d, {})
-                if rtype == "HKQuantityTypeIdentifierBodyMass":
-                    if unit in ("lb", "lbs"):
-                        val = val * 0.45359237
-                    bucket["weight_kg"] = val
-                elif rtype == "HKQuantityTypeIdentifierBodyFatPercentage":
-                    if val <= 1.0:
-                        val = val * 100.0
-                    bucket["bodyfat_pct"] = val
-                elif rtype == "HKQuantityTypeIdentifierVO2Max":
-                    bucket["vo2max_mlkgmin"] = val
-                elif rtype == "HKQuantityTypeIdentifierRestingHeartRate":
-                    bucket["resting_hr_bpm"] = val
-                elif rtype == "HKQuantityTypeIdentifierCyclingFunctionalThresholdPower":
-                    bucket["ftp_w"] = val
-
-                rec_count += 1
-                if rec_count % 100000 == 0:
-                    log.info(f"Apple import: parsed {rec_count} records… unique days={len(day_metrics)}")
-                elem.clear()
-
-            elif tag == "Workout":
-                wtype = (elem.attrib.get("workoutActivityType") or "")
-                end = elem.attrib.get("endDate")
-                dur = _to_float(elem.attrib.get("duration"))
-                dur_unit = (elem.attrib.get("durationUnit") or "").lower()
-                if not end or dur is None:
-                    elem.clear(); continue
-                d = _parse_apple_date_to_day(end)
-                if d < cutoff:
-                    elem.clear(); continue
-
-                if "cycling" in wtype.lower():
-                    duration_min = dur if "min" in dur_unit else dur * 60.0
-                    tss = int(round(duration_min * 0.75))  # rough eTSS
-                    workouts.append({
-                        "date": d, "sport": "bike",
-                        "duration_min": int(round(duration_min)),
-                        "tss": tss
-                    })
-                    work_count += 1
-                    if work_count % 500 == 0:
-                        log.info(f"Apple import: parsed {work_count} workouts…")
-                elem.clear()
-
-    # upsert BodyMetrics per day
-    for d, vals in day_metrics.items():
-        existing = db.execute(
-            select(BodyMetrics).where(BodyMetrics.athlete_id == athlete_id, BodyMetrics.date == d)
-        ).scalars().first()
-        if existing:
-            for k, v in vals.items():
-                setattr(existing, k, v)
-        else:
-            db.add(BodyMetrics(athlete_id=athlete_id, date=d, **vals))
-
-    # add Activities for cycling workouts (if Activity model exists)
-    if Activity is not None:
-        for w in workouts:
-            db.add(Activity(
-                athlete_id=athlete_id,
-                date=w["date"],
-                sport=w["sport"],
-                duration_min=w["duration_min"],
-                tss=w["tss"],
-            ))
+        has_xml = None
+    if not has_xml:
+        os.remove(path)
+        err = "invalid_zip" if has_xml is None else "export_xml_not_found"
+        jobs.update_job(job_id, phase="failed", error=err)
+        raise HTTPException(status_code=400, detail=err)
 
-    db.commit()
+    jobs.submit(jobs.run_apple_health_import, job_id, path, athlete_id, since_days, include_media)
+    return {"ok": True, "job_id": job_id, "status_url": f"/jobs/{job_id}"}
 
-    # refresh Athlete snapshot from latest day
-    a = db.get(Athlete, athlete_id)
-    if a:
-        latest = db.execute(
-            select(BodyMetrics)
-            .where(BodyMetrics.athlete_id == athlete_id)
-            .order_by(BodyMetrics.date.desc())
-        ).scalars().first()
-        if latest:
-            if latest.ftp_w: a.ftp_w = latest.ftp_w
-            if latest.resting_hr_bpm: a.rhr = latest.resting_hr_bpm
-            if latest.vo2max_mlkgmin: a.vo2max = latest.vo2max_mlkgmin
-            if latest.weight_kg: a.weight_kg = latest.weight_kg
-        db.commit()
-
-    log.info(f"Apple import done: days={len(day_metrics)}, workouts={len(workouts)}")
-    return {"ok": True, "metrics_days_imported": len(day_metrics), "workouts_imported": len(workouts)}
 # -------- Strava router (feature flag) --------
 ENABLE_STRAVA = os.getenv("ENABLE_STRAVA", "1") == "1"
 if ENABLE_STRAVA:
@@ -925,21 +588,9 @@ def metrics_log(
         raise HTTPException(status_code=501, detail="BodyMetrics model not available.")
     d = payload.date or date.today()
 
-    # upsert into BodyMetrics
-    row = db.execute(
-        select(BodyMetrics).where(BodyMetrics.athlete_id == athlete_id, BodyMetrics.date == d)
-    ).scalars().first()
-
+    # upsert into BodyMetrics (one statement; unset fields keep their stored values)
     fields = ["weight_kg", "resting_hr_bpm", "vo2max_mlkgmin", "ftp_w"]
-    if row:
-        for f in fields:
-            v = getattr(payload, f)
-            if v is not None:
-                setattr(row, f, v)
-    else:
-        vals = {f: getattr(payload, f) for f in fields if getattr(payload, f) is not None}
-        row = BodyMetrics(athlete_id=athlete_id, date=d, **vals)
-        db.add(row)
+    merged = body_metrics.log_day(db, athlete_id, d, {f: getattr(payload, f) for f in fields}, fields)
 
     # also refresh Athlete snapshot (only write provided fields)
     a = db.get(Athlete, athlete_id)
@@ -949,24 +600,27 @@ def metrics_log(
         if payload.vo2max_mlkgmin is not None: a.vo2max = payload.vo2max_mlkgmin
         if payload.weight_kg is not None: a.weight_kg = payload.weight_kg
 
+    snapshots.mark_stale(db, [athlete_id])
     db.commit()
-    db.refresh(row)
+    snapshots.refresh(db, [athlete_id])
     return {
         "ok": True,
         "athlete_id": athlete_id,
         "date": d.isoformat(),
-        "metrics": {f: getattr(row, f) for f in fields},
+        "metrics": merged,
     }
-import os, requests
 from fastapi import Query
 
 CRON_KEY = os.getenv("CRON_KEY", "")
-API_BASE_SELF = os.getenv("API_BASE_URL", "https://endurance-hub-plus.onrender.com")
 
 @app.get("/cron/strava_daily", include_in_schema=False)
-def cron_strava_daily(key: str = Query(...), days: int = 3):
+def cron_strava_daily(key: str = Query(...), days: int = 3, force: bool = False):
     if not CRON_KEY or key != CRON_KEY:
         raise HTTPException(status_code=401, detail="unauthorized")
+    # with a push subscription new rides arrive via /strava/webhook; polling is only a fallback
+    if os.getenv("STRAVA_WEBHOOK_VERIFY_TOKEN") and not force:
+        return {"ok": True, "ran_for": [], "skipped": "webhook_enabled"}
+
 # collect athlete IDs (fallback to [1] if model/table missing)
     try:
         with SessionLocal() as db:
@@ -974,17 +628,14 @@ def cron_strava_daily(key: str = Query(...), days: int = 3):
     except Exception:
         ids = [1]
 
-    headers = {"x-api-key": os.getenv("API_KEY", "")}
+    # in-process (no HTTP round-trip to ourselves); a throttled run resumes from its checkpoint
+    from app import strava_import
     out = []
     for aid in ids:
         try:
-            r = requests.post(
-                f"{API_BASE_SELF}/strava/import",
-                params={"athlete_id": aid, "after_days": days},
-                headers=headers,
-                timeout=60,
-            )
-            out.append({"athlete_id": aid, "status": r.status_code, "preview": r.text[:200]})
+            with SessionLocal() as db:
+                res = asyncio.run(strava_import.import_activities(db, aid, after_days=days))
+            out.append({"athlete_id": aid, "imported": res["imported"], "complete": res["complete"]})
         except Exception as e:
             out.append({"athlete_id": aid, "error": str(e)})
 
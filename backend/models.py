@@ -1,6 +1,6 @@
 
 
-from sqlalchemy import Column, Integer, String, Float, Date, Boolean, DateTime, ForeignKey, Text, func
+from sqlalchemy import BigInteger, Column, Integer, String, Float, Date, Boolean, DateTime, ForeignKey, Text, Index, LargeBinary, func, text
 from sqlalchemy.orm import relationship
 from db import Base  # IMPORTANT: use the shared Base from db.py
 
@@ -19,6 +19,7 @@ class Athlete(Base):
     rhr = Column(Float)
     vo2max = Column(Float)
     ftp_w = Column(Float)
+    strava_athlete_id = Column(BigInteger, index=True)  # webhook owner_id
 
 class TrainingBlock(Base):
     __tablename__ = "training_block"
@@ -28,6 +29,10 @@ class TrainingBlock(Base):
     block_length_weeks = Column(Integer)
     recovery_weeks = Column(Integer)
 
+    __table_args__ = (
+        Index("ix_training_block_athlete_start", "athlete_id", "start_date"),
+    )
+
 class BodyMetrics(Base):
     __tablename__ = "body_metrics"
     id = Column(Integer, primary_key=True)
@@ -41,6 +46,11 @@ class BodyMetrics(Base):
     ftp_source = Column(String)
     created_at = Column(DateTime, server_default=func.now())
 
+    # one row per athlete/day; lets writers use INSERT … ON CONFLICT
+    __table_args__ = (
+        Index("ux_body_metrics_athlete_date", "athlete_id", "date", unique=True),
+    )
+
 class Activity(Base):
     __tablename__ = "activity"
     id = Column(Integer, primary_key=True)
@@ -49,6 +59,18 @@ class Activity(Base):
     sport = Column(String)
     duration_min = Column(Integer)
     tss = Column(Integer)
+    source = Column(String, nullable=False, default="manual", server_default="manual")
+    start_time = Column(DateTime)  # UTC, when the source provides one
+    external_id = Column(String)   # id at the source (Strava activity id)
+    # natural key, see app.activities.activity_fingerprint
+    fingerprint = Column(String)
+
+    __table_args__ = (
+        Index("ux_activity_athlete_fingerprint", "athlete_id", "fingerprint", unique=True),
+        Index("ix_activity_source_external_id", "source", "external_id"),
+        # recent_7d_tss / activity lists; tss rides along so the sum never touches the heap (Postgres)
+        Index("ix_activity_athlete_date", "athlete_id", "date", postgresql_include=["tss"]),
+    )
 
 class Goal(Base):
     __tablename__ = "goals"
@@ -62,3 +84,108 @@ class Goal(Base):
     timeframe_weeks = Column(Integer)
     active = Column(Boolean, default=True)
     created_at = Column(DateTime, server_default=func.now())
+
+    __table_args__ = (
+        # "current goal" lookups only ever read active rows
+        Index(
+            "ix_goals_athlete_active_created", "athlete_id", "created_at",
+            postgresql_where=text("active"), sqlite_where=text("active = 1"),
+        ),
+    )
+
+class ImportWatermark(Base):
+    """Per-athlete high-water mark of ingested data, per source and record type."""
+    __tablename__ = "import_watermark"
+    id = Column(Integer, primary_key=True)
+    athlete_id = Column(Integer, ForeignKey("athlete.id"), nullable=False)
+    source = Column(String, nullable=False)
+    record_type = Column(String, nullable=False)
+    last_end = Column(DateTime)       # latest endDate ingested (UTC)
+    last_day = Column(Date)           # local calendar day of last_end
+    covered_from = Column(Date)       # earliest day any import has walked
+    updated_at = Column(DateTime, server_default=func.now())
+
+    __table_args__ = (
+        Index("ux_import_watermark_key", "athlete_id", "source", "record_type", unique=True),
+    )
+
+class WorkoutRoute(Base):
+    """One row per Apple Health workout-routes/*.gpx file: route summary only, no points."""
+    __tablename__ = "workout_route"
+    id = Column(Integer, primary_key=True)
+    athlete_id = Column(Integer, ForeignKey("athlete.id"), nullable=False)
+    source_file = Column(String, nullable=False)
+    date = Column(Date, index=True)
+    start_time = Column(DateTime)     # UTC
+    end_time = Column(DateTime)       # UTC
+    points = Column(Integer)
+    distance_m = Column(Float)
+    elevation_gain_m = Column(Float)
+    avg_speed_mps = Column(Float)
+    max_speed_mps = Column(Float)
+    avg_hr_bpm = Column(Float)
+    max_hr_bpm = Column(Float)
+
+    __table_args__ = (
+        Index("ux_workout_route_file", "athlete_id", "source_file", unique=True),
+    )
+
+class EcgRecording(Base):
+    """One row per Apple Health electrocardiograms/*.csv file."""
+    __tablename__ = "ecg_recording"
+    id = Column(Integer, primary_key=True)
+    athlete_id = Column(Integer, ForeignKey("athlete.id"), nullable=False)
+    source_file = Column(String, nullable=False)
+    date = Column(Date, index=True)
+    recorded_at = Column(DateTime)    # UTC
+    classification = Column(String)
+    sample_rate_hz = Column(Float)
+    samples = Column(Integer)
+    duration_s = Column(Float)
+    avg_hr_bpm = Column(Float)        # estimated from R peaks
+    min_uv = Column(Float)
+    max_uv = Column(Float)
+
+    __table_args__ = (
+        Index("ux_ecg_recording_file", "athlete_id", "source_file", unique=True),
+    )
+
+class ActivityStream(Base):
+    """Per-second streams of one activity as a single compressed blob (see app.streams)."""
+    __tablename__ = "activity_stream"
+    id = Column(Integer, primary_key=True)
+    activity_id = Column(Integer, ForeignKey("activity.id", ondelete="CASCADE"), nullable=False, unique=True)
+    athlete_id = Column(Integer, ForeignKey("athlete.id"), nullable=False, index=True)
+    encoding = Column(String, nullable=False)
+    channels = Column(String)         # e.g. "time,watts,heartrate,cadence"
+    samples = Column(Integer)
+    data = Column(LargeBinary, nullable=False)
+    duration_s = Column(Float)
+    avg_power_w = Column(Float)
+    np_w = Column(Float)
+    intensity_factor = Column(Float)
+    tss = Column(Float)
+    avg_hr_bpm = Column(Float)
+    created_at = Column(DateTime, server_default=func.now())
+
+class AthleteSnapshot(Base):
+    """Materialized "today" view per athlete: metrics, plan and nutrition targets (see app.snapshots)."""
+    __tablename__ = "athlete_snapshot"
+    athlete_id = Column(Integer, ForeignKey("athlete.id", ondelete="CASCADE"), primary_key=True)
+    data_version = Column(Integer, nullable=False, default=0, server_default="0")  # bumped by every write
+    built_version = Column(Integer)   # data_version the payload was built from
+    format = Column(Integer)          # app.snapshots.SNAPSHOT_FORMAT of the payload
+    day = Column(Date)                # the payload is about this day
+    payload = Column(Text)            # JSON
+    built_at = Column(DateTime)
+
+class DailyLoad(Base):
+    """Per-athlete daily TSS and fitness/fatigue state, maintained incrementally (see app.load)."""
+    __tablename__ = "daily_load"
+    athlete_id = Column(Integer, ForeignKey("athlete.id", ondelete="CASCADE"), primary_key=True)
+    date = Column(Date, primary_key=True)
+    tss = Column(Float, nullable=False)     # sum of the day's activities
+    tss_7d = Column(Float, nullable=False)  # this day and the six before it
+    atl = Column(Float, nullable=False)
+    ctl = Column(Float, nullable=False)
+    tsb = Column(Float, nullable=False)     # form going into the day
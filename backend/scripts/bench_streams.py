@@ -0,0 +1,55 @@
+"""
+Storage size and NP/IF/TSS timing for app.streams on a synthetic ride.
+
+    cd backend && python scripts/bench_streams.py [hours]
+"""
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from app import streams  # noqa: E402
+
+
+def synthetic_ride(hours: float, seed: int = 7):
+    rng = np.random.default_rng(seed)
+    n = int(hours * 3600)
+    t = np.arange(n)
+    t[n // 2:] += 120  # a café stop
+    base = 210 + 40 * np.sin(t / 600.0)
+    watts = np.clip(base + rng.normal(0, 35, n), 0, None)
+    watts[rng.random(n) < 0.08] = 0  # coasting
+    hr = np.clip(135 + 0.12 * (base - 210) + rng.normal(0, 3, n), 60, 200)
+    cad = np.where(watts > 0, 88 + rng.normal(0, 4, n), 0)
+    return {"time": t.tolist(), "watts": watts.tolist(), "heartrate": hr.tolist(), "cadence": cad.tolist()}
+
+
+def main() -> None:
+    hours = float(sys.argv[1]) if len(sys.argv) > 1 else 5.0
+    ride = synthetic_ride(hours)
+
+    t0 = time.perf_counter()
+    blob = streams.encode_streams(ride)
+    enc_ms = (time.perf_counter() - t0) * 1000
+
+    t0 = time.perf_counter()
+    decoded = streams.decode_streams(blob)
+    dec_ms = (time.perf_counter() - t0) * 1000
+
+    runs = 20
+    t0 = time.perf_counter()
+    for _ in range(runs):
+        m = streams.power_metrics(decoded["time"], decoded["watts"].astype(np.float64), 280.0)
+    np_ms = (time.perf_counter() - t0) * 1000 / runs
+
+    assert np.array_equal(decoded["time"], np.asarray(ride["time"]))
+    print(f"{hours:g} h, {len(ride['time'])} samples x {len(decoded)} channels")
+    print(f"blob: {len(blob) / 1024:.1f} KB (encode {enc_ms:.1f} ms, decode {dec_ms:.1f} ms)")
+    print(f"NP/IF/TSS: {np_ms:.2f} ms -> {m}")
+
+
+if __name__ == "__main__":
+    main()
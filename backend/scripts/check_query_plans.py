@@ -0,0 +1,98 @@
+"""
+Query-plan check for the hot per-athlete reads against a real database.
+
+Calls the hot routes in-process, captures the SELECTs they send, and
+EXPLAINs each one. Exits 1 when a hot table is read with a sequential scan
+instead of one of its (athlete_id, ...) indexes.
+
+    cd backend && DATABASE_URL=... python scripts/check_query_plans.py [athlete_id]
+
+On Postgres seq scans are disabled for the EXPLAIN so a small dev database
+still shows whether a usable index exists; on SQLite EXPLAIN QUERY PLAN is
+read as is. tests/test_query_plans.py runs the same routes on SQLite in CI.
+"""
+import json
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from fastapi.testclient import TestClient  # noqa: E402
+from sqlalchemy import event  # noqa: E402
+
+from db import engine  # noqa: E402
+from main import app  # noqa: E402
+
+HOT_TABLES = {"body_metrics", "activity", "goals", "training_block", "daily_load"}
+HOT_ROUTES = [
+    ("/metrics/latest", {}),
+    ("/metrics/history", {"days": 30}),
+    ("/training/load", {"days": 30}),
+    ("/activities/list", {}),
+    ("/goals", {}),
+    ("/training/plan", {}),  # served from the snapshot; only a stale one runs the plan queries
+]
+
+
+def capture(call):
+    """Run call() and return the SELECT (statement, parameters) pairs it sent."""
+    sent = []
+
+    def on_execute(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().lower().startswith("select"):
+            sent.append((statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", on_execute)
+    try:
+        call()
+    finally:
+        event.remove(engine, "before_cursor_execute", on_execute)
+    return sent
+
+
+def _pg_seq_scans(node, out):
+    if node.get("Node Type") == "Seq Scan" and node.get("Relation Name") in HOT_TABLES:
+        out.append(f"Seq Scan on {node['Relation Name']}")
+    for child in node.get("Plans", []):
+        _pg_seq_scans(child, out)
+    return out
+
+
+def seq_scans(conn, statement, parameters):
+    if conn.dialect.name == "postgresql":
+        plan = conn.exec_driver_sql("EXPLAIN (FORMAT JSON) " + statement, parameters).scalar()
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return _pg_seq_scans(plan[0]["Plan"], [])
+    rows = conn.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters).all()
+    bad = []
+    for r in rows:
+        detail = r[-1]
+        parts = detail.split()
+        if parts[:1] == ["SCAN"] and len(parts) > 1 and parts[1] in HOT_TABLES and "INDEX" not in detail:
+            bad.append(detail)
+    return bad
+
+
+def main() -> None:
+    athlete_id = int(sys.argv[1]) if len(sys.argv) > 1 else 1
+    client = TestClient(app)
+    failures = 0
+    for path, params in HOT_ROUTES:
+        sent = capture(lambda: client.get(path, params={"athlete_id": athlete_id, **params}))
+        with engine.connect() as conn:
+            if conn.dialect.name == "postgresql":
+                conn.exec_driver_sql("SET enable_seqscan = off")
+            for statement, parameters in sent:
+                bad = seq_scans(conn, statement, parameters)
+                print(f"{'FAIL' if bad else 'ok':4} {path:18} {'; '.join(bad)}".rstrip())
+                failures += bool(bad)
+            conn.rollback()
+    if failures:
+        print(f"{failures} statement(s) fall back to a sequential scan")
+        sys.exit(1)
+    print("all hot queries use an index")
+
+
+if __name__ == "__main__":
+    main()
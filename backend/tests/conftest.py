@@ -0,0 +1,45 @@
+"""
+Shared fixtures: the FastAPI app on a throwaway SQLite database.
+
+DATABASE_URL is pointed at a temp file before anything imports db.py, so the
+suite never touches a configured database.
+"""
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+BACKEND = Path(__file__).resolve().parents[1]
+ROOT = BACKEND.parent
+_DB_DIR = tempfile.mkdtemp(prefix="backend-tests-")
+os.environ["DATABASE_URL"] = f"sqlite+pysqlite:///{_DB_DIR}/test.db"
+os.environ.setdefault("API_KEY", "test-key")
+
+# backend first: the repo root has an app.py that would shadow the app package
+sys.path.insert(0, str(BACKEND))
+sys.path.append(str(ROOT))
+
+
+@pytest.fixture(scope="session")
+def engine():
+    from db import Base, engine
+    import models  # noqa: F401  (registers the tables)
+
+    Base.metadata.create_all(engine)
+    return engine
+
+
+@pytest.fixture(scope="session")
+def client(engine):
+    from fastapi.testclient import TestClient
+    import main
+
+    with TestClient(main.app) as c:
+        yield c
+
+
+@pytest.fixture(scope="session")
+def api_headers():
+    return {"x-api-key": os.environ["API_KEY"]}
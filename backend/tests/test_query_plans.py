@@ -0,0 +1,101 @@
+"""
+Query-plan regression tests for the hot per-athlete reads.
+
+Each test calls a real route, captures the SELECTs it sends and runs them
+through SQLite's EXPLAIN QUERY PLAN: a hot table read by a full SCAN instead
+of one of its (athlete_id, ...) indexes fails the test. For Postgres plans
+see scripts/check_query_plans.py.
+"""
+from datetime import date, timedelta
+
+import pytest
+from sqlalchemy import event
+
+HOT_TABLES = {"body_metrics", "activity", "goals", "training_block", "daily_load"}
+ATHLETE_ID = 1
+
+
+@pytest.fixture(scope="module", autouse=True)
+def seeded(engine, client, api_headers):
+    from db import SessionLocal
+    from models import Athlete, TrainingBlock
+
+    today = date.today()
+    with SessionLocal() as db:
+        if db.get(Athlete, ATHLETE_ID) is None:
+            db.add(Athlete(id=ATHLETE_ID, name="plans", ftp_w=250))
+        db.add(TrainingBlock(athlete_id=ATHLETE_ID, start_date=today - timedelta(days=14),
+                             block_length_weeks=3, recovery_weeks=1))
+        db.commit()
+    for i in range(20):
+        d = (today - timedelta(days=i)).isoformat()
+        client.post(
+            "/activities", json={"athlete_id": ATHLETE_ID, "date": d, "duration_min": 60, "tss": 50},
+        ).raise_for_status()
+        client.post(
+            "/metrics/log", params={"athlete_id": ATHLETE_ID},
+            json={"date": d, "weight_kg": 75 - i * 0.05, "resting_hr_bpm": 50}, headers=api_headers,
+        ).raise_for_status()
+    client.post(
+        "/goals", json={"athlete_id": ATHLETE_ID, "goal_prompt": "FTP 270", "target_ftp_w": 270},
+        headers=api_headers,
+    ).raise_for_status()
+
+
+def captured_selects(engine, call):
+    sent = []
+
+    def on_execute(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().lower().startswith("select"):
+            sent.append((statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", on_execute)
+    try:
+        call()
+    finally:
+        event.remove(engine, "before_cursor_execute", on_execute)
+    return sent
+
+
+def full_scans(engine, statement, parameters):
+    with engine.connect() as conn:
+        rows = conn.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters).all()
+    bad = []
+    for r in rows:
+        detail = r[-1]
+        parts = detail.split()
+        if parts[:1] == ["SCAN"] and len(parts) > 1 and parts[1] in HOT_TABLES and "INDEX" not in detail:
+            bad.append(detail)
+    return bad
+
+
+def stale_snapshot():
+    from db import SessionLocal
+    from app import snapshots
+
+    with SessionLocal() as db:
+        snapshots.mark_stale(db, [ATHLETE_ID])
+        db.commit()
+
+
+HOT_ROUTES = [
+    ("/metrics/latest", {}),
+    ("/metrics/history", {"days": 30}),
+    ("/training/load", {"days": 30}),
+    ("/activities/list", {}),
+    ("/goals", {}),
+    ("/training/plan", {}),  # snapshot rebuild: plan, fatigue gate, goal, block, nutrition
+]
+
+
+@pytest.mark.parametrize("path,params", HOT_ROUTES, ids=[p for p, _ in HOT_ROUTES])
+def test_hot_route_uses_indexes(engine, client, path, params):
+    stale_snapshot()
+    statements = captured_selects(
+        engine, lambda: client.get(path, params={"athlete_id": ATHLETE_ID, **params}).raise_for_status(),
+    )
+    assert statements, f"{path} sent no SELECT"
+    hot = [s for s in statements if any(t in s[0] for t in HOT_TABLES)]
+    assert hot, f"{path} read none of {sorted(HOT_TABLES)}"
+    for statement, parameters in hot:
+        assert not full_scans(engine, statement, parameters), f"{path}: full scan in\n{statement}"
@@ -0,0 +1,75 @@
+"""
+utils.rules.adapt_batch, driven by the shipped adaptation_rules.json, must
+give the same rule/decision/reason as adapt() called once per plan row.
+"""
+from pathlib import Path
+
+import pytest
+
+np = pytest.importorskip("numpy")
+pd = pytest.importorskip("pandas")
+
+from utils.rule_config import load_rules  # noqa: E402
+from utils.rules import DECISION_COLUMNS, adapt, adapt_batch  # noqa: E402
+
+# the shipped file, not ADAPTATION_RULES_PATH: adapt() mirrors it
+SHIPPED_RULES = Path(__file__).resolve().parents[2] / "adaptation_rules.json"
+
+
+def synthetic(athletes=4, days=90, seed=5):
+    """Daily metrics with gaps and NaNs, TSB, weather and plan rows, so every rule fires somewhere."""
+    rng = np.random.default_rng(seed)
+    start = pd.Timestamp("2026-01-01")
+    all_days = start + pd.to_timedelta(np.arange(days), unit="D")
+    daily, load, plan = [], [], []
+    for a in range(athletes):
+        aid = f"a{a}"
+        dates = start + pd.to_timedelta(np.sort(rng.choice(days, int(days * 0.85), replace=False)), unit="D")
+        n = len(dates)
+        daily.append(pd.DataFrame({
+            "athlete_id": aid, "date": dates,
+            "hrv_ms": np.where(rng.random(n) < 0.05, np.nan, rng.normal(60, 12, n)),
+            "rhr": np.where(rng.random(n) < 0.05, np.nan, rng.normal(50, 4, n)),
+            "sleep_duration_min": np.where(rng.random(n) < 0.05, np.nan, rng.normal(460, 45, n)),
+            "weight_kg": 75 + np.cumsum(rng.normal(-0.05, 0.25, n)),
+        }))
+        load.append(pd.DataFrame({
+            "athlete_id": aid, "date": all_days,
+            "TSB": np.where(rng.random(days) < 0.1, np.nan, rng.normal(-2, 10, days)),
+        }).sample(frac=0.9, random_state=a))
+        plan.append(pd.DataFrame({
+            "athlete_id": aid, "date": all_days,
+            "nutrition_day": rng.choice(["maintenance", "deficit", "fuel", None], days),
+        }))
+    weather = pd.DataFrame({
+        "date": all_days,
+        "precip_prob": rng.uniform(0, 1, days),
+        "wind_kph": rng.uniform(0, 45, days),
+    }).sample(frac=0.8, random_state=1)
+    return (pd.concat(plan, ignore_index=True), pd.concat(daily, ignore_index=True),
+            pd.concat(load, ignore_index=True), weather)
+
+
+def test_adapt_batch_matches_adapt():
+    plan, daily, load, weather = synthetic()
+    batch = adapt_batch(plan, daily, load, weather, rules=load_rules(SHIPPED_RULES))
+
+    daily = daily.sort_values(["athlete_id", "date"], kind="stable")
+    mismatches = []
+    for i, p in plan.iterrows():
+        hist = daily[(daily["athlete_id"] == p["athlete_id"]) & (daily["date"] <= p["date"])].reset_index(drop=True)
+        lrow = load[(load["athlete_id"] == p["athlete_id"]) & (load["date"] == p["date"])].to_dict("records")
+        wrow = weather[weather["date"] == p["date"]].to_dict("records")
+        want = adapt(p.to_dict(), hist, lrow[0] if lrow else {}, wrow[0] if wrow else {})
+        got = batch.loc[i, DECISION_COLUMNS].to_dict()
+        if got != want:
+            mismatches.append((p["athlete_id"], p["date"].date(), got, want))
+    assert not mismatches, mismatches[:5]
+    # the synthetic data exercises every rule
+    assert set(batch["rule"]) == {"None", "Readiness", "Load", "Weather", "Nutrition"}
+
+
+def test_adapt_batch_without_history():
+    plan = pd.DataFrame({"athlete_id": ["x"], "date": [pd.Timestamp("2026-03-01")], "nutrition_day": ["fuel"]})
+    out = adapt_batch(plan, pd.DataFrame(columns=["athlete_id", "date"]), rules=load_rules(SHIPPED_RULES))
+    assert out.loc[0, DECISION_COLUMNS].to_dict() == adapt(plan.iloc[0].to_dict(), None, {}, {})
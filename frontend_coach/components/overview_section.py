@@ -30,8 +30,8 @@ def render_overview_section(athlete_id: int):
         st.markdown("**Physiology — last 90 days**")
         try:
             fields = "weight_kg,vo2max_mlkgmin,resting_hr_bpm,ftp_w"
-            h = _get_json(api, "/metrics/history", athlete_id=athlete_id, days=90, fields=fields).get("items", [])
-            if h:
+            h = _get_json(api, "/metrics/history", athlete_id=athlete_id, days=90, fields=fields, layout="columns").get("columns", {})
+            if h.get("date"):
                 hd = pd.DataFrame(h)
                 if "date" in hd: hd = hd.set_index("date")
                 for col in ["weight_kg","vo2max_mlkgmin","resting_hr_bpm","ftp_w"]:
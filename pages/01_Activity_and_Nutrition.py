@@ -25,9 +25,9 @@ else:
 # Physiology charts (90d)
 st.subheader("Physiology — last 90 days")
 fields = "weight_kg,vo2max_mlkgmin,resting_hr_bpm,ftp_w"
-r = requests.get(f"{API}/metrics/history", params={"athlete_id": ATHLETE_ID, "days": 90, "fields": fields})
-h = r.json().get("items", [])
-if h:
+r = requests.get(f"{API}/metrics/history", params={"athlete_id": ATHLETE_ID, "days": 90, "fields": fields, "layout": "columns"})
+h = r.json().get("columns", {})
+if h.get("date"):
     hd = pd.DataFrame(h)
     if "date" in hd: hd = hd.set_index("date")
     for col in ["weight_kg","vo2max_mlkgmin","resting_hr_bpm","ftp_w"]:
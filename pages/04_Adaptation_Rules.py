@@ -1,9 +1,15 @@
 import streamlit as st, pandas as pd
 from utils.db import read_sql
-from utils.rules import adapt
+from utils.metrics import training_load
+from utils.rule_config import load_rules
+from utils.rules import adapt_batch
 
 st.title("🧠 Adaptation Rules")
 
+rules = load_rules()  # recompiled when the rule file changes
+with st.expander(f"Active rules ({rules.source})"):
+    st.dataframe(pd.DataFrame(rules.rules)[["name", "decision", "trigger", "action"]], use_container_width=True)
+
 df_plan = read_sql("select * from plan order by date asc")
 df_daily = read_sql("select * from daily_metrics order by date asc")
 df_weather = read_sql("select * from weather order by date asc")
@@ -12,13 +18,28 @@ df_act = read_sql("select * from activities order by ts asc")
 if df_plan.empty:
     st.info("Upload plan first in Admin.")
 else:
-    today = pd.Timestamp.now().normalize().date()
-    plan_today = df_plan[df_plan["date"]==pd.Timestamp(today)]
-    if plan_today.empty:
+    today = pd.Timestamp.now().normalize()
+    weeks = st.slider("Back-test window (weeks)", 1, 52, 12)
+    plan_dates = pd.to_datetime(df_plan["date"])
+    window = df_plan[(plan_dates > today - pd.Timedelta(weeks=weeks)) & (plan_dates <= today)]
+
+    # every rule for every (athlete, date) in the window in one pass; load comes from this
+    # app's activities table like the dashboard's (the backend's daily_load never sees it)
+    df_load = training_load(df_act, end=today) if not df_act.empty else None
+    decisions = adapt_batch(window, df_daily, df_load, df_weather, rules=rules)
+    is_today = pd.to_datetime(decisions["date"]) == today
+
+    st.subheader("Today")
+    if not is_today.any():
         st.info("No planned session for today.")
+    elif is_today.sum() == 1:
+        st.json(decisions[is_today].iloc[0][["rule", "decision", "reason"]].to_dict())
+    else:
+        st.dataframe(decisions[is_today], use_container_width=True)  # roster view
+
+    st.subheader(f"Back-test — last {weeks} weeks")
+    if decisions.empty:
+        st.info("No planned sessions in this window.")
     else:
-        load_row = df_act.tail(1).to_dict("records")[0] if not df_act.empty else {}
-        weather_row = df_weather[df_weather["date"]==pd.Timestamp(today)].to_dict("records")
-        weather_row = weather_row[0] if weather_row else {}
-        decision = adapt(plan_today.iloc[0].to_dict(), df_daily, load_row, weather_row)
-        st.json(decision)
+        st.bar_chart(decisions.groupby(["decision"]).size())
+        st.dataframe(decisions.sort_values("date", ascending=False), use_container_width=True)
@@ -14,10 +14,9 @@ if file1 is not None:
 st.header("Upload Apple Health Export (.zip)")
 file2 = st.file_uploader("Apple Health zip", type=["zip"], key="hk")
 if file2 is not None:
-    bytes_data = file2.read()
-    df_daily = parse_health_export(bytes_data)
+    df_daily = parse_health_export(file2)
     if not df_daily.empty:
-        keep_cols = [c for c in ["date","rhr","hrv_ms","weight_kg","body_fat_pct"] if c in df_daily.columns]
+        keep_cols = [c for c in ["date","rhr","hrv_ms","weight_kg","body_fat_pct","vo2max"] if c in df_daily.columns]
         df_daily = df_daily[keep_cols]
         df_to_sql(df_daily, "daily_metrics")
         st.success(f"Ingested {len(df_daily)} daily metric rows from Apple Health.")
@@ -35,6 +35,12 @@ create table if not exists daily_metrics (
   pulse_wave_velocity_ms numeric
 );
 
+-- conflict target for the ingest upserts (utils/bulk.py); drop older
+-- duplicates first (newest row wins) so the index can be built on old data
+delete from daily_metrics d using daily_metrics newer
+where newer.athlete_id = d.athlete_id and newer.date = d.date and newer.id > d.id;
+create unique index if not exists ux_daily_metrics_athlete_date on daily_metrics (athlete_id, date);
+
 create table if not exists plan (
   id bigserial primary key,
   athlete_id uuid,
@@ -61,3 +67,7 @@ create table if not exists weather (
   wind_kph numeric,
   precip_prob numeric
 );
+
+delete from weather w using weather newer
+where newer.date = w.date and newer.lat = w.lat and newer.lon = w.lon and newer.id > w.id;
+create unique index if not exists ux_weather_date_place on weather (date, lat, lon);
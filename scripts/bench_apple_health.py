@@ -0,0 +1,94 @@
+# scripts/bench_apple_health.py
+"""
+Throughput benchmark for utils/apple_health_parser on a synthetic export.
+
+    python scripts/bench_apple_health.py            # 1M records
+    python scripts/bench_apple_health.py 250000     # custom size
+
+The record mix mimics a real export: mostly heart-rate/step samples the
+importer ignores, a tracked minority (weight, RHR, HRV, VO2max, body fat)
+and a cycling workout every few hundred records. A plain iterparse walk of
+the same file is timed as the baseline.
+"""
+import os, sys, tempfile, time, zipfile
+import xml.etree.ElementTree as ET
+from datetime import date, timedelta
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.append(str(ROOT))
+
+from utils.apple_health_parser import ExportParser, open_export_xml
+
+MIX = [
+    ("HKQuantityTypeIdentifierHeartRate", "count/min", 70),
+    ("HKQuantityTypeIdentifierStepCount", "count", 15),
+    ("HKQuantityTypeIdentifierHeartRateVariabilitySDNN", "ms", 6),
+    ("HKQuantityTypeIdentifierRestingHeartRate", "count/min", 3),
+    ("HKQuantityTypeIdentifierBodyMass", "kg", 3),
+    ("HKQuantityTypeIdentifierBodyFatPercentage", "%", 2),
+    ("HKQuantityTypeIdentifierVO2Max", "mL/min·kg", 1),
+]
+
+
+def write_export(path: str, n: int) -> None:
+    kinds = [(t, u) for t, u, w in MIX for _ in range(w)]
+    start = date.today() - timedelta(days=5 * 365)
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as z, z.open("apple_health_export/export.xml", "w") as f:
+        f.write(b'<?xml version="1.0" encoding="UTF-8"?>\n<HealthData locale="en_US">\n')
+        for i in range(n):
+            rtype, unit = kinds[i % len(kinds)]
+            d = start + timedelta(days=i * 5 * 365 // n)
+            ts = f"{d} {i % 24:02d}:{i % 60:02d}:00 +0100"
+            f.write((
+                f' <Record type="{rtype}" sourceName="Apple Watch" unit="{unit}" creationDate="{ts}" '
+                f'startDate="{ts}" endDate="{ts}" value="{50 + i % 30}">\n'
+                f'  <MetadataEntry key="HKMetadataKeyHeartRateMotionContext" value="0"/>\n'
+                f' </Record>\n'
+            ).encode())
+            if i % 400 == 0:
+                f.write((
+                    f' <Workout workoutActivityType="HKWorkoutActivityTypeCycling" duration="75" durationUnit="min" '
+                    f'startDate="{ts}" endDate="{ts}">\n'
+                    f'  <WorkoutStatistics type="HKQuantityTypeIdentifierHeartRate" average="140"/>\n'
+                    f' </Workout>\n'
+                ).encode())
+        f.write(b"</HealthData>\n")
+
+
+def bench_iterparse(path: str) -> float:
+    t0 = time.perf_counter()
+    with zipfile.ZipFile(path) as z, open_export_xml(z) as fh:
+        for _, elem in ET.iterparse(fh):
+            elem.clear()
+    return time.perf_counter() - t0
+
+
+def bench_parser(path: str):
+    t0 = time.perf_counter()
+    with zipfile.ZipFile(path) as z, open_export_xml(z) as fh:
+        parser = ExportParser(on_workouts=lambda batch: None).parse(fh)
+        daily = parser.daily()
+    return time.perf_counter() - t0, parser, daily
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "export.zip")
+        print(f"writing synthetic export with {n:,} records…")
+        write_export(path, n)
+        print(f"  zip size: {os.path.getsize(path) / 1e6:.1f} MB")
+
+        t_base = bench_iterparse(path)
+        print(f"iterparse walk (baseline): {t_base:6.2f}s  {n / t_base:>10,.0f} rec/s")
+
+        t, parser, daily = bench_parser(path)
+        print(f"ExportParser + daily agg : {t:6.2f}s  {n / t:>10,.0f} rec/s  ({t_base / t:.1f}x)")
+        print(f"  parsed={parser.records_parsed:,} workouts={parser.workouts_parsed:,} "
+              f"days={len(daily['date']):,} skipped={parser.skipped}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+# scripts/bench_training_load.py
+"""
+Benchmark for utils/metrics.training_load on a synthetic roster.
+
+    python scripts/bench_training_load.py              # 1000 athletes x 10 years
+    python scripts/bench_training_load.py 200 5        # athletes, years
+
+Each athlete trains on ~70% of days (a few double days); about a third of
+the activities carry no TSS and fall back to the moving-time estimate.
+A handful of athletes are checked against pandas' own
+`ewm(alpha=1/N, adjust=False)` on a resampled daily series.
+"""
+import sys, time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.append(str(ROOT))
+
+from utils.metrics import ATL_DAYS, CTL_DAYS, estimate_tss, training_load
+
+TARGET_S = 1.0
+
+
+def synthetic_activities(athletes: int, years: int, seed: int = 11) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    days = 365 * years
+    n = int(athletes * days * 0.8)
+    start = np.datetime64("2015-01-01T06:00", "s").astype(np.int64)
+    ts = start + rng.integers(0, days, n) * 86400 + rng.integers(0, 14 * 3600, n)
+    moving = rng.integers(20 * 60, 4 * 3600, n)
+    tss = np.round(moving / 3600 * rng.uniform(40, 90, n))
+    tss[rng.random(n) < 0.33] = np.nan
+    return pd.DataFrame({
+        "athlete_id": np.char.add("athlete-", rng.integers(0, athletes, n).astype(str)),
+        "ts": pd.to_datetime(ts, unit="s", utc=True),
+        "moving_time_sec": moving,
+        "tss": tss,
+    })
+
+
+def reference(df: pd.DataFrame, athlete: str, end) -> pd.DataFrame:
+    a = df[df["athlete_id"] == athlete]
+    s = estimate_tss(a).groupby(a["ts"].dt.tz_localize(None).dt.normalize()).sum()
+    s = s.reindex(pd.date_range(s.index.min(), pd.Timestamp(end), freq="D"), fill_value=0.0)
+    atl = s.ewm(alpha=1 / ATL_DAYS, adjust=False).mean()
+    ctl = s.ewm(alpha=1 / CTL_DAYS, adjust=False).mean()
+    # pandas seeds the average with the first value; the model starts from zero fitness
+    atl = atl - (s.iloc[0] * (1 - 1 / ATL_DAYS) ** np.arange(1, len(s) + 1))
+    ctl = ctl - (s.iloc[0] * (1 - 1 / CTL_DAYS) ** np.arange(1, len(s) + 1))
+    return pd.DataFrame({"ATL": atl.to_numpy(), "CTL": ctl.to_numpy()})
+
+
+def main() -> None:
+    athletes = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    years = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+
+    df = synthetic_activities(athletes, years)
+    end = df["ts"].max().tz_localize(None).normalize()
+    print(f"{len(df):,} activities, {df['athlete_id'].nunique()} athletes, {years} years")
+
+    t0 = time.perf_counter()
+    load = training_load(df, end=end)
+    elapsed = time.perf_counter() - t0
+    print(f"training_load: {elapsed:.3f} s -> {len(load):,} athlete-days")
+
+    worst = 0.0
+    for athlete in sorted(df["athlete_id"].unique())[:5]:
+        got = load[load["athlete_id"] == athlete][["ATL", "CTL"]].reset_index(drop=True)
+        want = reference(df, athlete, end)
+        worst = max(worst, float(np.abs(got.to_numpy() - want.to_numpy()).max()))
+    print(f"max |diff| vs pandas ewm on 5 athletes: {worst:.2e}")
+
+    ok = elapsed < TARGET_S and worst < 1e-6
+    print("PASS" if ok else f"FAIL (target < {TARGET_S:.1f} s, diff < 1e-6)")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+# scripts/check_rules_parity.py
+"""
+Parity check: utils.rules.adapt_batch, driven by the shipped rule file
+(adaptation_rules.json), against adapt() called row by row.
+
+    python scripts/check_rules_parity.py            # 6 athletes x 120 days
+    python scripts/check_rules_parity.py 20 365     # athletes, days
+
+Synthetic daily metrics (with gaps and NaNs), TSB, weather and plan rows
+are generated so every rule fires somewhere. For each plan row adapt() gets
+that athlete's daily rows up to the date, the (athlete, date) load row and
+the date's first weather row, exactly as a caller of the single-row API
+would pass them. Exits 1 on the first mismatch.
+"""
+import sys, time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.append(str(ROOT))
+
+from utils.rule_config import load_rules
+from utils.rules import DECISION_COLUMNS, adapt, adapt_batch
+
+
+def synthetic(athletes: int, days: int, seed: int = 5):
+    rng = np.random.default_rng(seed)
+    start = pd.Timestamp("2026-01-01")
+    daily, load, plan = [], [], []
+    for a in range(athletes):
+        aid = f"a{a}"
+        dates = start + pd.to_timedelta(np.sort(rng.choice(days, int(days * 0.85), replace=False)), unit="D")
+        n = len(dates)
+        daily.append(pd.DataFrame({
+            "athlete_id": aid, "date": dates,
+            "hrv_ms": np.where(rng.random(n) < 0.05, np.nan, rng.normal(60, 12, n)),
+            "rhr": np.where(rng.random(n) < 0.05, np.nan, rng.normal(50, 4, n)),
+            "sleep_duration_min": np.where(rng.random(n) < 0.05, np.nan, rng.normal(460, 45, n)),
+            "weight_kg": 75 + np.cumsum(rng.normal(-0.05, 0.25, n)),
+        }))
+        all_days = start + pd.to_timedelta(np.arange(days), unit="D")
+        load.append(pd.DataFrame({
+            "athlete_id": aid, "date": all_days,
+            "TSB": np.where(rng.random(days) < 0.1, np.nan, rng.normal(-2, 10, days)),
+        }).sample(frac=0.9, random_state=a))
+        plan.append(pd.DataFrame({
+            "athlete_id": aid, "date": all_days,
+            "nutrition_day": rng.choice(["maintenance", "deficit", "fuel", None], days),
+        }))
+    weather_days = start + pd.to_timedelta(np.arange(days), unit="D")
+    weather = pd.DataFrame({
+        "date": weather_days,
+        "precip_prob": rng.uniform(0, 1, days),
+        "wind_kph": rng.uniform(0, 45, days),
+    }).sample(frac=0.8, random_state=1)
+    return pd.concat(plan, ignore_index=True), pd.concat(daily, ignore_index=True), pd.concat(load, ignore_index=True), weather
+
+
+def main() -> None:
+    athletes = int(sys.argv[1]) if len(sys.argv) > 1 else 6
+    days = int(sys.argv[2]) if len(sys.argv) > 2 else 120
+    plan, daily, load, weather = synthetic(athletes, days)
+    rules = load_rules(ROOT / "adaptation_rules.json")  # not ADAPTATION_RULES_PATH: adapt() mirrors the shipped file
+
+    t0 = time.perf_counter()
+    batch = adapt_batch(plan, daily, load, weather, rules=rules)
+    batch_s = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    daily = daily.sort_values(["athlete_id", "date"], kind="stable")
+    mismatches = 0
+    for i, p in plan.iterrows():
+        hist = daily[(daily["athlete_id"] == p["athlete_id"]) & (daily["date"] <= p["date"])].reset_index(drop=True)
+        lrow = load[(load["athlete_id"] == p["athlete_id"]) & (load["date"] == p["date"])].to_dict("records")
+        wrow = weather[weather["date"] == p["date"]].to_dict("records")
+        want = adapt(p.to_dict(), hist, lrow[0] if lrow else {}, wrow[0] if wrow else {})
+        got = batch.loc[i, DECISION_COLUMNS].to_dict()
+        if got != want:
+            mismatches += 1
+            if mismatches <= 5:
+                print(f"MISMATCH {p['athlete_id']} {p['date'].date()}: batch={got} single={want}")
+    single_s = time.perf_counter() - t0
+
+    counts = batch.groupby(["rule", "decision"]).size().to_dict()
+    print(f"{len(plan):,} plan rows; batch {batch_s * 1000:.0f} ms, row-by-row {single_s:.1f} s")
+    print("decisions:", counts)
+    if mismatches:
+        print(f"FAIL: {mismatches} mismatching rows")
+        sys.exit(1)
+    print("PASS: batch matches adapt() on every row")
+
+
+if __name__ == "__main__":
+    main()
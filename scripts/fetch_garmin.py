@@ -16,12 +16,19 @@ load_dotenv(ROOT / ".env")
 
 # --- env & project imports ---
 from utils.db import ENGINE  # uses DATABASE_URL from .env
+from utils.bulk import upsert_df
 from garminconnect import Garmin
+from utils.garmin_client import GARMIN_WORKERS, fetch_days, get_client
 
 # ---------------------------------------------------------------------
 # Config
 # ---------------------------------------------------------------------
 START_DAYS = int(os.getenv("GARMIN_BACKFILL_DAYS", "45"))
+GARMIN_STALE_DAYS = int(os.getenv("GARMIN_STALE_DAYS", "2"))          # always refetch today + yesterday
+GARMIN_RETRY_EMPTY_DAYS = int(os.getenv("GARMIN_RETRY_EMPTY_DAYS", "7"))
+
+# daily_metrics columns Garmin owns; body comp comes from Apple Health and is never overwritten here
+GARMIN_DAILY_COLS = ["rhr", "hrv_ms", "sleep_duration_min", "vo2max"]
 
 ATHLETE_ID = os.getenv("ATHLETE_ID")
 if not ATHLETE_ID:
@@ -36,9 +43,8 @@ if not GARMIN_USER or not GARMIN_PASS:
 # Helpers
 # ---------------------------------------------------------------------
 def login() -> Garmin:
-    g = Garmin(GARMIN_USER, GARMIN_PASS)
-    g.login()   # may prompt for 2FA the first time
-    return g
+    # resumes the saved session (GARMINTOKENS); full login only when it's missing or expired
+    return get_client(GARMIN_USER, GARMIN_PASS)
 
 def fetch_activities(g: Garmin, start_days: int = START_DAYS) -> pd.DataFrame:
     # latest N (Garmin paginates)
@@ -86,141 +92,53 @@ def fetch_activities(g: Garmin, start_days: int = START_DAYS) -> pd.DataFrame:
             df[c] = pd.to_numeric(df[c], errors="coerce")
     return df
 
-def fetch_daily_metrics(g: Garmin, start_days: int = 90) -> pd.DataFrame:
-    start = (datetime.now() - timedelta(days=start_days)).date()
-    end   = datetime.now().date()
-    rows = []
-
-    for d in pd.date_range(start, end, freq="D"):
-        d_str = d.strftime("%Y-%m-%d")
-
-        # Defaults
-        sleep_min = None
-        rhr = None
-        hrv_ms = None
-        vo2 = None
-
-        try:
-            sleep = g.get_sleep_data(d_str)
-            if isinstance(sleep, dict):
-                sleep_min = sleep.get("dailySleepDTO", {}).get("sleepTimeInMinutes")
-        except Exception:
-            pass
-
-        try:
-            wellness = g.get_wellness(d_str)
-            rhr = wellness.get("restingHeartRate") if isinstance(wellness, dict) else None
-        except Exception:
-            pass
-
-        try:
-            hrv = g.get_hrv_data(d_str)  # not available to all accounts
-            if isinstance(hrv, dict):
-                hrv_ms = hrv.get("hrvSummary", {}).get("lastNightAvg")
-        except Exception:
-            pass
-
-        try:
-            stats = g.get_user_summary(d_str)
-            vo2 = stats.get("vo2Max") if isinstance(stats, dict) else None
-        except Exception:
-            pass
-
-        rows.append({
-            "date": d.date(),
-            "rhr": rhr,
-            "hrv_ms": hrv_ms,
-            "sleep_duration_min": sleep_min,
-            "sleep_score": None,
-            "body_battery": None,
-            "vo2max": vo2,
-            "weight_kg": None,            # prefer Apple Health for body comp
-            "body_fat_pct": None,
-            "pulse_wave_velocity_ms": None,
-            "athlete_id": ATHLETE_ID,
-        })
+def days_to_fetch(start_days: int = 90) -> list:
+    """
+    Days in the window that need a Garmin fetch: no daily_metrics row yet,
+    the last GARMIN_STALE_DAYS (still being synced from the watch), or
+    recent rows where Garmin returned nothing last time.
+    """
+    today = datetime.now().date()
+    start = today - timedelta(days=start_days)
+    stale_from = today - timedelta(days=GARMIN_STALE_DAYS - 1)
+    retry_from = today - timedelta(days=GARMIN_RETRY_EMPTY_DAYS)
+    with ENGINE.connect() as conn:
+        have = {
+            r.date: r for r in conn.execute(text("""
+                select date, rhr, sleep_duration_min from daily_metrics
+                where athlete_id = cast(:a as uuid) and date >= :start
+            """), {"a": ATHLETE_ID, "start": start})
+        }
+    out = []
+    for d in pd.date_range(start, today, freq="D").date:
+        row = have.get(d)
+        empty = row is not None and row.rhr is None and row.sleep_duration_min is None
+        if row is None or d >= stale_from or (empty and d >= retry_from):
+            out.append(d)
+    return out
+
+def fetch_daily_metrics(g: Garmin, start_days: int = 90, days: list | None = None) -> pd.DataFrame:
+    if days is None:
+        days = days_to_fetch(start_days)
+    print(f"Garmin: fetching {len(days)} of {start_days + 1} days ({GARMIN_WORKERS} in flight)")
+
+    def progress(done: int, total: int):
+        if done == total or done % 40 == 0:
+            print(f"  {done}/{total} calls")
+
+    rows, errors = fetch_days(g, days, workers=GARMIN_WORKERS, progress=progress)
+    for key, err in list(errors.items())[:10]:
+        print(f"  skipped {key}: {err}")
 
     df = pd.DataFrame(rows)
     if df.empty:
         return df
-
-    for c in ["rhr","hrv_ms","sleep_duration_min","sleep_score","body_battery",
-              "vo2max","weight_kg","body_fat_pct","pulse_wave_velocity_ms"]:
+    df["athlete_id"] = ATHLETE_ID
+    for c in GARMIN_DAILY_COLS:
         if c in df.columns:
             df[c] = pd.to_numeric(df[c], errors="coerce")
     return df
 
-def upsert_df(df: pd.DataFrame, table: str, unique_cols: list[str]) -> int:
-    """
-    Upsert df into target 'schema.table' (default schema 'public').
-    Creates a temp table in the same schema, casts types in SELECT.
-    """
-    if df.empty:
-        return 0
-
-    # Parse schema.table
-    if "." in table:
-        schema, tbl = table.split(".", 1)
-    else:
-        schema, tbl = "public", table
-
-    tmp = f"{tbl}_tmp_ingest"
-
-    cols = list(df.columns)
-
-    # Casts for Postgres
-    numeric_cols = {
-        "distance_km": "double precision",
-        "moving_time_sec": "double precision",
-        "elapsed_time_sec": "double precision",
-        "avg_power": "double precision",
-        "max_power": "double precision",
-        "avg_hr": "double precision",
-        "max_hr": "double precision",
-        "elevation_gain_m": "double precision",
-        "calories": "double precision",
-        "tss": "double precision",
-        "ifactor": "double precision",
-        "ftp": "double precision",
-        "rhr": "double precision",
-        "hrv_ms": "double precision",
-        "sleep_duration_min": "double precision",
-        "sleep_score": "double precision",
-        "body_battery": "double precision",
-        "vo2max": "double precision",
-        "weight_kg": "double precision",
-        "body_fat_pct": "double precision",
-        "pulse_wave_velocity_ms": "double precision",
-    }
-
-    select_cols = []
-    for c in cols:
-        if c == "athlete_id":
-            select_cols.append("cast(athlete_id as uuid) as athlete_id")
-        elif c in numeric_cols:
-            select_cols.append(f"cast({c} as {numeric_cols[c]}) as {c}")
-        else:
-            select_cols.append(c)
-
-    select_cols_sql = ", ".join(select_cols)
-    cols_sql = ", ".join(cols)
-    updates = ", ".join([f"{c}=EXCLUDED.{c}" for c in cols if c not in unique_cols])
-    unique_cols_sql = ", ".join(unique_cols)
-
-    with ENGINE.begin() as conn:
-        # write temp in same schema
-        df.to_sql(tmp, con=conn, if_exists="replace", index=False, schema=schema)
-
-        sql = text(f"""
-            insert into {schema}.{tbl} ({cols_sql})
-            select {select_cols_sql} from {schema}.{tmp}
-            on conflict ({unique_cols_sql}) do update set {updates};
-            drop table {schema}.{tmp};
-        """)
-        conn.execute(sql)
-
-    return len(df)
-
 # ---------------------------------------------------------------------
 # Main
 # ---------------------------------------------------------------------
@@ -235,7 +153,7 @@ if __name__ == "__main__":
                 "moving_time_sec","elapsed_time_sec","avg_power","max_power","avg_hr",
                 "max_hr","elevation_gain_m","calories","tss","ifactor","ftp"]
         acts = acts[cols]
-        upsert_df(acts, "public.activities", ["activity_id"])
+        upsert_df(ENGINE, acts, "public.activities", conflict_cols=["activity_id"])
         print(f"Upserted {len(acts)} activities from Garmin.")
     else:
         print("No activities fetched.")
@@ -243,10 +161,8 @@ if __name__ == "__main__":
     # Daily metrics → public.daily_metrics (unique: athlete_id + date)
     dm = fetch_daily_metrics(g, 90)
     if not dm.empty:
-        cols_dm = ["athlete_id","date","rhr","hrv_ms","sleep_duration_min","sleep_score",
-                   "body_battery","vo2max","weight_kg","body_fat_pct","pulse_wave_velocity_ms"]
-        dm = dm[cols_dm]
-        upsert_df(dm, "public.daily_metrics", ["athlete_id","date"])
+        dm = dm[["athlete_id","date"] + GARMIN_DAILY_COLS]
+        upsert_df(ENGINE, dm, "public.daily_metrics", conflict_cols=["athlete_id","date"])
         print(f"Upserted {len(dm)} daily metric rows from Garmin.")
     else:
         print("No daily metrics fetched.")
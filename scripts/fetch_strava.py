@@ -3,7 +3,7 @@ from utils.strava_client import get_activities
 from utils.db import read_sql, df_to_sql
 
 def last_ts_epoch():
-    df = read_sql("select max(ts) as last from activities")
+    df = read_sql("select max(ts) as last from activities", ttl=0)
     if df is None or df.empty or pd.isna(df.iloc[0]["last"]):
         return None
     return int(pd.Timestamp(df.iloc[0]["last"]).timestamp())
@@ -37,8 +37,8 @@ def main():
         print("No new Strava activities.")
         return
     df = normalize(acts)
-    df_to_sql(df, "activities")
-    print(f"Inserted {len(df)} activities.")
+    df_to_sql(df, "activities", conflict_cols=["activity_id"])
+    print(f"Upserted {len(df)} activities.")
 
 if __name__ == "__main__":
     main()
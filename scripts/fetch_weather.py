@@ -8,8 +8,9 @@ def main():
         print("No weather data fetched.")
         return
     df = pd.DataFrame(data)
-    df_to_sql(df, "weather")
-    print(f"Upserted {len(df)} weather rows (duplicates will be ignored if configured).")
+    # newer forecast for the same day/place replaces the old one
+    df_to_sql(df, "weather", conflict_cols=["date", "lat", "lon"])
+    print(f"Upserted {len(df)} weather rows.")
 
 if __name__ == "__main__":
     main()
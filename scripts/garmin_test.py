@@ -1,21 +1,23 @@
 # scripts/garmin_test.py
-import os
-from garminconnect import Garmin
+import os, sys
 from dotenv import load_dotenv
 from pathlib import Path
 
 # Load .env from project root
 ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.append(str(ROOT))
 load_dotenv(ROOT / ".env")
 
+from utils.garmin_client import GARMIN_TOKENSTORE, get_client
+
 user = os.getenv("GARMIN_USERNAME")
 pwd  = os.getenv("GARMIN_PASSWORD")
 if not user or not pwd:
     raise SystemExit("Set GARMIN_USERNAME and GARMIN_PASSWORD in your .env")
 
-print("Logging in to Garmin…")
-g = Garmin(user, pwd)
-g.login()   # if you have 2FA, you may be prompted once
+print(f"Logging in to Garmin (session in {GARMIN_TOKENSTORE})…")
+g = get_client(user, pwd)   # if you have 2FA, you may be prompted once; later runs reuse the session
 
 acts = g.get_activities(0, 5)  # latest 5
 print(f"Fetched {len(acts)} activities")
@@ -1,32 +1,372 @@
-import zipfile, xml.etree.ElementTree as ET, io, pandas as pd
+"""
+Apple Health export parser shared by the Streamlit admin page and the
+FastAPI importer (backend/app/apple_health.py).
 
-CODES = {
-  "HRV": "HKQuantityTypeIdentifierHeartRateVariabilitySDNN",
-  "RHR": "HKQuantityTypeIdentifierRestingHeartRate",
-  "WEIGHT": "HKQuantityTypeIdentifierBodyMass",
-  "BODY_FAT": "HKQuantityTypeIdentifierBodyFatPercentage"
+export.xml is streamed once. Apple writes every element's open tag, with all
+of its attributes, on a single line, so <Record>/<Workout> elements are read
+straight off that line and their children skipped; only lines the scanner
+cannot judge are handed to an incremental XML parser. Values land in
+per-metric array buffers and the daily aggregation is one NumPy pass over
+those columns.
+"""
+import io
+import zipfile
+import xml.etree.ElementTree as ET
+from array import array
+from datetime import date, datetime, timedelta
+from typing import IO, Any, Callable, Dict, List, Optional, Union
+
+import numpy as np
+
+# HealthKit type -> (column, daily aggregation). "last" = last value of the
+# day in export order, "mean" = mean of the day's samples.
+METRICS = {
+    "HKQuantityTypeIdentifierBodyMass": ("weight_kg", "last"),
+    "HKQuantityTypeIdentifierBodyFatPercentage": ("bodyfat_pct", "last"),
+    "HKQuantityTypeIdentifierVO2Max": ("vo2max_mlkgmin", "last"),
+    "HKQuantityTypeIdentifierRestingHeartRate": ("resting_hr_bpm", "last"),
+    "HKQuantityTypeIdentifierCyclingFunctionalThresholdPower": ("ftp_w", "last"),
+    "HKQuantityTypeIdentifierHeartRateVariabilitySDNN": ("hrv_ms", "mean"),
+}
+FIELDS = [f for f, _ in METRICS.values()]
+
+# watermark key used for (cycling) workouts
+WORKOUT_KEY = "HKWorkoutActivityTypeCycling"
+
+PROGRESS_EVERY = 20000
+# ExportParser._scan outcomes: dropped unread (counts toward bytes_skipped) / read into the buffers
+SKIPPED, CONSUMED = "skipped", "consumed"
+_READ_CHUNK = 1 << 20
+_TRACKED = {k.encode(): k for k in METRICS}
+
+
+def _attr(head: bytes, name: bytes) -> Optional[bytes]:
+    i = head.find(name)
+    if i < 0:
+        return None
+    j = i + len(name)
+    k = head.find(b'"', j)
+    return head[j:k] if k > 0 else None
+
+
+def _line_getter(head: bytes) -> Callable[[str], Optional[str]]:
+    def get(name: str) -> Optional[str]:
+        v = _attr(head, f' {name}="'.encode())
+        return v.decode() if v is not None else None
+    return get
+
+
+def end_utc(s: str) -> Optional[datetime]:
+    # "2025-10-04 07:15:28 +0100" -> naive UTC; hand-rolled, strptime is ~5x slower
+    try:
+        dt = datetime(int(s[0:4]), int(s[5:7]), int(s[8:10]), int(s[11:13]), int(s[14:16]), int(s[17:19]))
+        offset = timedelta(hours=int(s[21:23]), minutes=int(s[23:25]))
+        return dt - offset if s[20] == "+" else dt + offset
+    except (ValueError, IndexError):
+        return None
+
+
+def _to_float(v) -> Optional[float]:
+    try:
+        return float(v)
+    except (TypeError, ValueError):
+        return None
+
+
+def _convert(rtype: str, unit: str, val: float) -> float:
+    if rtype == "HKQuantityTypeIdentifierBodyMass" and unit in ("lb", "lbs"):
+        return val * 0.45359237
+    if rtype == "HKQuantityTypeIdentifierBodyFatPercentage" and val <= 1.0:
+        return val * 100.0  # HealthKit stores a fraction
+    return val
+
+
+def _ymd_to_datetime64(ymd: np.ndarray) -> np.ndarray:
+    y, m, d = ymd // 10000, (ymd // 100) % 100, ymd % 100
+    months = (y - 1970) * 12 + (m - 1)
+    return months.astype("datetime64[M]").astype("datetime64[D]") + (d - 1)
+
+
+def _aggregate(days: array, vals: array, how: str):
+    d = np.frombuffer(days, dtype=np.int32)
+    v = np.frombuffer(vals, dtype=np.float64)
+    order = np.argsort(d, kind="stable")  # stable: keeps export order within a day
+    d, v = d[order], v[order]
+    starts = np.flatnonzero(np.r_[True, d[1:] != d[:-1]])
+    ends = np.r_[starts[1:], len(d)]
+    if how == "mean":
+        agg = np.add.reduceat(v, starts) / (ends - starts)
+    else:
+        agg = v[ends - 1]
+    return d[starts], agg
+
+
+class ExportParser:
+    """
+    Single-pass export.xml reader.
+
+    cutoff        skip anything whose end day is before this date
+    day_marks     {record type: day}; skip elements ending before that day
+                  (the day itself is re-read so daily aggregates stay complete)
+    workout_mark  UTC timestamp; workouts ending at or before it are skipped
+    on_workouts   called with batches of workout dicts while parsing, so
+                  callers can write them out without buffering the export
+    on_tick       called every PROGRESS_EVERY elements
+    """
+
+    def __init__(
+        self,
+        *,
+        cutoff: Optional[date] = None,
+        day_marks: Optional[Dict[str, date]] = None,
+        workout_mark: Optional[datetime] = None,
+        on_workouts: Optional[Callable[[List[Dict[str, Any]]], None]] = None,
+        workout_batch: int = 500,
+        on_tick: Optional[Callable[[], None]] = None,
+    ):
+        self._cutoff = cutoff.isoformat().encode() if cutoff else None
+        self._marks = {k.encode(): d.isoformat().encode() for k, d in (day_marks or {}).items()}
+        self._workout_mark = workout_mark
+        self._on_workouts = on_workouts
+        self._workout_batch = workout_batch
+        self._on_tick = on_tick
+
+        self._days = {f: array("i") for f in FIELDS}
+        self._vals = {f: array("d") for f in FIELDS}
+        self._workouts: List[Dict[str, Any]] = []
+
+        # latest end timestamp (UTC) per record type, for the caller's watermarks
+        self.last_end: Dict[str, datetime] = {}
+        self._last_day: Dict[str, bytes] = {}
+
+        self.records_scanned = 0
+        self.records_parsed = 0
+        self.workouts_parsed = 0
+        self.bytes_skipped = 0
+        self.skipped = {"before_watermark": 0, "before_cutoff": 0, "untracked": 0}
+
+    # -------- sinks (shared by the line scanner and the XML fallback) --------
+    def _judge(self, key: bytes, end: bytes) -> Optional[str]:
+        day = end[:10]
+        if self._cutoff is not None and day < self._cutoff:
+            return "before_cutoff"
+        mark = self._marks.get(key)
+        if mark is not None and day < mark:
+            return "before_watermark"
+        return None
+
+    def _track_end(self, key: str, end: str) -> Optional[datetime]:
+        day = end[:10].encode()
+        if day < self._last_day.get(key, day):
+            return None  # cannot move the mark; skip the timestamp parse
+        ts = end_utc(end)
+        if ts and (key not in self.last_end or ts > self.last_end[key]):
+            self.last_end[key], self._last_day[key] = ts, day
+        return ts
+
+    def _record(self, rtype: str, unit: str, value: Optional[str], end: str) -> None:
+        val = _to_float(value)
+        if val is None:
+            return
+        field, _ = METRICS[rtype]
+        self._days[field].append(int(end[0:4] + end[5:7] + end[8:10]))
+        self._vals[field].append(_convert(rtype, unit.lower(), val))
+        self.records_parsed += 1
+        self._track_end(rtype, end)
+
+    def _workout(self, get: Callable[[str], Optional[str]]) -> None:
+        end = get("endDate")
+        dur = _to_float(get("duration"))
+        if not end or dur is None:
+            return
+        ts = end_utc(end)
+        if self._workout_mark and ts and ts <= self._workout_mark:
+            self.skipped["before_watermark"] += 1
+            return
+        dur_unit = (get("durationUnit") or "").lower()
+        self._workouts.append({
+            "type": get("workoutActivityType"),
+            "start": get("startDate"),
+            "end": end,
+            "date": date.fromisoformat(end[:10]),
+            "duration_min": dur if "min" in dur_unit else dur * 60.0,
+        })
+        self.workouts_parsed += 1
+        self._track_end(WORKOUT_KEY, end)
+        if len(self._workouts) >= self._workout_batch:
+            self._flush_workouts()
+
+    def _flush_workouts(self) -> None:
+        if self._workouts and self._on_workouts:
+            self._on_workouts(self._workouts)
+        self._workouts = []
+
+    # -------- line scanner --------
+    def _lines(self, fh: IO[bytes]):
+        # big reads + splitlines are much cheaper than ZipExtFile.readline
+        tail = b""
+        while True:
+            chunk = fh.read(_READ_CHUNK)
+            if not chunk:
+                if tail:
+                    yield tail
+                return
+            lines = (tail + chunk).splitlines(keepends=True)
+            tail = lines.pop() if not lines[-1].endswith(b"\n") else b""
+            yield from lines
+
+    def _scan(self, head: bytes) -> Optional[str]:
+        """SKIPPED or CONSUMED: handled here, dropped or read. None: hand it to the XML parser."""
+        if not head.rstrip().endswith(b">"):
+            return None  # open tag spans several lines
+        end = _attr(head, b' endDate="')
+        if head.startswith(b"<Record "):
+            key = _attr(head, b' type="')
+            if key is None:
+                return None
+            rtype = _TRACKED.get(key)
+            if rtype is None:
+                self.skipped["untracked"] += 1
+                return SKIPPED
+            end = end or _attr(head, b' creationDate="') or _attr(head, b' startDate="')
+            if end is None:
+                return SKIPPED
+            reason = self._judge(key, end)
+            if reason:
+                self.skipped[reason] += 1
+                return SKIPPED
+            unit = _attr(head, b' unit="') or b""
+            self._record(rtype, unit.decode(), (_attr(head, b' value="') or b"").decode(), end.decode())
+            return CONSUMED
+
+        kind = _attr(head, b' workoutActivityType="')
+        if kind is None or end is None:
+            return None
+        if b"cycling" not in kind.lower():
+            self.skipped["untracked"] += 1
+            return SKIPPED
+        reason = self._judge(WORKOUT_KEY.encode(), end)
+        if reason:
+            self.skipped[reason] += 1
+            return SKIPPED
+        self._workout(_line_getter(head))
+        return CONSUMED
+
+    # -------- XML fallback --------
+    def _element(self, elem: ET.Element) -> None:
+        tag = elem.tag.rpartition("}")[2]
+        if tag == "Record":
+            rtype = elem.get("type")
+            end = elem.get("endDate") or elem.get("creationDate") or elem.get("startDate")
+            if rtype not in METRICS or not end:
+                return
+            if self._judge(rtype.encode(), end.encode()) is None:
+                self._record(rtype, elem.get("unit") or "", elem.get("value"), end)
+        elif tag == "Workout":
+            end = elem.get("endDate")
+            if "cycling" not in (elem.get("workoutActivityType") or "").lower() or not end:
+                return
+            if self._judge(WORKOUT_KEY.encode(), end.encode()) is None:
+                self._workout(elem.get)
+
+    def parse(self, fh: IO[bytes]) -> "ExportParser":
+        xml = ET.XMLPullParser(events=("start", "end"))
+        root = None
+        depth = 0
+        closing: Optional[bytes] = None
+        skipping = False  # the element being closed was dropped, not read
+
+        for line in self._lines(fh):
+            if closing is not None:
+                if skipping:
+                    self.bytes_skipped += len(line)
+                if closing in line:
+                    closing = None
+                continue
+            head = line.lstrip()
+            if head.startswith(b"<Record ") or head.startswith(b"<Workout "):
+                self.records_scanned += 1
+                if self._on_tick and self.records_scanned % PROGRESS_EVERY == 0:
+                    self._on_tick()
+                outcome = self._scan(head)
+                if outcome is not None:
+                    skipping = outcome == SKIPPED
+                    if skipping:
+                        self.bytes_skipped += len(line)
+                    if not line.rstrip().endswith(b"/>"):
+                        closing = b"</Record>" if head.startswith(b"<Record ") else b"</Workout>"
+                    continue
+
+            xml.feed(line)
+            for event, elem in xml.read_events():
+                if event == "start":
+                    if root is None:
+                        root = elem
+                    depth += 1
+                    continue
+                depth -= 1
+                if depth == 1:
+                    self._element(elem)
+                    root.clear()
+        xml.close()
+        self._flush_workouts()
+        return self
+
+    # -------- results --------
+    def daily(self) -> Dict[str, np.ndarray]:
+        """{"date": datetime64[D], <field>: float64 with NaN for missing}, sorted by date."""
+        per_field = {
+            f: _aggregate(self._days[f], self._vals[f], how)
+            for f, how in METRICS.values() if len(self._days[f])
+        }
+        if not per_field:
+            return {"date": np.array([], dtype="datetime64[D]"), **{f: np.array([]) for f in FIELDS}}
+        all_days = np.unique(np.concatenate([d for d, _ in per_field.values()]))
+        out: Dict[str, np.ndarray] = {"date": _ymd_to_datetime64(all_days)}
+        for f in FIELDS:
+            col = np.full(len(all_days), np.nan)
+            if f in per_field:
+                d, agg = per_field[f]
+                col[np.searchsorted(all_days, d)] = agg
+            out[f] = col
+        return out
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "records_scanned": self.records_scanned,
+            "records_parsed": self.records_parsed,
+            "workouts_parsed": self.workouts_parsed,
+            "records_skipped": sum(self.skipped.values()),
+            "skipped": dict(self.skipped),
+            "bytes_skipped": self.bytes_skipped,
+        }
+
+
+def open_export_xml(zf: zipfile.ZipFile) -> Optional[IO[bytes]]:
+    name = next((n for n in zf.namelist() if n.endswith("export.xml")), None)
+    return zf.open(name, "r") if name else None
+
+
+# Streamlit's daily_metrics table uses its own column names
+_DAILY_METRICS_COLUMNS = {
+    "resting_hr_bpm": "rhr",
+    "bodyfat_pct": "body_fat_pct",
+    "vo2max_mlkgmin": "vo2max",
 }
 
-def parse_health_export(zip_bytes: bytes) -> pd.DataFrame:
-    with zipfile.ZipFile(io.BytesIO(zip_bytes)) as z:
-        with z.open("apple_health_export/export.xml") as f:
-            tree = ET.parse(f)
-    root = tree.getroot()
-    recs = []
-    for r in root.findall("Record"):
-        t = r.get("type")
-        start = r.get("startDate")
-        value = r.get("value")
-        if t in CODES.values():
-            recs.append({"type": t, "date": start[:10], "value": float(value) if value else None})
-    df = pd.DataFrame(recs)
+
+def parse_health_export(src: Union[bytes, IO[bytes]]):
+    """Zip (bytes or file object) -> daily DataFrame in `daily_metrics` column names."""
+    import pandas as pd
+
+    with zipfile.ZipFile(io.BytesIO(src) if isinstance(src, (bytes, bytearray)) else src) as z:
+        fh = open_export_xml(z)
+        if fh is None:
+            return pd.DataFrame()
+        with fh:
+            daily = ExportParser().parse(fh).daily()
+    df = pd.DataFrame(daily).rename(columns=_DAILY_METRICS_COLUMNS)
     if df.empty:
         return df
-    daily = df.pivot_table(index="date", columns="type", values="value", aggfunc="mean").reset_index()
-    daily = daily.rename(columns={
-        CODES["HRV"]:"hrv_ms",
-        CODES["RHR"]:"rhr",
-        CODES["WEIGHT"]:"weight_kg",
-        CODES["BODY_FAT"]:"body_fat_pct"
-    })
-    return daily
+    df["date"] = df["date"].dt.date
+    return df.dropna(axis=1, how="all")
@@ -0,0 +1,120 @@
+"""
+Bulk upsert of DataFrames for the ingest scripts and admin uploads.
+
+On Postgres the frame is streamed with COPY into a session-local TEMP table
+(ON COMMIT DROP, so concurrent runs never share a staging table and nothing
+is left behind), then merged into the target with a single
+INSERT … SELECT … ON CONFLICT. The staging table takes its column types from
+the target, so COPY does the casting. Other dialects (SQLite in dev) fall
+back to executemany batches of the same INSERT … ON CONFLICT.
+"""
+import io
+import os
+import uuid
+
+import pandas as pd
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+
+# rows per COPY round-trip / per executemany batch
+BULK_COPY_CHUNK = int(os.getenv("BULK_COPY_CHUNK", "50000"))
+BULK_BATCH_SIZE = int(os.getenv("BULK_BATCH_SIZE", "1000"))
+
+COPY_NULL = "\\N"
+
+
+def _prepare(df: pd.DataFrame, conflict_cols) -> pd.DataFrame:
+    if conflict_cols:
+        # ON CONFLICT DO UPDATE refuses to touch the same row twice in one statement: last row wins
+        df = df.drop_duplicates(subset=list(conflict_cols), keep="last")
+    df = df.copy()
+    for c in df.columns:
+        s = df[c]
+        # NaN turns int columns into floats; "400.0" is not valid input for an integer column
+        if pd.api.types.is_float_dtype(s) and s.notna().any() and (s.dropna() % 1 == 0).all():
+            df[c] = s.astype("Int64")
+    return df
+
+
+def _merge_clause(q, cols, conflict_cols, update_cols) -> str:
+    if not conflict_cols:
+        return ""
+    keys = ", ".join(q(c) for c in conflict_cols)
+    if update_cols is None:
+        update_cols = [c for c in cols if c not in conflict_cols]
+    if not update_cols:
+        return f" on conflict ({keys}) do nothing"
+    sets = ", ".join(f"{q(c)} = excluded.{q(c)}" for c in update_cols)
+    return f" on conflict ({keys}) do update set {sets}"
+
+
+def _copy_upsert(conn, df, target, cols, merge) -> int:
+    q = conn.dialect.identifier_preparer.quote
+    col_sql = ", ".join(q(c) for c in cols)
+    tmp = q(f"_bulk_{uuid.uuid4().hex[:12]}")
+    conn.execute(text(
+        f"create temp table {tmp} on commit drop as select {col_sql} from {target} with no data"
+    ))
+
+    copy_sql = f"copy {tmp} ({col_sql}) from stdin with (format csv, null '{COPY_NULL}')"
+    raw = conn.connection.driver_connection
+    with raw.cursor() as cur:
+        for start in range(0, len(df), BULK_COPY_CHUNK):
+            buf = io.StringIO()
+            df.iloc[start:start + BULK_COPY_CHUNK].to_csv(buf, index=False, header=False, na_rep=COPY_NULL)
+            if hasattr(cur, "copy"):  # psycopg 3
+                with cur.copy(copy_sql) as copy:
+                    copy.write(buf.getvalue())
+            else:  # psycopg2
+                buf.seek(0)
+                cur.copy_expert(copy_sql, buf)
+
+    res = conn.execute(text(f"insert into {target} ({col_sql}) select {col_sql} from {tmp}{merge}"))
+    return max(res.rowcount or 0, 0)
+
+
+def _batch_upsert(conn, df, target, cols, merge) -> int:
+    q = conn.dialect.identifier_preparer.quote
+    params = [f"p{i}" for i in range(len(cols))]
+    stmt = text(
+        f"insert into {target} ({', '.join(q(c) for c in cols)}) "
+        f"values ({', '.join(':' + p for p in params)}){merge}"
+    )
+    values = df.astype(object).where(df.notna(), None).itertuples(index=False, name=None)
+    affected, batch = 0, []
+    for row in values:
+        batch.append(dict(zip(params, row)))
+        if len(batch) >= BULK_BATCH_SIZE:
+            affected += max(conn.execute(stmt, batch).rowcount or 0, 0)
+            batch = []
+    if batch:
+        affected += max(conn.execute(stmt, batch).rowcount or 0, 0)
+    return affected
+
+
+def upsert_df(bind, df: pd.DataFrame, table: str, *, conflict_cols=None, update_cols=None) -> int:
+    """
+    Write `df` into `table` ("name" or "schema.name"); columns must match the
+    table's. With `conflict_cols` (backed by a unique index) conflicting rows
+    get the non-key columns overwritten, or only `update_cols` when given;
+    `update_cols=[]` keeps existing rows. Without it rows are appended.
+    `bind` is an Engine (own transaction) or a Connection (caller commits).
+    Returns the affected row count.
+    """
+    if df is None or df.empty:
+        return 0
+    if isinstance(bind, Engine):
+        with bind.begin() as conn:
+            return upsert_df(conn, df, table, conflict_cols=conflict_cols, update_cols=update_cols)
+
+    conn = bind
+    q = conn.dialect.identifier_preparer.quote
+    df = _prepare(df, conflict_cols)
+    cols = [str(c) for c in df.columns]
+    target = ".".join(q(p) for p in table.split(".", 1))
+    merge = _merge_clause(q, cols, conflict_cols, update_cols)
+    if conn.dialect.name == "postgresql":
+        return _copy_upsert(conn, df, target, cols, merge)
+    if conn.dialect.name == "sqlite" and "." in table:
+        target = q(table.split(".", 1)[1])  # "public.x" from the Postgres scripts
+    return _batch_upsert(conn, df, target, cols, merge)
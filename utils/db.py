@@ -1,6 +1,14 @@
 import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+import pandas as pd
 import streamlit as st
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, text
+
+from utils.bulk import upsert_df
 
 def _get(k, default=None):
     try:
@@ -12,4 +20,82 @@ DATABASE_URL = _get("DATABASE_URL")
 if not DATABASE_URL:
     raise RuntimeError("DATABASE_URL missing. Add it to Streamlit Secrets (cloud) or .env (local).")
 
-ENGINE = create_engine(DATABASE_URL, pool_pre_ping=True)
+# one pool per process, shared by every page rerun and session
+_pool_kw = {}
+if DATABASE_URL.startswith("postgres"):
+    _pool_kw = {
+        "pool_size": int(_get("DB_POOL_SIZE", "5")),
+        "max_overflow": int(_get("DB_MAX_OVERFLOW", "5")),
+        "pool_recycle": int(_get("DB_POOL_RECYCLE_S", "1800")),  # poolers drop idle connections
+    }
+ENGINE = create_engine(DATABASE_URL, pool_pre_ping=True, **_pool_kw)
+
+# ---------------------------------------------------------------------
+# Read cache: results are kept READ_CACHE_TTL_S seconds and dropped as soon
+# as df_to_sql writes to a table the query reads. Writes from other
+# processes (cron scripts) are only picked up when the TTL runs out.
+# ---------------------------------------------------------------------
+READ_CACHE_TTL_S = float(_get("READ_CACHE_TTL_S", "60"))
+READ_CACHE_MAX = int(_get("READ_CACHE_MAX", "64"))
+READ_CHUNK_ROWS = int(_get("READ_CHUNK_ROWS", "20000"))
+
+_cache = OrderedDict()  # key -> (expires_at, tables, df)
+_cache_lock = threading.Lock()
+_TABLE_RE = re.compile(r"\b(?:from|join)\s+([\w.\"]+)", re.IGNORECASE)
+
+def _table_name(name: str) -> str:
+    return name.replace('"', "").split(".")[-1].lower()
+
+def _tables(sql: str) -> frozenset:
+    return frozenset(_table_name(m) for m in _TABLE_RE.findall(sql))
+
+def _fetch(sql: str, params: dict) -> pd.DataFrame:
+    with ENGINE.connect() as conn:
+        if conn.dialect.name != "postgresql":
+            return pd.read_sql(text(sql), conn, params=params)
+        # server-side cursor: rows arrive in chunks instead of being buffered twice by the driver
+        conn = conn.execution_options(stream_results=True, max_row_buffer=READ_CHUNK_ROWS)
+        chunks = list(pd.read_sql(text(sql), conn, params=params, chunksize=READ_CHUNK_ROWS))
+    if not chunks:
+        return pd.DataFrame()
+    return chunks[0] if len(chunks) == 1 else pd.concat(chunks, ignore_index=True)
+
+def read_sql(sql: str, params: dict = None, ttl: float = None) -> pd.DataFrame:
+    """
+    Run a parameterized query (":name" placeholders) and return a DataFrame.
+    Results are cached for `ttl` seconds (default READ_CACHE_TTL_S; 0 = always
+    query). Callers get their own copy, so mutating it is safe.
+    """
+    ttl = READ_CACHE_TTL_S if ttl is None else ttl
+    params = params or {}
+    key = (sql, tuple(sorted((k, repr(v)) for k, v in params.items())))
+    now = time.monotonic()
+    if ttl > 0:
+        with _cache_lock:
+            hit = _cache.get(key)
+            if hit and hit[0] > now:
+                _cache.move_to_end(key)
+                return hit[2].copy()
+
+    df = _fetch(sql, params)
+    if ttl > 0:
+        with _cache_lock:
+            _cache[key] = (now + ttl, _tables(sql), df)
+            _cache.move_to_end(key)
+            while len(_cache) > READ_CACHE_MAX:
+                _cache.popitem(last=False)
+    return df.copy() if ttl > 0 else df
+
+def invalidate(*tables: str) -> None:
+    """Drop cached results reading any of `tables` (all results when none given)."""
+    names = {_table_name(t) for t in tables}
+    with _cache_lock:
+        for key in [k for k, (_, t, _) in _cache.items() if not names or t & names]:
+            del _cache[key]
+
+def df_to_sql(df, table, conflict_cols=None, update_cols=None) -> int:
+    """Bulk write df into table (COPY on Postgres); see utils.bulk.upsert_df for conflict handling."""
+    try:
+        return upsert_df(ENGINE, df, table, conflict_cols=conflict_cols, update_cols=update_cols)
+    finally:
+        invalidate(table)
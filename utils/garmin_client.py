@@ -1,16 +1,190 @@
-import os, datetime as dt
+import json, os, random, re, threading, time, datetime as dt
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from dotenv import load_dotenv
 from garminconnect import Garmin
 
+try:
+    import fcntl
+except ImportError:  # Windows: thread lock only
+    fcntl = None
+
 load_dotenv()
 USERNAME = os.getenv("GARMIN_USERNAME")
 PASSWORD = os.getenv("GARMIN_PASSWORD")
 
+# OAuth tokens (garth dump) shared by every script/process on this machine
+GARMIN_TOKENSTORE = os.path.expanduser(os.getenv("GARMINTOKENS", "~/.garminconnect"))
+
+# concurrent daily fetch (see fetch_days)
+GARMIN_WORKERS = int(os.getenv("GARMIN_WORKERS", "6"))
+GARMIN_RETRIES = int(os.getenv("GARMIN_RETRIES", "3"))
+GARMIN_RETRY_BASE_S = float(os.getenv("GARMIN_RETRY_BASE_S", "1.0"))
+
+# one call per endpoint per day: name -> Garmin method
+DAILY_ENDPOINTS = {
+    "sleep": "get_sleep_data",
+    "rhr": "get_rhr_day",
+    "hrv": "get_hrv_data",
+    "summary": "get_user_summary",
+}
+
+_lock = threading.Lock()
+_client = None
+
+def _rejected(e: Exception) -> bool:
+    # Garmin refused the session (401/403); a data call failing any other way is not an auth problem
+    if "Authentication" in type(e).__name__:
+        return True
+    status = getattr(getattr(e, "response", None), "status_code", None)
+    return status in (401, 403)
+
+def _auth_failure(e: Exception) -> bool:
+    # missing/corrupt token files or a rejected session; anything else (network, 5xx) is not fixed by a new login
+    return isinstance(e, (FileNotFoundError, ValueError, KeyError)) or _rejected(e)
+
+def _resume(tokenstore: str):
+    g = Garmin()
+    oauth1, oauth2 = (os.path.join(tokenstore, n) for n in ("oauth1_token.json", "oauth2_token.json"))
+    if os.path.exists(oauth1) and not os.path.exists(oauth2):
+        # invalidate() dropped the OAuth2 token: exchange the long-lived OAuth1 token for a new one
+        from garth.auth_tokens import OAuth1Token
+        with open(oauth1) as f:
+            token = OAuth1Token(**json.load(f))
+        g.garth.configure(oauth1_token=token, domain=token.domain)
+        g.garth.refresh_oauth2()
+        g.garth.dump(tokenstore)
+    g.login(tokenstore)  # loads the tokens, refreshes OAuth2 if expired, fetches the profile
+    return g
+
+def get_client(username: str = None, password: str = None, tokenstore: str = GARMIN_TOKENSTORE) -> Garmin:
+    """
+    Logged-in Garmin client, reused for the life of the process. Resumes the
+    session saved in `tokenstore` and only does a full SSO login when there is
+    none or Garmin rejects it. Logins are serialised across threads and
+    processes (flock on a sidecar lock file), so concurrent runs share one.
+    """
+    global _client
+    if _client is not None:
+        return _client
+    with _lock:
+        if _client is not None:
+            return _client
+        os.makedirs(tokenstore, mode=0o700, exist_ok=True)
+        with open(os.path.join(tokenstore, ".lock"), "a") as lock_file:
+            if fcntl:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                try:
+                    g = _resume(tokenstore)
+                except Exception as e:
+                    if not _auth_failure(e):
+                        raise
+                    username, password = username or USERNAME, password or PASSWORD
+                    if not username or not password:
+                        raise RuntimeError("Garmin session expired; set GARMIN_USERNAME and GARMIN_PASSWORD") from e
+                    g = Garmin(username, password)
+                    g.login()  # may prompt for 2FA the first time
+                g.garth.dump(tokenstore)  # persists a refreshed OAuth2 token too
+            finally:
+                if fcntl:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+        _client = g
+        return g
+
+def invalidate(tokenstore: str = GARMIN_TOKENSTORE):
+    """
+    Forget a session Garmin rejected mid-run. Only the OAuth2 token is
+    dropped; the next get_client exchanges the long-lived OAuth1 token for a
+    new one instead of doing a full SSO (and 2FA) login.
+    """
+    global _client
+    with _lock:
+        _client = None
+        try:
+            os.remove(os.path.join(tokenstore, "oauth2_token.json"))
+        except FileNotFoundError:
+            pass
+
 def fetch_daily(date: dt.date):
-    api = Garmin(USERNAME, PASSWORD)
-    api.login()
+    api = get_client()
     summary = api.get_stats_and_body(date.isoformat())
     sleep = api.get_sleep_data(date.isoformat())
     hrv = api.get_hrv_data(date.isoformat())
-    api.logout()
     return {"summary": summary, "sleep": sleep, "hrv": hrv}
+
+def _retryable(e: Exception) -> bool:
+    # throttling, 5xx and network errors are worth another try; 4xx (e.g. no HRV on this device) are not
+    if type(e).__name__ in ("GarminConnectTooManyRequestsError", "ConnectionError", "Timeout", "ReadTimeout", "ConnectTimeout"):
+        return True
+    status = getattr(getattr(e, "response", None), "status_code", None)
+    if status is None:
+        m = re.search(r"\b([45]\d\d)\b", str(e))
+        status = int(m.group(1)) if m else None
+    return status is None or status == 429 or status >= 500
+
+def _call(g: Garmin, method: str, day: str, retries: int, base_s: float):
+    fn = getattr(g, method, None)
+    if fn is None:
+        return None
+    for attempt in range(retries + 1):
+        try:
+            return fn(day)
+        except Exception as e:
+            if attempt == retries or not _retryable(e):
+                raise
+            # exponential backoff with full jitter so parallel workers don't retry in lockstep
+            time.sleep(base_s * (2 ** attempt) * random.uniform(0.5, 1.5))
+
+def _rhr(rhr: dict, summary: dict):
+    try:
+        return rhr["allMetrics"]["metricsMap"]["WELLNESS_RESTING_HEART_RATE"][0]["value"]
+    except (KeyError, IndexError, TypeError):
+        return summary.get("restingHeartRate") if isinstance(summary, dict) else None
+
+def daily_row(day: dt.date, raw: dict) -> dict:
+    sleep, hrv, summary = raw.get("sleep"), raw.get("hrv"), raw.get("summary")
+    return {
+        "date": day,
+        "rhr": _rhr(raw.get("rhr"), summary),
+        "hrv_ms": (hrv.get("hrvSummary") or {}).get("lastNightAvg") if isinstance(hrv, dict) else None,
+        "sleep_duration_min": (sleep.get("dailySleepDTO") or {}).get("sleepTimeInMinutes") if isinstance(sleep, dict) else None,
+        "vo2max": summary.get("vo2Max") if isinstance(summary, dict) else None,
+    }
+
+def fetch_days(g: Garmin, days, workers: int = GARMIN_WORKERS, retries: int = GARMIN_RETRIES,
+               base_s: float = GARMIN_RETRY_BASE_S, progress=None, tokenstore: str = GARMIN_TOKENSTORE):
+    """
+    Fetch DAILY_ENDPOINTS for every day in `days` with at most `workers` calls in flight.
+    Returns (rows sorted by date, {"day/endpoint": error}). progress(done, total) is
+    called after each call. If Garmin rejects the session (401/403) the calls it
+    refused are retried once on a fresh session (see invalidate).
+    """
+    days = sorted(set(days))
+    raw = {d: {} for d in days}
+    errors = {}
+    tasks = [(d, name, method) for d in days for name, method in DAILY_ENDPOINTS.items()]
+    if not tasks:
+        return [], errors
+    done, total = 0, len(tasks)
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        for attempt in range(2):
+            futs = {pool.submit(_call, g, method, d.isoformat(), retries, base_s): (d, name, method) for d, name, method in tasks}
+            rejected = []
+            for fut in as_completed(futs):
+                d, name, method = futs[fut]
+                try:
+                    raw[d][name] = fut.result()
+                    errors.pop(f"{d}/{name}", None)
+                except Exception as e:
+                    errors[f"{d}/{name}"] = str(e)[:200]
+                    if _rejected(e):
+                        rejected.append((d, name, method))
+                done += 1
+                if progress:
+                    progress(done, total)
+            if not rejected or attempt:
+                break
+            invalidate(tokenstore)
+            g, tasks = get_client(tokenstore=tokenstore), rejected
+            total += len(tasks)
+    return [daily_row(d, raw[d]) for d in days], errors
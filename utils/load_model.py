@@ -0,0 +1,42 @@
+"""
+Fitness/fatigue model, NumPy only (shared by utils.metrics and the backend).
+
+ATL (fatigue) and CTL (fitness) are exponentially weighted averages of
+daily TSS over a calendar with rest days as zeros:
+
+    ATL_d = ATL_{d-1} + (TSS_d - ATL_{d-1}) / 7
+    CTL_d = CTL_{d-1} + (TSS_d - CTL_{d-1}) / 42
+    TSB_d = CTL_{d-1} - ATL_{d-1}    (form going into day d)
+"""
+import numpy as np
+
+ATL_DAYS = 7
+CTL_DAYS = 42
+
+
+def ewma_load(daily_tss: np.ndarray, atl0=0.0, ctl0=0.0):
+    """
+    ATL, CTL and TSB for a (days × athletes) TSS matrix, starting from the
+    given state (scalars or one value per athlete) on the day before row 0.
+    """
+    daily_tss = np.asarray(daily_tss, dtype=float)
+    atl = np.empty_like(daily_tss)
+    ctl = np.empty_like(daily_tss)
+    a = np.array(np.broadcast_to(atl0, daily_tss.shape[1:]), dtype=float)
+    c = np.array(np.broadcast_to(ctl0, daily_tss.shape[1:]), dtype=float)
+    ka, kc = 1.0 / ATL_DAYS, 1.0 / CTL_DAYS
+    for i in range(len(daily_tss)):
+        a += (daily_tss[i] - a) * ka
+        c += (daily_tss[i] - c) * kc
+        atl[i] = a
+        ctl[i] = c
+    tsb = np.empty_like(daily_tss)
+    if len(daily_tss):
+        tsb[0] = ctl0 - np.asarray(atl0)
+        tsb[1:] = ctl[:-1] - atl[:-1]
+    return atl, ctl, tsb
+
+
+def decay(atl: float, ctl: float, days: int):
+    """ATL and CTL after `days` rest days (TSS 0), in closed form."""
+    return atl * (1 - 1.0 / ATL_DAYS) ** days, ctl * (1 - 1.0 / CTL_DAYS) ** days
@@ -1,18 +1,83 @@
+"""
+Training load: daily TSS and the fitness/fatigue model on top of it.
+
+The model itself (ATL/CTL/TSB recurrences) lives in utils.load_model so the
+backend can use it without pandas.
+
+Everything is array code: activities are binned into a (day × athlete)
+matrix and the recurrences advance all athletes together, one day per step.
+"""
+import numpy as np
 import pandas as pd
 
-def estimate_tss(row):
-    if pd.notnull(row.get("tss")):
-        return row["tss"]
-    secs = row.get("moving_time_sec", 0) or 0
-    return (secs/3600.0) * 50  # rough
-
-def rolling_load(df_activities: pd.DataFrame):
-    df = df_activities.copy()
-    if df.empty:
-        return df
-    df["tss_est"] = df.apply(estimate_tss, axis=1)
-    df = df.sort_values("ts")
-    df["ATL_7d"] = df.set_index("ts")["tss_est"].rolling("7D").sum().values
-    df["CTL_42d"] = (df.set_index("ts")["tss_est"].rolling("42D").sum() / 7.0).values
-    df["TSB"] = df["CTL_42d"].shift(1) - df["ATL_7d"].shift(1)
-    return df
+from utils.load_model import ATL_DAYS, CTL_DAYS, ewma_load  # noqa: F401  (re-exported)
+
+TSS_PER_HOUR = 50.0  # rough, for activities without a recorded TSS
+
+LOAD_COLUMNS = ["date", "tss", "ATL", "CTL", "TSB"]
+
+
+def estimate_tss(df: pd.DataFrame) -> pd.Series:
+    """Recorded TSS where present, else moving hours × TSS_PER_HOUR."""
+    n = len(df)
+    tss = pd.to_numeric(df["tss"], errors="coerce").to_numpy(float) if "tss" in df else np.full(n, np.nan)
+    secs = (
+        pd.to_numeric(df["moving_time_sec"], errors="coerce").fillna(0).to_numpy(float)
+        if "moving_time_sec" in df else np.zeros(n)
+    )
+    return pd.Series(np.where(np.isnan(tss), secs / 3600.0 * TSS_PER_HOUR, tss), index=df.index, name="tss_est")
+
+
+def _athlete_major(m: np.ndarray, mask: np.ndarray) -> np.ndarray:
+    return np.ascontiguousarray(m.T).ravel()[mask]
+
+
+def training_load(df_activities: pd.DataFrame, by="athlete_id", ts_col="ts", end=None) -> pd.DataFrame:
+    """
+    Daily load per athlete: one row per UTC calendar day from the athlete's
+    first activity to `end` (default: the newest activity in the frame),
+    with columns [by,] date, tss, ATL, CTL, TSB. Pass `by=None` to treat
+    all activities as one athlete. Activities after `end` are ignored.
+    """
+    keys = [by] if by else []
+    if df_activities is None or df_activities.empty:
+        return pd.DataFrame(columns=keys + LOAD_COLUMNS)
+
+    ts = pd.to_datetime(df_activities[ts_col], utc=True, errors="coerce", format="ISO8601")
+    ok = ts.notna().to_numpy()
+    if not ok.any():
+        return pd.DataFrame(columns=keys + LOAD_COLUMNS)
+    day = ts[ok].dt.tz_localize(None).to_numpy().astype("datetime64[D]").astype(np.int64)
+    tss = np.nan_to_num(estimate_tss(df_activities).to_numpy()[ok])
+    if by:
+        codes, athletes = pd.factorize(df_activities[by][ok], use_na_sentinel=False)
+    else:
+        codes, athletes = np.zeros(len(day), dtype=np.int64), pd.Index([None])
+
+    last = day.max() if end is None else np.datetime64(pd.Timestamp(end).date(), "D").astype(np.int64)
+    keep = day <= last
+    day, tss, codes = day[keep], tss[keep], codes[keep]
+    if not len(day):
+        return pd.DataFrame(columns=keys + LOAD_COLUMNS)
+
+    d0 = day.min()
+    n_days, n_ath = int(last - d0 + 1), len(athletes)
+    flat = (day - d0) * n_ath + codes
+    daily = np.bincount(flat, weights=tss, minlength=n_days * n_ath).reshape(n_days, n_ath)
+    seen = np.bincount(flat, minlength=n_days * n_ath).reshape(n_days, n_ath) > 0
+    atl, ctl, tsb = ewma_load(daily)
+
+    # keep each athlete's days from their first activity on, ordered by athlete then date;
+    # athlete-major copies so the boolean gathers below read contiguous memory
+    first = np.where(seen.any(axis=0), seen.argmax(axis=0), n_days)
+    mask = (np.arange(n_days)[None, :] >= first[:, None]).ravel()
+    days = np.broadcast_to(np.arange(d0, d0 + n_days, dtype=np.int64), (n_ath, n_days)).ravel()[mask]
+    out = {by: athletes.repeat(n_days - first)} if by else {}
+    out.update({
+        "date": (days * 86_400_000_000_000).view("datetime64[ns]"),
+        "tss": _athlete_major(daily, mask),
+        "ATL": _athlete_major(atl, mask),
+        "CTL": _athlete_major(ctl, mask),
+        "TSB": _athlete_major(tsb, mask),
+    })
+    return pd.DataFrame(out)
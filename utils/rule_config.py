@@ -0,0 +1,182 @@
+"""
+Declarative adaptation rules.
+
+The rule set lives in a JSON file (adaptation_rules.json at the repo root,
+or ADAPTATION_RULES_PATH). Each rule has a name, the decision and reason it
+produces, coach-facing `trigger`/`action` text and a `when` condition built
+from leaves `{"feature", "op", "value"}` and the combinators `all`, `any`
+and `not`. An optional `plan_types` list limits where the plan preview
+shows it.
+
+`load_rules()` compiles the file once into a RuleSet and caches it; the
+file's mtime/size is checked on every call and a changed file is
+recompiled, so edits apply without a restart. A broken edit is logged and
+the last good rule set stays active.
+
+Evaluation is array code over feature columns (see FEATURES). Identical
+leaves are evaluated once however many rules share them, and the winner
+for every row is picked with one argmin over the (rules x rows) flag
+matrix, so adding rules adds a few vector comparisons, never a pass per row.
+NumPy only, so the backend can import it.
+"""
+import json
+import logging
+import os
+import threading
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Mapping, Optional, Tuple
+
+import numpy as np
+
+log = logging.getLogger(__name__)
+
+ROOT = Path(__file__).resolve().parents[1]
+RULES_PATH = Path(os.getenv("ADAPTATION_RULES_PATH", str(ROOT / "adaptation_rules.json")))
+
+# feature columns the evaluators provide (utils.rules.adapt_batch)
+FEATURES = {
+    "history_days": "daily rows up to and including the date",
+    "hrv_drop": "HRV minus its 7-row median (ms)",
+    "rhr_rise": "resting HR minus its 7-row median (bpm)",
+    "sleep_duration_min": "last night's sleep (min)",
+    "weight_rate_kg_wk": "weight change vs 13 rows back, per week (kg)",
+    "TSB": "form going into the day",
+    "precip_prob": "rain probability (0-1)",
+    "wind_kph": "wind (km/h)",
+    "nutrition_day": "the plan row's nutrition_day",
+}
+
+OPS: Dict[str, Callable] = {
+    "<": np.less, "<=": np.less_equal, ">": np.greater, ">=": np.greater_equal,
+    "==": np.equal, "!=": np.not_equal,
+}
+
+_DEFAULT_RESOLVE = {
+    "precedence": ["Reduce", "Swap"],
+    "otherwise": "Progress",
+    "fallback": {"rule": "None", "decision": "Maintain", "reason": "No flags"},
+}
+
+
+class RuleSet:
+    """A compiled rule file. Build with compile_rules()."""
+
+    def __init__(self, rules, leaves, trees, resolve, source=None):
+        self.rules: List[Dict[str, Any]] = rules
+        self._leaves: List[Tuple[str, str, Any]] = leaves
+        self._trees: List[Callable[[List[np.ndarray]], np.ndarray]] = trees
+        self.precedence: List[str] = list(resolve["precedence"])
+        self.otherwise: str = resolve["otherwise"]
+        self.fallback: Dict[str, str] = dict(resolve["fallback"])
+        self.source = source
+
+    @property
+    def features(self) -> List[str]:
+        return sorted({f for f, _, _ in self._leaves})
+
+    def flags(self, features: Mapping[str, np.ndarray]) -> np.ndarray:
+        """(rules x rows) boolean matrix: which rules fire on which row."""
+        leaf = [np.asarray(OPS[op](features[f], v), dtype=bool) for f, op, v in self._leaves]
+        return np.array([t(leaf) for t in self._trees], dtype=bool).reshape(len(self._trees), -1)
+
+    def evaluate(self, features: Mapping[str, np.ndarray]) -> Dict[str, np.ndarray]:
+        """rule / decision / reason per row, resolved like utils.rules.adapt()."""
+        n = len(next(iter(features.values()))) if features else 0
+        out = {k: np.full(n, self.fallback[k], dtype=object) for k in ("rule", "decision", "reason")}
+        if not self.rules or not n:
+            return out
+        fired = self.flags(features)
+        # rank: precedence tier first, then file order; the lowest firing rank wins
+        tier = np.array([
+            self.precedence.index(r["decision"]) if r["decision"] in self.precedence else len(self.precedence)
+            for r in self.rules
+        ])
+        rank = tier * len(self.rules) + np.arange(len(self.rules))
+        ranked = np.where(fired, rank[:, None], np.iinfo(np.int64).max)
+        win = ranked.argmin(axis=0)
+        hit = fired.any(axis=0)
+        names = np.array([r["name"] for r in self.rules], dtype=object)
+        decisions = np.array([
+            r["decision"] if r["decision"] in self.precedence else self.otherwise for r in self.rules
+        ], dtype=object)
+        reasons = np.array([r["reason"] for r in self.rules], dtype=object)
+        out["rule"][hit] = names[win[hit]]
+        out["decision"][hit] = decisions[win[hit]]
+        out["reason"][hit] = reasons[win[hit]]
+        return out
+
+    def describe(self, plan_type: Optional[str] = None) -> List[Dict[str, str]]:
+        """Coach-facing trigger/action pairs, e.g. for the plan preview."""
+        return [
+            {"trigger": r["trigger"], "action": r["action"]}
+            for r in self.rules
+            if r.get("trigger") and (plan_type is None or not r.get("plan_types") or plan_type in r["plan_types"])
+        ]
+
+
+def _compile_expr(expr, leaves: List[Tuple[str, str, Any]], index: Dict[str, int], where: str):
+    if not isinstance(expr, dict) or len(expr) == 0:
+        raise ValueError(f"{where}: condition must be an object")
+    if "all" in expr or "any" in expr:
+        kind = "all" if "all" in expr else "any"
+        parts = [_compile_expr(e, leaves, index, f"{where}.{kind}[{i}]") for i, e in enumerate(expr[kind])]
+        if not parts:
+            raise ValueError(f"{where}: empty '{kind}'")
+        reduce = np.logical_and if kind == "all" else np.logical_or
+        return lambda leaf: reduce.reduce([p(leaf) for p in parts])
+    if "not" in expr:
+        inner = _compile_expr(expr["not"], leaves, index, f"{where}.not")
+        return lambda leaf: ~inner(leaf)
+
+    feature, op, value = expr.get("feature"), expr.get("op"), expr.get("value")
+    if feature not in FEATURES:
+        raise ValueError(f"{where}: unknown feature {feature!r} (known: {', '.join(FEATURES)})")
+    if op not in OPS:
+        raise ValueError(f"{where}: unknown op {op!r}")
+    key = json.dumps([feature, op, value])
+    if key not in index:  # shared leaves are evaluated once per call
+        index[key] = len(leaves)
+        leaves.append((feature, op, value))
+    i = index[key]
+    return lambda leaf: leaf[i]
+
+
+def compile_rules(spec: Dict[str, Any], source: Optional[str] = None) -> RuleSet:
+    """Validate a parsed rule file and compile it; raises ValueError on a bad spec."""
+    resolve = {**_DEFAULT_RESOLVE, **(spec.get("resolve") or {})}
+    rules, leaves, index, trees = [], [], {}, []
+    for i, r in enumerate(spec.get("rules") or []):
+        where = f"rules[{i}]"
+        missing = [k for k in ("name", "decision", "reason", "when") if k not in r]
+        if missing:
+            raise ValueError(f"{where}: missing {', '.join(missing)}")
+        trees.append(_compile_expr(r["when"], leaves, index, f"{where}.when"))
+        rules.append({k: v for k, v in r.items() if k != "when"})
+    return RuleSet(rules, leaves, trees, resolve, source)
+
+
+_lock = threading.Lock()
+_cache: Dict[str, Tuple[Tuple[int, int], RuleSet]] = {}  # path -> ((mtime_ns, size), rules)
+
+
+def load_rules(path=None) -> RuleSet:
+    """The compiled rule set for `path` (default RULES_PATH), recompiled when the file changes."""
+    p = str(Path(path) if path else RULES_PATH)
+    with _lock:
+        hit = _cache.get(p)
+        try:
+            st = os.stat(p)  # missing for a moment during an editor's atomic save
+            stamp = (st.st_mtime_ns, st.st_size)
+            if hit and hit[0] == stamp:
+                return hit[1]
+            with open(p, encoding="utf-8") as f:
+                rules = compile_rules(json.load(f), source=p)
+        except (ValueError, OSError) as e:  # json.JSONDecodeError is a ValueError
+            if hit is None:
+                raise
+            log.warning(f"adaptation rules {p}: {e}; keeping the previous rule set")
+            if not isinstance(e, OSError):
+                _cache[p] = (stamp, hit[1])  # don't re-parse the same broken file on every call
+            return hit[1]
+        _cache[p] = (stamp, rules)
+        return rules
@@ -1,5 +1,8 @@
+import numpy as np
 import pandas as pd
 
+from utils.rule_config import load_rules
+
 def adapt(plan_row, daily, load_row, weather_row):
     decisions = []
 
@@ -46,3 +49,136 @@ def adapt(plan_row, daily, load_row, weather_row):
         if r[1]=="Swap":
             return {"rule":r[0], "decision":r[1], "reason":r[2]}
     return {"rule":decisions[0][0], "decision":"Progress", "reason":decisions[0][2]}
+
+
+# ---------------------------------------------------------------------
+# Batch mode: every rule for every (athlete, date) in one pass.
+# The rules come from the declarative rule file (utils.rule_config); with
+# the shipped file the result equals adapt() called once per plan row with
+# that athlete's daily rows up to the date, the load row and the weather
+# row of the date.
+# ---------------------------------------------------------------------
+DECISION_COLUMNS = ["rule", "decision", "reason"]
+
+
+def _keys(frames, by):
+    # one integer code per athlete across all frames (missing ids form their own group)
+    present = [f for f in frames if f is not None and by and by in f]
+    if not present:
+        return [np.zeros(len(f), dtype=np.int64) if f is not None else None for f in frames]
+    codes, _ = pd.factorize(pd.concat([f[by] for f in present], ignore_index=True), use_na_sentinel=False)
+    out, i = [], 0
+    for f in frames:
+        if f is None or not (by and by in f):
+            out.append(None if f is None else np.zeros(len(f), dtype=np.int64))
+            continue
+        out.append(codes[i:i + len(f)])
+        i += len(f)
+    return out
+
+
+def _dates(s) -> np.ndarray:
+    return pd.to_datetime(s).to_numpy().astype("datetime64[ns]")
+
+
+def _daily_features(daily: pd.DataFrame, key: np.ndarray) -> pd.DataFrame:
+    """Per daily row: the readiness and weight-trend features adapt() derives from the history ending there."""
+    d = pd.DataFrame({"_key": key, "date": _dates(daily["date"])}, index=daily.index)
+    d = d.assign(_pos=np.arange(len(d))).sort_values(["_key", "date", "_pos"], kind="stable")
+    src = daily.loc[d.index]
+    n = d.groupby("_key").cumcount().to_numpy() + 1  # rows of history up to and including this one
+
+    def med7(col):
+        v = pd.to_numeric(src[col], errors="coerce").to_numpy(float)
+        out = np.full(len(v), np.nan)
+        if len(v) >= 7:
+            # NaN anywhere in the window -> NaN, like rolling(7).median()
+            out[6:] = np.median(np.lib.stride_tricks.sliding_window_view(v, 7), axis=1)
+        return v, np.where(n >= 7, out, np.nan)
+
+    hrv, hrv_med = med7("hrv_ms")
+    rhr, rhr_med = med7("rhr")
+    sleep = (
+        pd.to_numeric(src["sleep_duration_min"], errors="coerce").to_numpy(float)
+        if "sleep_duration_min" in src else np.zeros(len(src))
+    )
+
+    rate = np.full(len(src), np.nan)
+    if "weight_kg" in src and len(src) >= 14:
+        w = pd.to_numeric(src["weight_kg"], errors="coerce").to_numpy(float)
+        rate[13:] = (w[13:] - w[:-13]) / 2.0
+    rate = np.where(n >= 14, rate, np.nan)
+    return pd.DataFrame({
+        "_key": d["_key"].to_numpy(), "date": d["date"].to_numpy(),
+        "history_days": n, "hrv_drop": hrv - hrv_med, "rhr_rise": rhr - rhr_med,
+        "sleep_duration_min": sleep, "weight_rate_kg_wk": rate,
+    })
+
+
+def features(plan, daily, load=None, weather=None, by="athlete_id") -> dict:
+    """
+    The rule features (utils.rule_config.FEATURES) for every plan row, as
+    arrays aligned with `plan`. Frames as in adapt_batch().
+    """
+    plan_key, daily_key, load_key = _keys([plan, daily, load], by)
+    out = pd.DataFrame({"_key": plan_key, "date": _dates(plan["date"]), "_row": np.arange(len(plan))})
+    m = len(out)
+    f = {
+        "history_days": np.zeros(m), "hrv_drop": np.full(m, np.nan), "rhr_rise": np.full(m, np.nan),
+        "sleep_duration_min": np.full(m, np.nan), "weight_rate_kg_wk": np.full(m, np.nan),
+    }
+
+    # readiness + weight trend: the athlete's latest daily row on or before the plan date
+    if daily is not None and not daily.empty and m:
+        feats = _daily_features(daily, daily_key).sort_values("date", kind="stable")
+        hit = pd.merge_asof(out.sort_values("date", kind="stable"), feats, on="date", by="_key", direction="backward")
+        hit = hit.sort_values("_row")
+        for col in f:
+            f[col] = hit[col].to_numpy(float)
+        f["history_days"] = np.nan_to_num(f["history_days"])
+
+    # load: exact (athlete, date) match
+    f["TSB"] = np.full(m, np.nan)
+    if load is not None and not load.empty and "TSB" in load and m:
+        lk = pd.DataFrame({"_key": load_key, "date": _dates(load["date"]),
+                           "TSB": pd.to_numeric(load["TSB"], errors="coerce").to_numpy(float)})
+        lk = lk.drop_duplicates(["_key", "date"], keep="last")
+        f["TSB"] = out.merge(lk, on=["_key", "date"], how="left")["TSB"].to_numpy(float)
+
+    # weather: the first row of the date; a missing value counts as 0, like adapt()
+    f["precip_prob"], f["wind_kph"] = np.zeros(m), np.zeros(m)
+    if weather is not None and not weather.empty and m:
+        wk = pd.DataFrame({
+            "date": _dates(weather["date"]),
+            "precip_prob": pd.to_numeric(weather["precip_prob"], errors="coerce").fillna(0).to_numpy(float)
+                           if "precip_prob" in weather else 0.0,
+            "wind_kph": pd.to_numeric(weather["wind_kph"], errors="coerce").fillna(0).to_numpy(float)
+                        if "wind_kph" in weather else 0.0,
+        }).drop_duplicates("date", keep="first")
+        w = out.merge(wk, on="date", how="left")
+        f["precip_prob"] = w["precip_prob"].fillna(0).to_numpy(float)
+        f["wind_kph"] = w["wind_kph"].fillna(0).to_numpy(float)
+
+    f["nutrition_day"] = plan["nutrition_day"].to_numpy(object) if "nutrition_day" in plan else np.full(m, "", dtype=object)
+    return f
+
+
+def adapt_batch(plan, daily, load=None, weather=None, by="athlete_id", rules=None) -> pd.DataFrame:
+    """
+    Evaluate the adaptation rules for every plan row at once. Frames:
+      plan    [by,] date, nutrition_day           (one output row each, same order)
+      daily   [by,] date, hrv_ms, rhr, sleep_duration_min, weight_kg
+      load    [by,] date, TSB                      (e.g. utils.metrics.training_load)
+      weather date, precip_prob, wind_kph          (first row per date is used)
+    Returns [by,] date, rule, decision, reason. "History" is positional per
+    athlete, as in adapt(): the 7-row median and the row 13 rows back.
+    `rules` is a compiled RuleSet; default is the rule file (load_rules()),
+    whose shipped version gives the same answers as adapt().
+    """
+    rules = rules or load_rules()
+    decided = rules.evaluate(features(plan, daily, load, weather, by))
+    res = {"date": plan["date"].to_numpy()}
+    if by and by in plan:
+        res = {by: plan[by].to_numpy(), **res}
+    res.update({c: decided[c] for c in DECISION_COLUMNS})
+    return pd.DataFrame(res, index=plan.index)
@@ -1,17 +1,14 @@
 import os, requests
 from dotenv import load_dotenv
+from utils.strava_tokens import get_access_token
 load_dotenv()
 CLIENT_ID = os.getenv("STRAVA_CLIENT_ID")
 CLIENT_SECRET = os.getenv("STRAVA_CLIENT_SECRET")
 REFRESH_TOKEN = os.getenv("STRAVA_REFRESH_TOKEN")
 
 def _refresh_access_token():
-    r = requests.post("https://www.strava.com/oauth/token", data={
-        "client_id": CLIENT_ID, "client_secret": CLIENT_SECRET,
-        "grant_type": "refresh_token", "refresh_token": REFRESH_TOKEN
-    }, timeout=20)
-    r.raise_for_status()
-    return r.json()["access_token"]
+    # cached until shortly before expiry, shared with the API (utils/strava_tokens.py)
+    return get_access_token(CLIENT_ID, CLIENT_SECRET, REFRESH_TOKEN)
 
 def get_activities(after_epoch=None, per_page=100):
     token = _refresh_access_token()
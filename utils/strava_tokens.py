@@ -0,0 +1,127 @@
+"""
+Strava OAuth access-token cache shared by the Streamlit scripts and the API.
+
+Tokens are reused until shortly before `expires_at`. Refreshes are
+single-flight: a thread lock covers callers in one process and an flock on
+a sidecar lock file covers other processes (uvicorn workers, cron scripts),
+which then pick up the token the winner wrote to the cache file. Strava
+rotates refresh tokens, so the newest one is persisted alongside.
+"""
+import json
+import os
+import tempfile
+import threading
+import time
+
+import requests
+
+try:
+    import fcntl
+except ImportError:  # Windows: thread lock only
+    fcntl = None
+
+TOKEN_URL = "https://www.strava.com/oauth/token"
+CACHE_PATH = os.getenv("STRAVA_TOKEN_CACHE", os.path.join(tempfile.gettempdir(), "strava_token.json"))
+REFRESH_MARGIN_S = int(os.getenv("STRAVA_TOKEN_REFRESH_MARGIN_S", "300"))
+
+_lock = threading.Lock()
+_memo = {}
+
+
+class StravaTokenError(Exception):
+    def __init__(self, status_code, detail):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+def _fresh(tok, client_id):
+    return (
+        tok.get("client_id") == client_id
+        and tok.get("access_token")
+        and tok.get("expires_at", 0) - REFRESH_MARGIN_S > time.time()
+    )
+
+
+def _read_cache():
+    try:
+        with open(CACHE_PATH) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_cache(tok):
+    tmp = f"{CACHE_PATH}.{os.getpid()}.tmp"
+    fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, "w") as f:
+        json.dump(tok, f)
+    os.replace(tmp, CACHE_PATH)
+
+
+def _refresh(client_id, client_secret, refresh_token):
+    try:
+        r = requests.post(TOKEN_URL, data={
+            "client_id": client_id, "client_secret": client_secret,
+            "grant_type": "refresh_token", "refresh_token": refresh_token,
+        }, timeout=20)
+    except requests.RequestException as e:
+        raise StravaTokenError(502, f"strava_token_exception: {e}")
+    if r.status_code >= 400:
+        raise StravaTokenError(502, f"strava_token_error {r.status_code}: {r.text[:300]}")
+    data = r.json()
+    return {
+        "client_id": client_id,
+        "access_token": data["access_token"],
+        "refresh_token": data.get("refresh_token") or refresh_token,
+        "expires_at": int(data.get("expires_at") or time.time() + int(data.get("expires_in") or 0)),
+    }
+
+
+def get_access_token(client_id=None, client_secret=None, refresh_token=None):
+    """Cached access token; refreshes (once, across threads and processes) when close to expiry."""
+    direct = os.getenv("STRAVA_ACCESS_TOKEN")
+    if direct:
+        return direct
+    client_id = client_id or os.getenv("STRAVA_CLIENT_ID")
+    client_secret = client_secret or os.getenv("STRAVA_CLIENT_SECRET")
+    refresh_token = refresh_token or os.getenv("STRAVA_REFRESH_TOKEN")
+    if not all([client_id, client_secret, refresh_token]):
+        raise StravaTokenError(500, "strava_credentials_missing")
+
+    if _fresh(_memo, client_id):
+        return _memo["access_token"]
+    with _lock:
+        if _fresh(_memo, client_id):
+            return _memo["access_token"]
+        with open(CACHE_PATH + ".lock", "a") as lock_file:
+            if fcntl:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                tok = _read_cache()
+                if not _fresh(tok, client_id):
+                    # a rotated refresh token on disk wins over the one from the environment
+                    rtok = tok.get("refresh_token") if tok.get("client_id") == client_id else None
+                    try:
+                        tok = _refresh(client_id, client_secret, rtok or refresh_token)
+                    except StravaTokenError:
+                        if not rtok or rtok == refresh_token:
+                            raise
+                        tok = _refresh(client_id, client_secret, refresh_token)  # re-authorised since
+                    _write_cache(tok)
+            finally:
+                if fcntl:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+        _memo.clear()
+        _memo.update(tok)
+        return tok["access_token"]
+
+
+def invalidate():
+    """Drop the cached token, e.g. after Strava answered 401 with it."""
+    with _lock:
+        _memo.clear()
+        tok = _read_cache()
+        if tok:
+            tok["expires_at"] = 0
+            _write_cache(tok)
@@ -13,6 +13,8 @@ def get_daily_weather():
     for i, date in enumerate(j["daily"]["time"]):
         out.append({
             "date": date,
+            "lat": LAT,
+            "lon": LON,
             "temp_c": j["daily"]["temperature_2m_max"][i],
             "precip_prob": j["daily"]["precipitation_probability_mean"][i]/100.0,
             "wind_kph": j["daily"]["windspeed_10m_max"][i]